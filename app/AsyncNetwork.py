@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+from typing import Callable, Tuple
+
+from app.Framing import *
+from app.TCPHandler import dispatchRPC
+from app.Transport import *
+
+class AsyncNetwork(TransportServer):
+    """Runs all the peer I/O of a node on a single asyncio event loop, as an alternative to one thread per connection.
+
+    The loop runs in its own thread from the node creation so the client can connect to peers before the server is started.
+    Received RPC calls are executed on a thread pool ('RPC_' methods may block, e.g. for validating blocks or waiting for peers),
+    messages from the same connection are still handled one after the other.
+
+    :param node: the FullNode whose listening socket is served and 'RPC_' methods are called
+    :param workers: number of threads running the RPC calls
+    """
+    def __init__(self, node, workers: int=8):
+        self.node = node
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._server = None
+        self._handlers = set() # Tasks handling peer connections
+        self._closed = False
+        self._is_shut_down = Event()
+        self._is_shut_down.set()
+        Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def run(self, coroutine):
+        """Runs a coroutine on the event loop from another thread and waits for its result (False if the network is closed)."""
+        if self._closed:
+            coroutine.close()
+            return False
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def serve_forever(self):
+        """Accepts peer connections on the node's socket until 'shutdown' is called."""
+        self._is_shut_down.clear()
+        self.run(self._startServer())
+        self._is_shut_down.wait()
+
+    def shutdown(self):
+        if self._server is not None:
+            self.run(self._stopServer())
+        self._is_shut_down.set()
+
+    def close(self):
+        """Closes all connections, stops the event loop and the RPC threads (the network can't be used afterwards)."""
+        self.shutdown()
+        self.run(self._closeConnections())
+        self._closed = True
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False)
+
+    async def _startServer(self):
+        self._server = await asyncio.start_server(self._handle, sock=self.node.socket, limit=MAX_PAYLOAD_SIZE)
+
+    async def _stopServer(self):
+        self._server.close()
+        self._server = None
+
+    async def _closeConnections(self):
+        for writer in self.node.client.peers.values():
+            writer.close()
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Coroutine equivalent of 'TCPHandler.handle' for a new peer connection."""
+        client_addr = writer.get_extra_info('peername')[:2]
+        keep_alive = True
+        task = asyncio.current_task()
+        self._handlers.add(task)
+
+        while (keep_alive):
+            try:
+                payload = await readMessageAsync(reader)
+                if payload is None: # Connection closed by the peer
+                    break
+
+                self._log(logging.debug,
+                          f"Received message from {client_addr} :\n{json.dumps(payload, indent=4, sort_keys=True)}\n")
+
+                if 'connect' in payload: # Acknowledge binary framing support for the connecting peer (see TCPClient.connect)
+                    writer.write(ACK)
+                    await writer.drain()
+
+                keep_alive = await self.loop.run_in_executor(self.executor, dispatchRPC, self.node, payload, client_addr)
+            except json.decoder.JSONDecodeError as e:
+                self._log(logging.error, f"Could not decode JSON from raw data: {traceback.format_exc()}")
+            except asyncio.CancelledError: # Network closed by the node
+                keep_alive = False
+            except Exception as e:
+                self._log(logging.error, f"Exception in AsyncNetwork: {traceback.format_exc()}")
+                keep_alive = False
+
+        writer.close()
+        self._handlers.discard(task)
+        self._log(logging.info, f"Closed connection with {client_addr} [success]")
+
+    def _log(self, level_func: Callable, msg: str):
+        level_func(f"H:[{self.node.id}] " + msg)
+
+class AsyncTCPClient(Transport):
+    """Asyncio counterpart of 'TCPClient' with the same interface, usable from any thread.
+
+    Connecting waits for the result on the event loop while sending and broadcasting only schedule the writes and return immediately.
+    Writes are buffered by the transport of each peer: a peer whose buffer exceeds 'max_write_buffer' bytes (not reading fast enough) is disconnected.
+    """
+
+    negotiation_timeout = 1 # Seconds to wait for the binary framing acknowledgement of a peer on connect
+    max_write_buffer = 16 * 1024 * 1024 # Bytes pending in the transport of a peer from which the peer is disconnected
+
+    def __init__(self, server_addr, network: AsyncNetwork, checksum=True):
+        super(AsyncTCPClient, self).__init__()
+        self.peers = {}  # Key : (HOST, PORT) / Value : StreamWriter representing the peer connection
+        self.binary_peers = set() # Peers accepting binary frames
+        self.checksum = checksum
+        self.network = network
+        self.server_addr = server_addr
+
+    def send_data_to_peer(self, data: dict, peer: Tuple[str, int], key=None) -> bool:
+        """Schedules a message for a peer ('key' is unused: writes are buffered by the event loop transport right away)."""
+        logging.debug(f"Trying to send {data} to {peer}")
+        if peer in self.peers:
+            self.network.loop.call_soon_threadsafe(self._write, peer, self._encode(data, peer in self.binary_peers))
+            return True
+        else:
+            logging.error(f" AsyncTCPClient : Could not find {peer} in {self.peers} ")
+            return False
+
+    def connect(self, peer: Tuple[str, int]) -> bool:
+        return self.network.run(self._connect(tuple(peer)))
+
+    def disconnect(self, peer: Tuple[str, int], clear=False) -> bool:
+        return self.network.run(self._disconnect(tuple(peer), clear))
+
+    def broadcast(self, data: dict, key=None):
+        encoded = {} # Encode the message only once for each format
+        for peer in list(self.peers.keys()):
+            binary = peer in self.binary_peers
+            if not binary in encoded:
+                encoded[binary] = self._encode(data, binary)
+            self.network.loop.call_soon_threadsafe(self._write, peer, encoded[binary])
+
+    def _write(self, peer: Tuple[str, int], data: bytes):
+        writer = self.peers.get(peer)
+        if writer is None or writer.is_closing():
+            logging.error(f"broadcasting: connection closed to {peer}")
+            return
+        writer.write(data)
+        if writer.transport.get_write_buffer_size() > self.max_write_buffer: # Never drained, the buffer would grow without limit
+            logging.warning(f"Disconnecting slow peer {peer} ({writer.transport.get_write_buffer_size()} bytes pending)")
+            writer.transport.abort() # Discard the pending data
+            del self.peers[peer]
+            self.binary_peers.discard(peer)
+            if self.on_peer_dropped is not None:
+                self.on_peer_dropped(peer)
+
+    async def _connect(self, peer: Tuple[str, int]) -> bool:
+        if peer in self.peers:  # Prevent connecting back to already connected peers
+            return False
+
+        try:
+            reader, writer = await asyncio.open_connection(*peer)
+        except Exception as e:
+            logging.error(f"connect: {e}")
+            return False
+
+        self.peers[peer] = writer
+        data = {'connect': {'server_address': self.server_addr, 'peers': list(self.peers.keys())}}
+        writer.write(encodeLegacy(json.dumps(data)))  # Sends server listening port for the remote peer to connect
+        try:
+            ack = await asyncio.wait_for(reader.readexactly(len(ACK)), self.negotiation_timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            ack = b''
+        if ack == ACK:
+            self.binary_peers.add(peer)
+
+        return True
+
+    async def _disconnect(self, peer: Tuple[str, int], clear: bool) -> bool:
+        if not peer in self.peers:
+            return False
+
+        self.peers[peer].close()
+        if clear:
+            del self.peers[peer]
+            self.binary_peers.discard(peer)
+
+        return True
+
+    def _encode(self, data: dict, binary: bool) -> bytes:
+        return encodeFrame(data, self.checksum) if binary else encodeLegacy(json.dumps(data))
@@ -0,0 +1,65 @@
+"""Compact binary encoding of blocks and transactions, an alternative to their JSON encoding (see Block.toBytes).
+
+Integers are big-endian and fixed-width, strings are UTF-8 encoded and prefixed by their length (1 byte):
+    Transaction: senders count (2 bytes) | senders | receivers count (2 bytes) | receivers [| signatures]
+        each sender and receiver: address (string) | amount (8 bytes, signed)
+        signatures of a signed transaction (SIGNED_FLAG set in the senders count), one per sender: public key (bytes) | signature (bytes) | nonce (8 bytes)
+    TransactionStore: transactions count (4 bytes) | transactions
+    Block: version (1 byte) | timestamp (8 bytes, double) | height (8 bytes) | consensus (1 byte) | previous hash | miner address (string)
+           | reward (8 bytes, signed) | transaction store | nonce (8 bytes)
+    Hash: HASH_TAG followed by the 32 bytes of a hex digest, or a string (e.g. "0" for the genesis block)
+    Bytes: prefixed by their length (1 byte)
+The header hashed for MERKLE_VERSION blocks is the block encoding up to the reward, followed by the Merkle root of the transactions (32 bytes).
+
+The encoding is deterministic and round-trips exactly. Decoding reads the fields in place from a memoryview of the encoded bytes,
+only copying the decoded strings.
+"""
+import struct
+
+COUNT = struct.Struct('>H')
+STORE_COUNT = struct.Struct('>I')
+AMOUNT = struct.Struct('>q')
+NONCE = struct.Struct('>Q')
+BLOCK_HEADER = struct.Struct('>BdQ?') # version, timestamp, height, consensus
+HASH_TAG = 0xFF # Can't be the length of a string (at most MAX_STRING_LENGTH bytes)
+MAX_STRING_LENGTH = 254
+SIGNED_FLAG = 0x8000 # Set in the senders count of signed transactions, unsigned transactions keeping their encoding
+MAX_SENDERS = SIGNED_FLAG - 1
+
+def packString(value: str) -> bytes:
+    if not isinstance(value, str):
+        raise TypeError(f"Can't encode {value!r} as a string")
+    data = value.encode('utf-8')
+    if len(data) > MAX_STRING_LENGTH:
+        raise ValueError(f"String of {len(data)} bytes is too long to be encoded")
+    return bytes((len(data),)) + data
+
+def unpackString(view: memoryview, offset: int) -> tuple:
+    """Returns the string at 'offset' and the offset of the next field."""
+    end = offset + 1 + view[offset]
+    return str(view[offset + 1:end], 'utf-8'), end
+
+def packBytes(value: bytes) -> bytes:
+    if len(value) > 255:
+        raise ValueError(f"Value of {len(value)} bytes is too long to be encoded")
+    return bytes((len(value),)) + value
+
+def unpackBytes(view: memoryview, offset: int) -> tuple:
+    end = offset + 1 + view[offset]
+    return bytes(view[offset + 1:end]), end
+
+def packHash(value: str) -> bytes:
+    """Packs a hex digest in 33 bytes instead of 65, other strings being packed as is."""
+    if isinstance(value, str) and len(value) == 64:
+        try:
+            digest = bytes.fromhex(value)
+            if digest.hex() == value: # Only lowercase digests are decoded back to the same string
+                return bytes((HASH_TAG,)) + digest
+        except ValueError:
+            pass
+    return packString(value)
+
+def unpackHash(view: memoryview, offset: int) -> tuple:
+    if view[offset] == HASH_TAG:
+        return view[offset + 1:offset + 33].hex(), offset + 33
+    return unpackString(view, offset)
@@ -15,19 +15,51 @@ class Block:
     :param miner: address who mined the block
     :param reward: miner's reward for mining the block
     :param nonce: used for PoW for modifying the block hash / used for PoS for storing the timestamp validating the right to mine the new block
+    :param version: encoding the block hash is computed from, JSON_VERSION, BINARY_VERSION or MERKLE_VERSION (consensus rule, see 'getHeaderTemplate')
     """
-    
+
+    JSON_VERSION = 1
+    BINARY_VERSION = 2
+    MERKLE_VERSION = 3 # Hash of a fixed-size header committing to the transactions through their Merkle root
+    VERSIONS = (JSON_VERSION, BINARY_VERSION, MERKLE_VERSION)
+
+    __slots__ = ('_header', '_hash', 'version', 'timestamp', 'transactionStore', 'height', 'consensusAlgorithm', 'previousHash', 'miner', 'reward', 'nonce')
+
+    # Serialized fields other than the nonce, any change to one of them invalidates the cached header encoding
+    _HEADER_FIELDS = ('timestamp', 'transactionStore', 'height', 'consensusAlgorithm', 'previousHash', 'miner', 'reward', 'version')
+
     def __init__(self, timestamp: float, transactionStore: TransactionStore, height: int, consensusAlgorithm: bool,
-                 previousHash: str, miner: str, reward: int, nonce: int=0):
+                 previousHash: str, miner: str, reward: int, nonce: int=0, version: int=JSON_VERSION):
+        if not version in Block.VERSIONS:
+            raise ValueError(f"Unknown block version {version}")
+        self._header = None
+        self._hash = None # (nonce, transactions revision, hash) of the last computed hash
+        self.version = version
         self.timestamp = timestamp
         self.transactionStore = transactionStore
         self.height = height  # height in the blockchain, each new blocks increments it
         self.consensusAlgorithm = consensusAlgorithm  # False = Proof of work, True = Proof of stake
         self.previousHash = previousHash
-        self.miner = miner
+        self.miner = internAddress(miner)
         self.reward = reward
         self.nonce = nonce
-    
+
+    def __setattr__(self, name, value):
+        if name in Block._HEADER_FIELDS:
+            object.__setattr__(self, '_header', None)
+            object.__setattr__(self, '_hash', None)
+        object.__setattr__(self, name, value)
+
+    def __getstate__(self):
+        """Drops the cached header (hash objects can't be pickled) when sending the block to another process."""
+        state = {name: getattr(self, name) for name in Block.__slots__}
+        state['_header'] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        for (name, value) in state.items():
+            object.__setattr__(self, name, value)
+
     def __str__(self):
         return self.toJSON()
 
@@ -37,15 +69,137 @@ class Block:
     def __eq__(self, other):
         return self.getHash() == other.getHash()
 
+    def _fields(self) -> dict:
+        fields = {
+            'consensusAlgorithm': self.consensusAlgorithm,
+            'height': self.height,
+            'miner': self.miner,
+            'nonce': self.nonce,
+            'previousHash': self.previousHash,
+            'reward': self.reward,
+            'timestamp': self.timestamp,
+            'transactionStore': [t.toJSON() for t in self.transactionStore.transactions] if self.transactionStore != [] else [],
+        }
+        if self.version != Block.JSON_VERSION: # Keeps the encoding (and hash) of the blocks created before versioning
+            fields['version'] = self.version
+        return fields
+
+    def getHeaderTemplate(self) -> tuple:
+        """Returns the cached (prefix, suffix) bytes of the block JSON encoding split around the nonce value.
+
+        The block hash is sha3_256(prefix + nonce + suffix). Both parts are computed once and rebuilt only
+        when a serialized field (or the transactions of the store) changes.
+        For BINARY_VERSION blocks, the prefix is the binary encoding without the nonce and the suffix is empty.
+        For MERKLE_VERSION blocks, the prefix is the binary encoding of the fields other than the transactions followed by their Merkle root:
+        its size doesn't depend on the number of transactions, and a new transaction only updates the root incrementally (see TransactionStore.py).
+        The nonce is hashed as its decimal digits for all versions, so miners don't depend on the block version.
+        """
+        revision = getattr(self.transactionStore, 'revision', 0)
+        if self._header is None or self._header[3] != revision:
+            if self.version != Block.JSON_VERSION:
+                prefix = self._encodeHeader(merkle=self.version == Block.MERKLE_VERSION)
+                object.__setattr__(self, '_header', (prefix, b'', h.sha3_256(prefix), revision))
+                return self._header[:2]
+
+            fields = self._fields()
+            fields['nonce'] = 'NONCE' # Placeholder for splitting the encoding around the nonce value
+            prefix, suffix = json.dumps(fields, default=lambda o: o.__dict__, sort_keys=True).encode().split(b'"nonce": "NONCE"', 1)
+            prefix += b'"nonce": '
+            object.__setattr__(self, '_header', (prefix, suffix, h.sha3_256(prefix), revision))
+
+        return self._header[:2]
+
+    def getHeaderMidstate(self) -> tuple:
+        """Returns a sha3_256 object already fed with the header prefix (to be copied before each use) and the header suffix."""
+        self.getHeaderTemplate()
+        return self._header[2], self._header[1]
+
     def getHash(self):
-        return h.sha3_256(self.toJSON().encode()).hexdigest()
+        """Returns the block hash, cached until the nonce or another field changes.
 
-    def toJSON(self):
-        _json = json.loads(json.dumps(self, default=lambda o: o.__dict__, sort_keys=True))
-        _json['transactionStore'] = [t.toJSON() for t in self.transactionStore.transactions] if self.transactionStore != [] else []
+        The header encoding (and Merkle tree) is released once the hash is computed: blocks of a chain only keep their hash string,
+        the header being encoded again if the nonce changes (miners get the midstate once with 'getHeaderMidstate').
+        """
+        revision = getattr(self.transactionStore, 'revision', 0)
+        if self._hash is not None and self._hash[0] == self.nonce and self._hash[1] == revision:
+            return self._hash[2]
 
-        return json.dumps(_json)
+        midstate, suffix = self.getHeaderMidstate()
+        _hash = midstate.copy()
+        _hash.update(json.dumps(self.nonce).encode())
+        _hash.update(suffix)
+        object.__setattr__(self, '_hash', (self.nonce, revision, _hash.hexdigest()))
+        object.__setattr__(self, '_header', None)
+        if self.version == Block.MERKLE_VERSION and self.transactionStore != []:
+            self.transactionStore.releaseMerkleTree()
+        return self._hash[2]
+
+    def cacheHash(self, block_hash: str):
+        """Caches the hash of the block computed by another process for the same fields (see SyncValidator.py)."""
+        object.__setattr__(self, '_hash', (self.nonce, getattr(self.transactionStore, 'revision', 0), block_hash))
+
+    def getMerkleRoot(self) -> str:
+        """Returns the Merkle root of the block transactions (committed to by the hash of MERKLE_VERSION blocks)."""
+        return (self.transactionStore.getMerkleRoot() if self.transactionStore != [] else MerkleTree.EMPTY_ROOT).hex()
+
+    def getMerkleProof(self, index: int) -> list:
+        """Returns the inclusion proof of the transaction at 'index', checked against the Merkle root with 'verifyTransaction'."""
+        return [(sibling.hex(), is_left) for (sibling, is_left) in self.transactionStore.getMerkleProof(index)]
+
+    @staticmethod
+    def verifyTransaction(transaction: Transaction, proof: list, merkleRoot: str) -> bool:
+        """Checks a transaction is in the block of the given Merkle root without the other transactions."""
+        return MerkleTree.verifyProof(bytes.fromhex(transaction.getHash()), [(bytes.fromhex(sibling), is_left) for (sibling, is_left) in proof],
+                                      bytes.fromhex(merkleRoot))
+
+    def getHeader(self) -> str:
+        """Returns the hex encoded header hashed with the nonce (see 'hashHeader'), or None if the block hash covers its transactions (not MERKLE_VERSION)."""
+        return self._encodeHeader(merkle=True).hex() if self.version == Block.MERKLE_VERSION else None
+
+    @staticmethod
+    def hashHeader(header: str, nonce: int) -> str:
+        """Computes the hash of a MERKLE_VERSION block from its header ('getHeader') and nonce, without the transactions."""
+        return h.sha3_256(bytes.fromhex(header) + json.dumps(nonce).encode()).hexdigest()
+
+    @staticmethod
+    def decodeHeader(header: str) -> tuple:
+        """Returns the (version, height, previous hash) of a header returned by 'getHeader'."""
+        view = memoryview(bytes.fromhex(header))
+        (version, _, height, _) = BLOCK_HEADER.unpack_from(view, 0)
+        return version, height, unpackHash(view, BLOCK_HEADER.size)[0]
+
+    def toJSON(self):
+        return json.dumps(self._fields(), default=lambda o: o.__dict__, sort_keys=True)
 
     @classmethod
     def fromJSON(cls, block: dict) -> Block:
         return cls(**block)
+
+    def _encodeHeader(self, merkle=False) -> bytes:
+        """Binary encoding of the block without the nonce (see BinaryCodec.py), ending with the Merkle root instead of the transactions with 'merkle'."""
+        if merkle:
+            store = bytes.fromhex(self.getMerkleRoot())
+        else:
+            store = self.transactionStore.toBytes() if self.transactionStore != [] else STORE_COUNT.pack(0)
+        return b''.join((BLOCK_HEADER.pack(self.version, self.timestamp, self.height, self.consensusAlgorithm),
+                         packHash(self.previousHash), packString(self.miner), AMOUNT.pack(self.reward), store))
+
+    def toBytes(self) -> bytes:
+        """Binary encoding of the block, whatever its version (the first byte, which can't be mistaken for a JSON encoding starting with '{')."""
+        return self._encodeHeader() + NONCE.pack(self.nonce)
+
+    @classmethod
+    def fromBytes(cls, data: bytes) -> Block:
+        return cls.decode(memoryview(data), 0)[0]
+
+    @classmethod
+    def decode(cls, view: memoryview, offset: int) -> tuple:
+        """Decodes the block encoded at 'offset', returns the block and the offset following it."""
+        (version, timestamp, height, consensusAlgorithm) = BLOCK_HEADER.unpack_from(view, offset)
+        previousHash, offset = unpackHash(view, offset + BLOCK_HEADER.size)
+        miner, offset = unpackString(view, offset)
+        (reward,) = AMOUNT.unpack_from(view, offset)
+        transactionStore, offset = TransactionStore.decode(view, offset + AMOUNT.size)
+        (nonce,) = NONCE.unpack_from(view, offset)
+        offset += NONCE.size
+        return cls(timestamp, transactionStore, height, consensusAlgorithm, previousHash, miner, reward, nonce, version), offset
@@ -0,0 +1,212 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from threading import Event, RLock, Thread
+from typing import Union
+
+from app.Block import *
+from app.TransactionStore import *
+
+class BlockLog:
+    """Append-only storage of a chain: one length-prefixed record per block and a side index of fixed-size entries.
+
+    Log record: length (4 bytes) + CRC32 of the encoded block (4 bytes) + JSON or binary encoding of the block (see Block.toBytes).
+    Index entry of the block at height h (stored at h * ENTRY_SIZE): record offset in the log (8 bytes) + record length (4 bytes) + block hash (32 bytes).
+    Saving a block appends one record and one entry, reading a block by height reads one entry and one record without loading the file.
+    Appended blocks are written to the OS right away but only fsynced every 'sync_every' blocks and every 'sync_interval' seconds
+    by a background flusher. On opening, records or entries torn by a crash are dropped (and entries missing for complete records rebuilt).
+    Blocks are read through read-only memory maps of both files, remapped when the files grow.
+
+    :param path: path of the log file, the index is stored in 'path' + '.index'
+    :param sync_every: number of appended blocks triggering a fsync
+    :param sync_interval: seconds between the background flusher fsyncs (None for no flusher)
+    :param binary: append the blocks in their binary encoding instead of JSON (records of both encodings are read)
+    """
+
+    RECORD_HEADER = struct.Struct('>II')
+    ENTRY = struct.Struct('>QI32s')
+    ENTRY_SIZE = ENTRY.size
+
+    def __init__(self, path: Union[str, bytes], sync_every: int=100, sync_interval: float=1., binary=False):
+        if os.path.dirname(path): # Create directory for file if needed
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.binary = binary
+        self.lock = RLock()
+        self.pending = 0 # Blocks appended since the last fsync
+        self._log = open(path, 'a+b')
+        self._index = open(path + '.index', 'a+b')
+        self._hashes = None # Key: block hash / Value: height, built on first lookup by hash
+        self._maps = {} # Key: file / Value: memory map of the file
+        self._recover()
+
+        self._stopped = Event()
+        self._flusher = None
+        if sync_interval is not None:
+            self._flusher = Thread(target=self._flushPeriodically, daemon=True)
+            self._flusher.start()
+
+    def __len__(self):
+        """Number of blocks in the log."""
+        return self._length
+
+    @property
+    def size(self) -> int:
+        """Size of the log file in bytes."""
+        return self._end
+
+    def append(self, block: Block):
+        """Appends the block following the last block of the log (block heights must follow each other).
+
+        None is stored as an empty record for a block missing from a pruned chain (see 'Blockchain.loadSnapshot').
+        """
+        if block is None:
+            data = b''
+        else:
+            data = block.toBytes() if self.binary else block.toJSON().encode()
+        with self.lock:
+            if block is not None and block.height != self._length:
+                raise ValueError(f"Block #{block.height} can't follow block #{self._length - 1} in the log")
+
+            self._log.write(BlockLog.RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data)
+            self._index.write(BlockLog.ENTRY.pack(self._end, BlockLog.RECORD_HEADER.size + len(data), bytes.fromhex(block.getHash()) if block is not None else bytes(32)))
+            if self._hashes is not None and block is not None:
+                self._hashes[block.getHash()] = self._length
+            self._end += BlockLog.RECORD_HEADER.size + len(data)
+            self._length += 1
+            self.pending += 1
+            if self.pending >= self.sync_every:
+                self.sync()
+
+    def read(self, height: int) -> Block:
+        """Reads the block at the given height from the log (None for a block missing from a pruned chain)."""
+        with self.lock:
+            offset, length, _ = self._readEntry(height)
+            with memoryview(self._map(self._log, offset + length))[offset + BlockLog.RECORD_HEADER.size:offset + length] as record:
+                return BlockLog.decode(record) # Decoded in place from the map (which can't be closed while the view is used)
+
+    def getHash(self, height: int) -> str:
+        with self.lock:
+            return self._readEntry(height)[2].hex()
+
+    def getHeight(self, block_hash: str) -> int:
+        """Returns the height of the block with the given hash, or None if the block is not in the log."""
+        with self.lock:
+            if self._hashes is None:
+                index = self._map(self._index, self._length * BlockLog.ENTRY_SIZE)[:self._length * BlockLog.ENTRY_SIZE] if self._length else b''
+                self._hashes = {entry[2].hex(): height for (height, entry) in enumerate(BlockLog.ENTRY.iter_unpack(index)) if entry[1] > BlockLog.RECORD_HEADER.size}
+            return self._hashes.get(block_hash)
+
+    def truncate(self, length: int):
+        """Removes the blocks from height 'length' (replaced end of the chain)."""
+        with self.lock:
+            if length >= self._length:
+                return
+            end = self._readEntry(length)[0]
+            self._unmap() # Mapped pages beyond the new end of the files can't be accessed anymore
+            self._log.flush()
+            self._index.flush()
+            self._log.truncate(end)
+            self._index.truncate(length * BlockLog.ENTRY_SIZE)
+            if self._hashes is not None:
+                self._hashes = {block_hash: height for (block_hash, height) in self._hashes.items() if height < length}
+            self._end = end
+            self._length = length
+            self.sync()
+
+    def sync(self):
+        """Writes the appended blocks to disk."""
+        with self.lock:
+            self._log.flush()
+            self._index.flush()
+            os.fsync(self._log.fileno())
+            os.fsync(self._index.fileno())
+            self.pending = 0
+
+    def close(self):
+        self._stopped.set()
+        with self.lock:
+            if not self._log.closed:
+                self._unmap()
+                self.sync()
+                self._log.close()
+                self._index.close()
+
+    @staticmethod
+    def decode(data: Union[bytes, memoryview]) -> Block:
+        if not data: # Block missing from a pruned chain
+            return None
+        if data[0] != ord('{'):
+            return Block.decode(memoryview(data), 0)[0]
+        block = json.loads(bytes(data))
+        block['transactionStore'] = TransactionStore.fromJSON(block['transactionStore'])
+        return Block.fromJSON(block)
+
+    def _readEntry(self, height: int) -> tuple:
+        if not 0 <= height < self._length:
+            raise IndexError(f"No block #{height} in the log ({self._length} blocks)")
+        return BlockLog.ENTRY.unpack_from(self._map(self._index, (height + 1) * BlockLog.ENTRY_SIZE), height * BlockLog.ENTRY_SIZE)
+
+    def _map(self, f, end: int) -> mmap.mmap:
+        """Returns a memory map of the file covering at least its first 'end' bytes (written to the file if still buffered)."""
+        mapped = self._maps.get(f)
+        if mapped is None or len(mapped) < end:
+            f.flush()
+            if mapped is not None:
+                mapped.close()
+            mapped = self._maps[f] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    def _unmap(self):
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps.clear()
+
+    @staticmethod
+    def _readAt(f, offset: int, length: int) -> bytes:
+        """Reads from a file opened in append mode (writes always go to the end of the file, whatever the read position)."""
+        f.seek(offset)
+        return f.read(length)
+
+    def _recover(self):
+        """Drops the incomplete entries and records at the end of the files, rebuilding the entries of complete records not indexed."""
+        log_size = os.fstat(self._log.fileno()).st_size
+        self._length = os.fstat(self._index.fileno()).st_size // BlockLog.ENTRY_SIZE
+        self._end = 0
+        while self._length > 0: # Last entries may point to records not fully written
+            offset, length, _ = self._readEntry(self._length - 1)
+            if offset + length <= log_size:
+                self._end = offset + length
+                break
+            self._length -= 1
+
+        recovered = 0
+        self._unmap()
+        self._index.truncate(self._length * BlockLog.ENTRY_SIZE)
+        while self._end + BlockLog.RECORD_HEADER.size <= log_size:
+            length, crc = BlockLog.RECORD_HEADER.unpack(BlockLog._readAt(self._log, self._end, BlockLog.RECORD_HEADER.size))
+            data = BlockLog._readAt(self._log, self._end + BlockLog.RECORD_HEADER.size, length)
+            if len(data) < length or zlib.crc32(data) != crc:
+                break
+            block = BlockLog.decode(data)
+            self._index.write(BlockLog.ENTRY.pack(self._end, BlockLog.RECORD_HEADER.size + length, bytes.fromhex(block.getHash()) if block is not None else bytes(32)))
+            self._end += BlockLog.RECORD_HEADER.size + length
+            self._length += 1
+            recovered += 1
+
+        self._log.truncate(self._end)
+        self._index.truncate(self._length * BlockLog.ENTRY_SIZE)
+        if recovered or self._end < log_size:
+            logging.warning(f"BlockLog: recovered '{self.path}' ({recovered} entries rebuilt, {log_size - self._end} bytes of incomplete records dropped)")
+            self.sync()
+
+    def _flushPeriodically(self):
+        while not self._stopped.wait(self.sync_interval):
+            with self.lock:
+                if self.pending and not self._log.closed:
+                    self.sync()
@@ -2,14 +2,74 @@ import logging
 import time
 import json
 import os
-from typing import Union
+from typing import Callable, Union
 
 from app.Block import *
+from app.BlockLog import *
+from app.Ledger import *
+from app.Snapshot import *
+from app.StoredBlockList import *
 from app.TransactionStore import *
 
+class BlockList(list):
+    """List of blocks calling 'onChange' with the lowest modified index before any change other than appending.
+
+    Allows the blockchain to roll back its ledger when blocks are replaced or removed directly in the list.
+    """
+    def __init__(self, blocks: list, onChange: Callable):
+        super(BlockList, self).__init__(blocks)
+        self._onChange = onChange
+
+    def _index(self, key) -> int:
+        if isinstance(key, slice):
+            return key.indices(len(self))[0]
+        return key + len(self) if key < 0 else key
+
+    def __setitem__(self, key, value):
+        self._onChange(self._index(key))
+        super(BlockList, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._onChange(self._index(key))
+        super(BlockList, self).__delitem__(key)
+
+    def insert(self, index, block):
+        self._onChange(max(0, min(self._index(index), len(self))))
+        super(BlockList, self).insert(index, block)
+
+    def pop(self, index=-1):
+        self._onChange(self._index(index))
+        return super(BlockList, self).pop(index)
+
+    def remove(self, block):
+        self._onChange(self.index(block))
+        super(BlockList, self).remove(block)
+
+    def clear(self):
+        self._onChange(0)
+        super(BlockList, self).clear()
+
+    def sort(self, *args, **kwargs):
+        self._onChange(0)
+        super(BlockList, self).sort(*args, **kwargs)
+
+    def reverse(self):
+        self._onChange(0)
+        super(BlockList, self).reverse()
+
 class Blockchain:
-    """Represents the blockchain as a list of blocks."""
+    """Represents the blockchain as a list of blocks.
+
+    Balances are read from a ledger updated as blocks are added (see Ledger.py). If blocks are replaced or removed,
+    the ledger is rolled back to the first changed block and the following blocks are applied again on the next balance lookup.
+    With a block log (see 'openLog'), the log follows the chain the same way: truncated on changes and appended to by 'addBlock'.
+    """
     def __init__(self):
+        self.ledger = Ledger()
+        self.log = None # Append-only log storing the chain on disk (see 'openLog')
+        self.snapshot = None # Last snapshot of the ledger (see 'getSnapshot')
+        self.snapshot_interval = None # Number of blocks between two snapshots saved next to the block log
+        self.pruned_snapshot = None # Snapshot received from a peer the chain starts from, the blocks before its height being missing (None)
         self.blockChain = []
 
     def __str__(self):
@@ -18,25 +78,46 @@ class Blockchain:
     def __repr__(self):
         return str(self.blockChain)
 
-    def createGenesisBlock(self, consensus: bool=False, beneficiaries: list=[], initial_supply=100_000, initial_beneficiary_amount=100):
+    def createGenesisBlock(self, consensus: bool=False, beneficiaries: list=[], initial_supply=100_000, initial_beneficiary_amount=100,
+                           version: int=Block.JSON_VERSION):
         """Set up the first block in the blockchain.
 
         :param consensus: indicates the consensus used for the first block
         :param beneficiaries: a list of addresses who will receive coins in a transaction from the first block (useful for starting a PoS blockchain)
         :param initial_supply: the amount of coins created on the first block mined
         :param initial_beneficiary_amount: the amount of coins sent to the beneficiaries initially
+        :param version: block version (encoding used for the block hash, see Block.py)
         """
 
         if len(beneficiaries)*initial_beneficiary_amount > initial_supply:
             raise ValueError("Number of beneficiaries cannot exceed total initial supply regarding the initial transfer amount")
 
-        genesisBlock = Block(time.time(), TransactionStore(), 0, consensus, "0", "0", initial_supply)
+        genesisBlock = Block(time.time(), TransactionStore(), 0, consensus, "0", "0", initial_supply, version=version)
 
         for address in beneficiaries:
             genesisBlock.transactionStore.addTransaction(Transaction(senders=[("0", initial_beneficiary_amount)], receivers=[(address, initial_beneficiary_amount)]))
         
         self.addBlock(genesisBlock)
 
+    @property
+    def blockChain(self) -> Union[BlockList, StoredBlockList]:
+        return self._blockChain
+
+    @blockChain.setter
+    def blockChain(self, blocks: list):
+        """Replaces the chain, only rolling back the ledger from the first block differing from the current chain."""
+        common = 0
+        if hasattr(self, '_blockChain'):
+            for (current, new) in zip(self._blockChain, blocks):
+                if current is not new and (current is None or new is None or current != new): # Blocks decoded from a log are equal to the stored blocks without being the same objects
+                    break
+                common += 1
+            if isinstance(self._blockChain, StoredBlockList): # Only the end of the log is rewritten
+                self._blockChain[common:] = blocks[common:]
+                return
+            self._onChange(common)
+        self._blockChain = BlockList(blocks, self._onChange)
+
     @property
     def lastBlock(self) -> Block:
         return self.blockChain[-1]
@@ -47,11 +128,168 @@ class Blockchain:
 
     def addBlock(self, block: Block):
         self.blockChain.append(block)
+        self._syncLedger()
+        self._syncLog()
+        if self.log is not None and self.snapshot_interval and block.height % self.snapshot_interval == 0:
+            self.snapshot = self.getSnapshot()
+            self.snapshot.save(self.log.path + '.snapshot')
+
+    def _onChange(self, index: int):
+        """Called before the blocks from 'index' are replaced or removed.
+
+        Raises ValueError if the chain is pruned and 'index' is below the ledger base, the ledger not being able to replay the missing blocks.
+        """
+        if self.pruned_snapshot is not None and index < self.ledger.base:
+            raise ValueError(f"Can't replace blocks from height {index} of a chain pruned up to the snapshot at height {self.pruned_snapshot.height}")
+        self._rollbackLedger(index)
+        if self.log is not None:
+            self.log.truncate(index)
+
+    def _rollbackLedger(self, index: int):
+        self.ledger.rollback(min(index, len(self.ledger)))
+
+    def _syncLog(self):
+        """Appends the blocks not yet in the block log (after a truncation or blocks appended directly to the list)."""
+        if self.log is not None:
+            with self.log.lock:
+                for block in self.blockChain[len(self.log):]:
+                    self.log.append(block)
+
+    def openLog(self, file: Union[str, bytes], sync_every: int=100, sync_interval: float=1., lazy=False, cache_size: int=1024,
+                snapshot_interval: int=None, binary=False) -> bool:
+        """Stores the chain in an append-only block log, each new block costing one record appended by 'addBlock' (see BlockLog.py).
+
+        If the log already holds blocks (e.g. node restart), they replace the current chain, otherwise the current chain is written to the log.
+        With 'lazy', the chain is read from the memory mapped log when accessed instead of being loaded in memory,
+        only the 'cache_size' last accessed blocks being kept decoded (see StoredBlockList.py).
+        With 'snapshot_interval', a snapshot of the ledger is saved next to the log every 'snapshot_interval' blocks ('file' + '.snapshot'),
+        the ledger of a restored chain starting from the last snapshot instead of replaying the whole chain.
+        With 'binary', new blocks are stored in their binary encoding instead of JSON (both can be read from the same log).
+        Returns True if the chain was loaded from the log.
+        """
+        log = BlockLog(file, sync_every, sync_interval, binary)
+        loaded = len(log) > 0
+        self.snapshot_interval = snapshot_interval
+        if lazy:
+            if loaded:
+                self._rollbackLedger(0) # Balances are computed again from the stored chain on the next lookup
+                logging.info(f"Opened block log '{file}' holding {len(log)} blocks [success]")
+            else:
+                for block in self.blockChain:
+                    log.append(block)
+            self._blockChain = StoredBlockList(log, self._onChange, cache_size)
+            self.log = log
+        else:
+            if loaded:
+                self.blockChain = [log.read(height) for height in range(len(log))]
+                logging.info(f"Loaded {len(log)} blocks from block log '{file}' [success]")
+            self.log = log
+            self._syncLog()
+
+        if loaded:
+            if os.path.isfile(file + '.snapshot'):
+                try:
+                    self.loadSnapshot(Snapshot.load(file + '.snapshot'))
+                except ValueError as e:
+                    logging.warning(f"Could not restore the ledger from the snapshot, balances will be computed from the chain: {e}")
+        return loaded
+
+    def getSnapshot(self) -> Snapshot:
+        """Returns a snapshot of the ledger at the last block."""
+        with self.ledger.lock:
+            self._syncLedger()
+            return Snapshot(self.currentHeight, self.lastBlock.getHash(), dict(self.ledger.balances), self.ledger.stakes.toList(),
+                            dict(self.ledger.nonces))
+
+    def loadSnapshot(self, snapshot: Snapshot, blocks: list=None):
+        """Restores the ledger from a snapshot, only the blocks after the snapshot height being applied on the next balance lookup.
+
+        Without 'blocks', the block at the snapshot height must already be in the chain (snapshot saved next to the block log).
+        Otherwise, the chain is replaced by 'blocks', starting with the block at the snapshot height (snapshot received from a peer):
+        the previous blocks are missing (None) in the chain, which can't be rolled back below the snapshot height (see 'pruned_snapshot').
+        Raises ValueError if the snapshot doesn't match the chain.
+        """
+        if blocks is not None:
+            if not blocks or blocks[0].height != snapshot.height or blocks[0].getHash() != snapshot.tipHash:
+                raise ValueError(f"Blocks don't start with the tip of the snapshot at height {snapshot.height}")
+            for (previous, block) in zip(blocks, blocks[1:]):
+                if block.height != previous.height + 1 or block.previousHash != previous.getHash():
+                    raise ValueError(f"Blocks following the snapshot are not continuous at block #{block.height}")
+            self.blockChain = [None] * snapshot.height + list(blocks)
+            self.pruned_snapshot = snapshot
+        elif snapshot.height >= len(self.blockChain) or self.blockChain[snapshot.height].getHash() != snapshot.tipHash:
+            raise ValueError(f"Snapshot tip {snapshot.tipHash} at height {snapshot.height} is not in the chain")
+
+        self.ledger.restore(snapshot.balances, snapshot.stakes, snapshot.height + 1, snapshot.nonces)
+        self.snapshot = snapshot
+        logging.info(f"Restored the ledger from the snapshot at height {snapshot.height} (commitment: {snapshot.getHash()}) [success]")
+
+    def dropSnapshot(self, genesis: Block):
+        """Reverts the loading of a snapshot received from a peer (see 'loadSnapshot'), the chain only holding the genesis block again."""
+        self.pruned_snapshot = None # Allows replacing the blocks below the snapshot
+        self.snapshot = None
+        self.ledger.restore({}, [], 0) # The genesis block is applied again on the next balance lookup
+        self.blockChain = [genesis]
+
+    def closeLog(self):
+        """Writes the pending blocks to disk and detaches the block log (a lazy chain can't be accessed anymore)."""
+        if self.log is not None:
+            self._syncLog()
+            self.log.close()
+            self.log = None
+
+    def _syncLedger(self):
+        """Applies the blocks not yet in the ledger (after a rollback or blocks appended directly to the list)."""
+        with self.ledger.lock:
+            for block in self.blockChain[len(self.ledger):]:
+                self.ledger.applyBlock(block)
 
     def getBalance(self, address: str) -> int:
-        """Read through every block in the chain for transactions and mining rewards to compute the balance of a given address."""
-        balance = 0
-        for block in self.blockChain:
+        """Returns the balance of a given address from the ledger in constant time."""
+        if len(self.ledger) != len(self.blockChain):
+            self._syncLedger()
+        return self.ledger.getBalance(address)
+
+    def getNonce(self, address: str) -> int:
+        """Returns the nonce expected in the next signed transaction of an address (see Ledger.getNonce)."""
+        if len(self.ledger) != len(self.blockChain):
+            self._syncLedger()
+        return self.ledger.getNonce(address)
+
+    def getStakes(self) -> StakeTree:
+        """Returns the stake tree of the ledger, up to date with the last block."""
+        if len(self.ledger) != len(self.blockChain):
+            self._syncLedger()
+        return self.ledger.stakes
+
+    def _scannedBlocks(self) -> list:
+        """Blocks read by 'scanBalance': the whole chain, or the blocks following the snapshot of a pruned chain."""
+        if self.pruned_snapshot is not None:
+            return self.blockChain[self.pruned_snapshot.height + 1:]
+        return self.blockChain
+
+    def checkLedger(self) -> bool:
+        """Verifies the ledger balances and stakes against a full scan of the chain (see 'scanBalance')."""
+        self._syncLedger()
+        addresses = set(self.ledger.balances.keys())
+        if self.pruned_snapshot is not None:
+            addresses.update(self.pruned_snapshot.balances.keys())
+        for block in self._scannedBlocks():
+            addresses.update(Ledger.getBlockChanges(block).keys())
+
+        balances = {address: self.scanBalance(address) for address in addresses}
+        stakes = {address: max(balance, 0) for (address, balance) in balances.items() if address != Ledger.ISSUER}
+        return (all(self.ledger.getBalance(address) == balance for (address, balance) in balances.items())
+                and all(self.ledger.stakes.getStake(address) == stake for (address, stake) in stakes.items())
+                and self.ledger.stakes.total == sum(stakes.values()))
+
+    def scanBalance(self, address: str) -> int:
+        """Read through every block in the chain for transactions and mining rewards to compute the balance of a given address.
+
+        A pruned chain is read from the balance of the snapshot it starts from (see 'pruned_snapshot').
+        """
+        balance = self.pruned_snapshot.balances.get(address, 0) if self.pruned_snapshot is not None else 0
+        for block in self._scannedBlocks():
             if block.miner == address:
                 balance += block.reward
 
@@ -83,6 +321,7 @@ class Blockchain:
                     for block in data['blocks']:
                         block = json.loads(block)
                         if (block['height'] > lastSavedBlockHeight):
+                            block['transactionStore'] = TransactionStore.fromJSON(block['transactionStore'])
                             self.blockChain.append(Block.fromJSON(block))
                             countUpdated += 1
 
@@ -101,6 +340,10 @@ class Blockchain:
         return True
 
     def saveToJSON(self, file: Union[str, bytes], overwrite=False) -> bool:
+        if self.pruned_snapshot is not None:
+            logging.error(f"Saving aborted: the blocks before the snapshot at height {self.pruned_snapshot.height} are missing [failure]")
+            return False
+
         blockchain = {} # JSON object to save blockchain data
         lastSavedBlockHeight = -1 # Allow inclusion of genesis block with height=0
         if (os.path.dirname(file)): # Create directory for file if needed
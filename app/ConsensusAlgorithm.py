@@ -1,4 +1,8 @@
 class ConsensusAlgorithm:
     """Wrapper class for the two consensus algorithms (PoW and PoS)."""
     def mine(self, block):
-        pass
\ No newline at end of file
+        pass
+
+    def shutdown(self):
+        """Releases any resource held for mining (called on node shutdown)."""
+        pass
@@ -0,0 +1,152 @@
+"""Wire format of the messages exchanged between peers.
+
+Binary frame (version 1): a fixed header followed by the JSON encoded RPC data.
+    magic (1 byte) | version (1 byte) | message type (1 byte) | flags (1 byte) | payload length (4 bytes) | CRC32 of payload (4 bytes, 0 if no checksum)
+
+Legacy format: the JSON encoded RPC message is converted to base64 and wrapped in a JSON object, messages are separated by a '|' character.
+Peers start with the legacy format and switch to binary frames if the remote peer acknowledges it on connect (see TCPClient.connect).
+"""
+import asyncio
+import base64
+import json
+import socket
+import struct
+import zlib
+
+MAGIC = 0xBA # Can't be mistaken for the first byte of a legacy message ('{')
+VERSION = 1
+FLAG_CHECKSUM = 0x01
+HEADER = struct.Struct('!BBBBII')
+ACK = bytes([MAGIC, VERSION]) # Sent back by a peer on 'connect' for accepting binary frames
+MAX_PAYLOAD_SIZE = 256 * 1024 * 1024
+
+MESSAGE_TYPES = {
+    'connect': 1,
+    'newBlock': 2,
+    'end': 3,
+    'getLastBlock': 4,
+    'listLastBlocks': 5,
+    'getInventory': 6,
+    'updateInventory': 7,
+    'getHeaders': 8,
+    'listHeaders': 9,
+    'getSnapshot': 10,
+    'snapshot': 11,
+}
+MESSAGE_NAMES = {v: k for (k, v) in MESSAGE_TYPES.items()}
+
+class FramingError(Exception):
+    """Raised on a malformed frame, the stream can't be parsed any further."""
+    pass
+
+def encodeFrame(data: dict, checksum=True) -> bytes:
+    """Encodes each RPC of the 'data' dict in its own binary frame."""
+    frames = b''
+    for (method, payload) in data.items():
+        body = json.dumps(payload).encode('utf-8')
+        frames += HEADER.pack(MAGIC, VERSION, MESSAGE_TYPES[method], FLAG_CHECKSUM if checksum else 0,
+                              len(body), zlib.crc32(body) if checksum else 0) + body
+
+    return frames
+
+def encodeLegacy(msg: str) -> bytes:
+    """Encaspulate the 'msg' data by converting it to base64 and wrapping it in a JSON object with special character delimiter '|' for separating messages."""
+    return (json.dumps({'msg': base64.b64encode(msg.encode('utf-8')).decode('utf-8')}) + '|').encode('utf-8')
+
+def decodeLegacy(raw_payload: bytes) -> dict:
+    return json.loads(base64.b64decode(json.loads(raw_payload)['msg']).decode('utf-8'))
+
+class FrameReader:
+    """Buffered reader parsing messages incrementally from a socket, in binary or legacy format.
+
+    Data is received directly in a reusable buffer. The payload of a frame is copied once out of the buffer for decoding,
+    only the bytes of an incomplete message may be moved back to the start of the buffer to make room for the rest of it.
+    """
+    def __init__(self, sock: socket.socket, buffer_size: int=64 * 1024):
+        self.sock = sock
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0 # Start of the unparsed data in the buffer
+        self._end = 0 # End of the received data in the buffer
+
+    def _fill(self, needed: int) -> bool:
+        """Receives data until at least 'needed' unparsed bytes are available, returns False if the connection is closed."""
+        while self._end - self._start < needed:
+            if self._start + needed > len(self._buffer): # Not enough room left after the unparsed data
+                remaining = self._end - self._start
+                if needed > len(self._buffer):
+                    self._view.release()
+                    buffer = bytearray(max(needed, 2 * len(self._buffer)))
+                    buffer[:remaining] = self._buffer[self._start:self._end]
+                    self._buffer = buffer
+                    self._view = memoryview(self._buffer)
+                else:
+                    self._buffer[:remaining] = self._buffer[self._start:self._end]
+                self._start, self._end = 0, remaining
+
+            received = self.sock.recv_into(self._view[self._end:])
+            if received == 0:
+                return False
+            self._end += received
+
+        return True
+
+    def _consume(self, length: int, skip: int=0) -> bytes:
+        """Copies the next 'length' bytes out of the buffer, then skips 'skip' more bytes (e.g. a delimiter)."""
+        data = bytes(self._view[self._start:self._start + length])
+        self._start += length + skip
+        if self._start == self._end: # Everything parsed, reuse the buffer from the start
+            self._start = self._end = 0
+
+        return data
+
+    def readMessage(self) -> dict:
+        """Blocks until a full message is received and returns the decoded RPC dict, or None if the connection is closed."""
+        if not self._fill(1):
+            return None
+
+        if self._buffer[self._start] == MAGIC:
+            if not self._fill(HEADER.size):
+                return None
+            magic, version, msg_type, flags, length, crc = HEADER.unpack_from(self._buffer, self._start)
+            if version != VERSION or not msg_type in MESSAGE_NAMES or length > MAX_PAYLOAD_SIZE:
+                raise FramingError(f"Invalid frame header: version={version}, type={msg_type}, length={length}")
+            if not self._fill(HEADER.size + length):
+                return None
+
+            self._start += HEADER.size
+            body = self._consume(length)
+            if flags & FLAG_CHECKSUM and zlib.crc32(body) != crc:
+                raise FramingError(f"Invalid checksum for '{MESSAGE_NAMES[msg_type]}' frame")
+
+            return {MESSAGE_NAMES[msg_type]: json.loads(body)}
+
+        delimiter = self._buffer.find(b'|', self._start, self._end)
+        while delimiter == -1:
+            searched = self._end - self._start # Offset already searched (the buffer may be compacted while filling)
+            if not self._fill(searched + 1):
+                return None
+            delimiter = self._buffer.find(b'|', self._start + searched, self._end)
+
+        raw_payload = self._consume(delimiter - self._start, skip=1) # Payload without the delimiter
+        return decodeLegacy(raw_payload)
+
+async def readMessageAsync(reader: asyncio.StreamReader) -> dict:
+    """Coroutine equivalent of 'FrameReader.readMessage' for asyncio streams, returns None if the connection is closed."""
+    try:
+        first = await reader.readexactly(1)
+        if first[0] == MAGIC:
+            magic, version, msg_type, flags, length, crc = HEADER.unpack(first + await reader.readexactly(HEADER.size - 1))
+            if version != VERSION or not msg_type in MESSAGE_NAMES or length > MAX_PAYLOAD_SIZE:
+                raise FramingError(f"Invalid frame header: version={version}, type={msg_type}, length={length}")
+
+            body = await reader.readexactly(length)
+            if flags & FLAG_CHECKSUM and zlib.crc32(body) != crc:
+                raise FramingError(f"Invalid checksum for '{MESSAGE_NAMES[msg_type]}' frame")
+
+            return {MESSAGE_NAMES[msg_type]: json.loads(body)}
+
+        raw_payload = first + await reader.readuntil(b'|')
+        return decodeLegacy(raw_payload[:-1])
+    except asyncio.IncompleteReadError:
+        return None
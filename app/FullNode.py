@@ -1,17 +1,25 @@
+import base64
 import hashlib as h
 import logging
 import json
 import socketserver
+import struct
 import sys
 import time
+from bisect import bisect_right
 from enum import Enum, auto, unique
-from threading import Thread
+from threading import Condition, Lock, Thread
 from typing import Tuple
 
+from app.AsyncNetwork import *
 from app.Block import *
 from app.Blockchain import *
+from app.InProcessNetwork import *
+from app.Mempool import *
 from app.ProofOfWork import *
 from app.ProofOfStake import *
+from app.SignatureVerifier import *
+from app.SyncValidator import *
 from app.TCPClient import *
 from app.TCPHandler import *
 from app.Transaction import *
@@ -32,6 +40,8 @@ class FullNode(socketserver.ThreadingTCPServer):
     """Represents a full node in the network. 
     
     Peers' requests are handled by spawning a new instance of 'TCPHandler' in its own thread, calling its 'handle' function.
+    With 'asyncio_mode', all peers' connections are instead handled on a single event loop (see AsyncNetwork.py).
+    With an 'in_process_network', the node binds no port and exchanges messages in memory with the other nodes of the network (see InProcessNetwork.py).
     'RPC_' prefixed methods are called in response to peers requests. 
     
     See https://docs.python.org/3/library/socketserver.html#module-socketserver for reference.
@@ -42,6 +52,33 @@ class FullNode(socketserver.ThreadingTCPServer):
 
     def __init__(self, consensusAlgorithm: bool, existing_wallet: Wallet, 
                  difficulty=1,
+                 mining_workers=1,
+                 mempool_max_transactions=10_000,
+                 mempool_max_bytes=5_000_000,
+                 asyncio_mode=False,
+                 in_process_network: InProcessNetwork=None,
+                 sync_batch_size=50,
+                 sync_max_in_flight=4,
+                 headers_first_sync=False,
+                 sync_request_timeout=5,
+                 send_high_watermark=1000,
+                 send_low_watermark=100,
+                 slow_peer_policy='throttle',
+                 pos_slot_time: float=None,
+                 pos_scheduled_mining=False,
+                 block_log: str=None,
+                 lazy_block_log=False,
+                 snapshot_interval: int=None,
+                 snapshot_sync=False,
+                 snapshot_checkpoints: dict=None,
+                 block_version: int=Block.JSON_VERSION,
+                 binary_codec=False,
+                 sync_validation=True,
+                 sync_validation_workers: int=1,
+                 require_signatures=False,
+                 signature_workers: int=1,
+                 signature_cache_size: int=100_000,
+                 difficulty_schedule: list=None,
                  server_address: Tuple[str, int] = ('127.0.0.1', 13337),
                  RequestHandlerClass: socketserver.BaseRequestHandler = TCPHandler):
         # Initialize the TCP server for handling peer requests
@@ -59,31 +96,111 @@ class FullNode(socketserver.ThreadingTCPServer):
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         if hasattr(socket, "SO_REUSEPORT"): # Will only trigger on Linux
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-        self.server_bind()
-        self.server_activate()
+        if in_process_network is None:
+            self.server_bind()
+            self.server_activate()
+        else:
+            self.socket.close() # No port used by nodes of an in-process network
 
         self.blockchain = Blockchain()
-        self.client = TCPClient(server_addr=server_address)  # Create the TCPClient to interact with other peers
+        self.asyncio_mode = asyncio_mode
+        self.network = None # TransportServer handling the peers' connections instead of the socketserver loop (see Transport.py)
+        if in_process_network is not None:
+            self.network = InProcessServer(self, in_process_network, server_address)
+            self.client = InProcessClient(server_addr=server_address, network=in_process_network)
+        elif self.asyncio_mode:
+            self.network = AsyncNetwork(self)
+            self.client = AsyncTCPClient(server_addr=server_address, network=self.network)
+        else:
+            # Create the TCPClient to interact with other peers, each peer having a queue of at most 'send_high_watermark' messages (see SendQueue.py)
+            self.client = TCPClient(server_addr=server_address, high_watermark=send_high_watermark, low_watermark=send_low_watermark, slow_peer_policy=slow_peer_policy)
+        self.client.on_peer_dropped = self._onPeerDropped
         self.hardSync = True
         self.isMining = False
         self.max_sync_attempts = 2
         self.peers_server = {} # Key: (HOST, PORT) of a FullNode client socket / Value: (HOST, PORT) of a Fullnode server socket
         self.syncBlockHeightReceivedFromPeer = {} # Stores the heights received from each peers for the sync process
-        self.syncWaitForAllPeersThread = None
-        self.synced = SyncState.FULLY_SYNCED # Consider initial nodes fully synced
-        self.transaction_pool = []
+        self.sync_batch_size = sync_batch_size # Number of blocks requested in each 'getInventory' request
+        self.sync_max_in_flight = sync_max_in_flight # Number of 'getInventory' requests sent to a peer without waiting for the blocks
+        self.headers_first_sync = headers_first_sync # Download the block hashes from the chosen peer first, then the blocks from all peers
+        self.block_version = block_version # Consensus flag: encoding the hash of the blocks is computed from (see Block.py), blocks of other versions are rejected
+        self.binary_codec = binary_codec # Send the blocks to peers and store them in the block log in their binary encoding instead of JSON
+        self.sync_validation = sync_validation # Fully validate the blocks received during sync (see SyncValidator.py), instead of only checking the chain continuity
+        self.difficulty_schedule = [tuple(change) for change in difficulty_schedule or [(0, difficulty)]] # (height, difficulty) of each difficulty change, blocks being checked against the difficulty at their height
+        self.sync_validator = SyncValidator(self, sync_validation_workers) # Stateless checks of the received blocks run in 'sync_validation_workers' processes
+        self.require_signatures = require_signatures # Consensus flag: transactions must be signed by all their senders (see SignatureVerifier.py)
+        self.signature_verifier = SignatureVerifier(signature_workers, signature_cache_size) # Signatures verified once are cached for the next validations
+        self.snapshot_sync = snapshot_sync # Nodes with only the genesis block restore the ledger from the chosen peer's snapshot instead of downloading the whole chain
+        self.snapshot_checkpoints = snapshot_checkpoints # Key: height / Value: commitment of the only snapshots accepted from peers (None trusts the chosen peer)
+        self.sync_request_timeout = sync_request_timeout # Seconds before reassigning a batch requested to a peer (headers-first sync)
+        self.sync_lock = Lock()
+        self.chosen_peer = None # Peer sending the blocks during sync
+        self.sync_height = 0 # Height of the chosen peer's blockchain
+        self.sync_headers = {} # Key: height / Value: block hash received from the chosen peer (headers-first sync)
+        self.sync_headers_from = 0 # Height of the first requested header
+        self.sync_requests = {} # Key: first height of a pending 'getInventory' request / Value: (last height requested, peer, time sent)
+        self.sync_retry = [] # Batches (first height, last height) to request again
+        self.sync_failed_peers = set() # Peers not used anymore for downloading blocks (headers-first sync)
+        self.sync_refused_peers = set() # Peers having refused to send blocks (pruned), not chosen again during the sync
+        self.sync_received = {} # Key: first height of a received batch waiting for previous batches / Value: list of blocks
+        self.sync_next_height = 0 # Height of the next block to request
+        self.sync_resume_height = None # Height from which an interrupted sync resumes (None for starting from the current chain)
+        self.sync_original = None # (height, blocks) of the chain replaced during sync from 'height', restored if the sync fails
+        self.sync_heights_timeout = 3 # Seconds to wait for the block heights of all peers
+        self.sync_attempt_timeout = 15 # Seconds before starting a new sync attempt
+        self.sync_condition = Condition() # Notified on each sync state change or block height received
+        self.sync_callbacks = [] # Functions called with (node, previous state, new state) on sync state change
+        self.sync_phase = None # Current sync phase ('heights', 'headers' or 'blocks')
+        self.sync_phase_start = 0.
+        self.sync_timings = {} # Key: sync phase / Value: total seconds spent in the phase during the last 'syncWithPeers'
+        self._synced = SyncState.FULLY_SYNCED # Consider initial nodes fully synced
+        self.mempool = Mempool(mempool_max_transactions, mempool_max_bytes)
         self.wallet = existing_wallet
         
         # consensusAlgorithm is True if the node is running PoS, False if it's running PoW
-        self.consensusAlgorithm = ProofOfWork(difficulty) if not consensusAlgorithm else ProofOfStake(difficulty, self.wallet)
-        self.blockchain.createGenesisBlock(self.isPoS())
+        # mining_workers is the number of processes used for mining with PoW (1 mines in the node's mining thread)
+        # pos_slot_time enables PoS leader selection from the stake tree with slots of the given seconds (see ProofOfStake.py)
+        # pos_scheduled_mining makes the PoS lottery sleep until the next eligible timestamp instead of spinning
+        self.consensusAlgorithm = ProofOfWork(difficulty, mining_workers) if not consensusAlgorithm else ProofOfStake(difficulty, self.wallet, self.blockchain, pos_slot_time, pos_scheduled_mining)
+        self.blockchain.createGenesisBlock(self.isPoS(), version=block_version)
+        if block_log is not None: # Store the chain in an append-only log, restoring the chain already stored (see BlockLog.py)
+            # Lazy: blocks are only decoded from the log when accessed / snapshot_interval: blocks between two snapshots of the ledger saved next to the log
+            self.blockchain.openLog(block_log, lazy=lazy_block_log, snapshot_interval=snapshot_interval, binary=binary_codec)
 
     def server_close(self):
         """Overwrite TCPServer implementation for cleaning up on server shutdown."""
         self.client.broadcast({'end': {'server_address': self.server_address}})  # Informs other peers to close the connection
         self.shutdown()
+        self.close()
+
+    def close(self):
+        """Releases the node's listening socket, peer connections, mining thread and worker pools.
+
+        Unlike 'server_close', it doesn't wait for the 'serve_forever' loop to end, so it can be called on nodes that were never served.
+        """
         self.socket.close()
+        for peer in list(self.client.peers):
+            self.client.disconnect(peer, True)
         self.stopMining()
+        self.consensusAlgorithm.shutdown()
+        self.sync_validator.shutdown()
+        self.signature_verifier.shutdown()
+        self.blockchain.closeLog()
+        if self.network is not None:
+            self.network.close()
+
+    def serve_forever(self, poll_interval=0.5):
+        """Overwrite TCPServer implementation for serving peers on the event loop in asyncio mode or in memory."""
+        if self.network is not None:
+            self.network.serve_forever()
+        else:
+            super(FullNode, self).serve_forever(poll_interval)
+
+    def shutdown(self):
+        if self.network is not None:
+            self.network.shutdown()
+        else:
+            super(FullNode, self).shutdown()
 
     def _requireSynced(not_synced_return_value=None):
         """Define a decorator for functions that requires a synced node before being runned.
@@ -117,11 +234,13 @@ class FullNode(socketserver.ThreadingTCPServer):
             try:
                 found = self.consensusAlgorithm.mine(new_block)
                 if found:
-                    # Clear transaction pool even if block gets later invalidated by the network (transactions will be lost in this block)
-                    self.transaction_pool = []
+                    # Remove included transactions even if block gets later invalidated by the network (transactions will be lost in this block)
+                    self.mempool.removeConfirmed(new_block)
                     self.blockchain.addBlock(new_block)
                     self.updateBalance()
-                    self.client.broadcast({"newBlock": new_block.toJSON()})
+                    self.client.broadcast({"newBlock": self._encodeBlock(new_block)}, key=f"newBlock:{new_block.height}")
+                    if self.isPoW():
+                        self._log(logging.debug, f"Mined block #{new_block.height} at {self.consensusAlgorithm.hashRate:.0f} H/s")
             except ValueError: # Raised for PoS when node balance is insufficient 
                 self.isMining = False
 
@@ -135,36 +254,93 @@ class FullNode(socketserver.ThreadingTCPServer):
     def isPoS(self) -> bool:
         return type(self.consensusAlgorithm).__name__ == "ProofOfStake"
 
-    def addToTransactionPool(self, t: Transaction):
-        """Add a transaction to the transaction pool that will be picked up on the next block creation from this node (no update on the current mined block)."""
-        self.transaction_pool.append(t)
+    @property
+    def transaction_pool(self) -> list:
+        return self.mempool.transactions
+
+    def addToTransactionPool(self, t: Transaction) -> bool:
+        """Add a transaction to the transaction pool that will be picked up on the next block creation from this node (no update on the current mined block).
+
+        With 'require_signatures', transactions not signed by their senders, or replaying a nonce already confirmed, are rejected.
+        """
+        if self.require_signatures and not (t.nonces and all(nonce >= self.blockchain.getNonce(addr) for ((addr, _), nonce) in zip(t.senders, t.nonces))
+                                            and self.signature_verifier.verify([t])):
+            return False
+        return self.mempool.add(t)
+
+    def getNextNonce(self, address: str) -> int:
+        """Returns the nonce of the next signed transaction of an address, following its confirmed and pending signed transactions."""
+        return self.blockchain.getNonce(address) + sum(1 for t in self.mempool.getTransactionsFrom(address) if t.nonces)
 
     def removeFromTransactionPool(self, t: Transaction):
-        try:
-            self.transaction_pool.remove(t)
-        except ValueError:
+        if not self.mempool.remove(t.getHash()):
             logging.error(f"Could not find transaction in transaction pool : {t}")
 
     def createNewBlock(self) -> Block:
+        """Creates the next block with the pending transactions its senders can afford (see Mempool.selectTransactions)."""
         previous_block = self.blockchain.lastBlock
         return Block(
             timestamp=time.time(),
-            transactionStore=TransactionStore([t for t in self.transaction_pool]),
+            transactionStore=TransactionStore(self.mempool.selectTransactions(self.blockchain.getBalance,
+                                                                              self.blockchain.getNonce if self.require_signatures else None)),
             height=previous_block.height + 1,
             consensusAlgorithm=self.isPoS(),
             previousHash=previous_block.getHash(),
             miner=self.wallet.address,
-            reward=self.computeReward())
+            reward=self.computeReward(),
+            version=self.block_version)
 
     def computeReward(self) -> int:
         return 1 # TODO : Compute reward, maybe according to consensus algorithm or external rules ?
 
+    def _encodeBlock(self, block: Block) -> str:
+        """Encodes a block sent to peers: JSON, or base64 of the binary encoding with 'binary_codec'."""
+        return base64.b64encode(block.toBytes()).decode() if self.binary_codec else block.toJSON()
+
+    @staticmethod
+    def _decodeBlock(data: str) -> Block:
+        """Decodes a block received from a peer, in either encoding (base64 never contains '{')."""
+        if data.startswith('{'):
+            block = json.loads(data)
+            block['transactionStore'] = TransactionStore.fromJSON(block['transactionStore'])
+            return Block.fromJSON(block)
+        return Block.fromBytes(base64.b64decode(data))
+
     def updateBalance(self):
         """Update the node's balance and starts mining if PoS and node is not already mining."""
         self.wallet.balance = self.blockchain.getBalance(self.wallet.address)
         if self.isPoS() and not self.isMining:
             self.startMining()
 
+    def getMetrics(self) -> dict:
+        """Node state displayed by the simulation (see NodeProcess.py)."""
+        return {
+            'id': self.id,
+            'address': self.wallet.address,
+            'height': self.blockchain.currentHeight,
+            'balance': self.wallet.balance,
+            'hashRate': self.consensusAlgorithm.hashRate if self.isPoW() else 0.,
+        }
+
+    def setGenesisBlock(self, block: Block):
+        """Replaces the first block of the blockchain (shared by all nodes of a simulation)."""
+        self.blockchain.blockChain[0] = block
+        self.wallet.balance = self.blockchain.getBalance(self.wallet.address)
+
+    def setDifficulty(self, difficulty: float, height: int=None):
+        """Changes the mining difficulty from the block at 'height' (the next block if not given), replacing the changes scheduled from this height."""
+        height = self.blockchain.currentHeight + 1 if height is None else height
+        self.difficulty_schedule = [change for change in self.difficulty_schedule if change[0] < height] + [(height, difficulty)]
+        self.consensusAlgorithm.blockDifficulty = difficulty
+
+    def getDifficulty(self, height: int) -> float:
+        """Returns the difficulty the block at 'height' was mined with (see 'difficulty_schedule')."""
+        index = bisect_right(self.difficulty_schedule, (height, float('inf')))
+        return self.difficulty_schedule[max(index - 1, 0)][1]
+
+    def connectToPeer(self, server_address: Tuple[str, int]) -> bool:
+        return self.client.connect(tuple(server_address))
+
     @_requireSynced()
     def startMining(self):
         """Start the node's mining thread. 
@@ -189,21 +365,50 @@ class FullNode(socketserver.ThreadingTCPServer):
     def validateTransaction(self, check_t: Transaction) -> bool:
         """Validate a transaction by comparing UTXO ins and outs.
 
+        With 'require_signatures', the transaction must also be signed by all its senders and carry their next nonce (see Ledger.getNonce).
         See https://github.com/bitcoinbook/bitcoinbook/blob/develop/ch10.asciidoc#independent-verification-of-transactions for reference.
         """
         
-        if not (any(check_t.senders)
-                and any(check_t.receivers)
-                and len(check_t.senders) == len(set(check_t.senders))):  # Check for duplicate inputs
+        if not check_t.isWellFormed():
             return False
 
         for (addr, amount) in check_t.senders:
-            # getBalance() will traverse the entire blockchain for checking the transactions (see implementation in Blockchain.py) 
+            # getBalance() reads the balance from the blockchain's ledger (see implementation in Blockchain.py)
             sender_balance = self.blockchain.getBalance(addr)
             if amount > sender_balance:
                 return False
 
-        return True
+        if self.require_signatures and not (check_t.nonces and all(nonce == self.blockchain.getNonce(addr) for ((addr, _), nonce) in zip(check_t.senders, check_t.nonces))):
+            return False
+
+        return not self.require_signatures or self.signature_verifier.verify([check_t])
+
+    @_requireSynced(not_synced_return_value=False)
+    def validateTransactions(self, transactions: list) -> bool:
+        """Validates the transactions of a block in a single pass, aggregating the debits of each sender across the block.
+
+        Each transaction must be well formed (see 'validateTransaction') and the total spent by each sender in the block must not exceed
+        its balance, rejecting double spends between transactions of the same block. Balances are read once per sender from the ledger,
+        validation stops on the first invalid transaction or overspending sender.
+        With 'require_signatures', the nonces of each sender must follow its ledger nonce in the block order, rejecting replayed transactions.
+        """
+        return self._validateDebits(transactions)
+
+    def _validateDebits(self, transactions: list) -> bool:
+        debits = {} # Key: sender address / Value: total amount spent in the block
+        nonces = {} # Key: sender address / Value: next nonce expected in the block
+        for t in transactions:
+            if not t.isWellFormed() or (self.require_signatures and not t.nonces):
+                return False
+            for (addr, amount) in t.senders:
+                debits[addr] = debits.get(addr, 0) + amount
+            for ((addr, _), nonce) in zip(t.senders, t.nonces):
+                expected = nonces[addr] if addr in nonces else self.blockchain.getNonce(addr)
+                if nonce != expected:
+                    return False
+                nonces[addr] = expected + 1
+
+        return all(total <= self.blockchain.getBalance(addr) for (addr, total) in debits.items())
 
     @_requireSynced(not_synced_return_value=False)
     def validateNewBlock(self, newBlock: Block) -> bool:
@@ -214,24 +419,70 @@ class FullNode(socketserver.ThreadingTCPServer):
         if ((len(self.blockchain.blockChain) and newBlock.height <= self.blockchain.currentHeight)
                 or newBlock.previousHash != self.blockchain.lastBlock.getHash()
                 or newBlock.timestamp - time.time() > 3600  # Prevent block from being too much in the future (1h max)
-                or newBlock.reward != self.computeReward()):
+                or newBlock.reward != self.computeReward()
+                or newBlock.version != self.block_version):
             return False
 
-        if self.isPoW(): # Check the new block hash according to PoW consensus rules (number of zeroes and ones)
-            frac, whole = modf(self.consensusAlgorithm.blockDifficulty)
-            whole = int(whole)
-            if frac == 0:
-                if newBlock.getHash()[0:whole] != '0' * whole:
-                    return False
-            elif frac == 0.5:
-                if newBlock.getHash()[0:whole + 1] != '0' * whole + '1' and newBlock.getHash()[0:whole + 1] != '0' * (whole + 1):
-                    return False
+        if self.isPoW(): # Check the new block hash according to PoW consensus rules (integer target derived from the number of zeroes and ones)
+            if not self.consensusAlgorithm.checkHash(newBlock, self.getDifficulty(newBlock.height)):
+                return False
+
+        return self._validateBlockState(newBlock)
+
+    def _validateBlockState(self, block: Block) -> bool:
+        """Checks the rules of a block following the last block of the chain depending on the ledger: PoS right to mine and balances spent.
+
+        With 'require_signatures', the signatures of the transactions are then verified in a single batch, skipping the cached ones.
+        """
+        if self.isPoS() and self.consensusAlgorithm.isLeaderSelection(): # Check the miner is the leader of the slot stored in the nonce
+            if not self.consensusAlgorithm.checkLeader(block):
+                return False
         elif self.isPoS(): # Check the new block nonce according to PoS consensus rules
-            to_hash = newBlock.previousHash.encode() + newBlock.miner.encode() + newBlock.nonce.to_bytes(8, 'big')
-            if int.from_bytes(h.sha3_256(to_hash).digest(), 'big') > int(2**256 * self.blockchain.getBalance(newBlock.miner) * self.consensusAlgorithm.blockDifficulty):
+            to_hash = block.previousHash.encode() + block.miner.encode() + block.nonce.to_bytes(8, 'big')
+            if int.from_bytes(h.sha3_256(to_hash).digest(), 'big') > int(2**256 * self.blockchain.getBalance(block.miner) * self.consensusAlgorithm.blockDifficulty):
                 return False
 
-        return all([self.validateTransaction(t) for t in newBlock.transactionStore.transactions])  # Validate each transaction in the block
+        transactions = block.transactionStore.transactions
+        return (self._validateDebits(transactions) # Validate the transactions and the total spent by each sender
+                and (not self.require_signatures or self.signature_verifier.verify(transactions)))
+
+    @property
+    def synced(self) -> SyncState:
+        return self._synced
+
+    @synced.setter
+    def synced(self, state: SyncState):
+        """Changes the sync state, waking up the threads waiting on 'sync_condition' and calling the registered callbacks.
+
+        Callbacks may be called while the node holds its sync lock and must not block.
+        """
+        with self.sync_condition:
+            previous = self._synced
+            self._synced = state
+            if state != SyncState.WAITING:
+                self._setSyncPhase(None)
+            self.sync_condition.notify_all()
+
+        if state != previous:
+            for callback in list(self.sync_callbacks):
+                callback(self, previous, state)
+
+    def onSyncStateChange(self, callback: Callable):
+        self.sync_callbacks.append(callback)
+
+    def waitForSync(self, timeout: float=None) -> bool:
+        """Blocks until the sync process ends or 'timeout' seconds elapsed, returns False on timeout."""
+        with self.sync_condition:
+            return self.sync_condition.wait_for(lambda: self.synced != SyncState.WAITING, timeout)
+
+    def _setSyncPhase(self, phase: str):
+        """Ends the current sync phase (adding its duration to 'sync_timings') and starts a new one."""
+        with self.sync_condition:
+            now = time.perf_counter()
+            if self.sync_phase is not None:
+                self.sync_timings[self.sync_phase] = self.sync_timings.get(self.sync_phase, 0.) + now - self.sync_phase_start
+            self.sync_phase = phase
+            self.sync_phase_start = now
 
     def isNodeSynced(self) -> bool:
         return self.synced == SyncState.FULLY_SYNCED or self.synced == SyncState.ALREADY_SYNCED
@@ -241,46 +492,59 @@ class FullNode(socketserver.ThreadingTCPServer):
         
         It consists of four steps:
         - The node sends a 'getLastBlock' RPC request to all its peers to get information about the highest chain.
-        - The peers responds with a 'listLastBlocks' RPC request to the node. It will wait until all peers have responded or timeout after 3 seconds.
+        - The peers responds with a 'listLastBlocks' RPC request to the node. It will wait until all peers have responded or timeout after 'sync_heights_timeout' seconds.
         - If enough responses have been received (more than half of peers), the node will ask the peer with the highest chain for the missing blocks or full blockchain (if hard_sync is True).
-        - The chosen peer will then send an 'updateInventory' RPC request to the node who will update its blockchain. 
+          Blocks are requested in batches of 'sync_batch_size' with up to 'sync_max_in_flight' requests pending.
+        - The chosen peer will then send an 'updateInventory' RPC request for each batch to the node who will apply it to its blockchain as soon as possible.
+          With 'snapshot_sync', a node with only the genesis block first asks the chosen peer for a snapshot of its ledger followed by the blocks
+          after the snapshot ('getSnapshot'), then only downloads the blocks mined since.
+          If an attempt is interrupted, the next one resumes from the last applied block.
+          Blocks of the local chain replaced by the downloaded ones are kept: if the sync fails, or a received block is invalid, the original chain is restored
+          (unless an interrupted attempt already downloaded a longer chain).
+          With 'headers_first_sync', the block hashes are first fetched from the chosen peer and checked for continuity,
+          the batches are then downloaded in parallel from all peers with a high enough chain and checked against the headers.
+          Batches of a peer disconnecting or not answering within 'sync_request_timeout' seconds are reassigned to the other peers.
+
+        Each attempt waits on the sync state (see 'waitForSync') and times out after 'sync_attempt_timeout' seconds.
+        The time spent in each phase ('heights', 'headers', 'blocks') is stored in 'sync_timings'.
         """
-        
-        def _waitSyncLoop():
-            while self.synced == SyncState.WAITING:
-                pass
 
         self.stopMining()
 
         attempt = 1
         self.hardSync = hard_sync
+        self.sync_resume_height = None
+        self.sync_original = None
+        self.sync_refused_peers = set()
+        self.sync_timings = {}
         self.synced = SyncState.WAITING
-        self.syncWaitForAllPeersThread = None
         
         while attempt <= self.max_sync_attempts and not self.isNodeSynced():
             self._log(logging.info, f"Starting sync with peers (attempt {attempt}/{self.max_sync_attempts})...")
 
-            self.syncBlockHeightReceivedFromPeer = {k: 0 for k in self.peers_server.keys()}
+            with self.sync_condition:
+                self.synced = SyncState.WAITING
+                self.syncBlockHeightReceivedFromPeer = {}
+                self._setSyncPhase('heights')
             self.client.broadcast({
                 "getLastBlock": {"latestBlockHeight": self.blockchain.currentHeight}
-            })
+            }, key="getLastBlock")
 
-            wait_sync_loop_thread = Thread(target=_waitSyncLoop)
-            wait_sync_loop_thread.start()
-            wait_sync_loop_thread.join(timeout=15)
-
-            if wait_sync_loop_thread.is_alive(): # 15 seconds timeout reached
+            if not self.waitForSync(timeout=self.sync_attempt_timeout):
                 self._log(logging.warning, f"Timeout for syncing node reached")
+            if not self.isNodeSynced():
+                with self.sync_lock:
+                    self._restoreOriginalChain(keep_longer=True)
 
             attempt += 1
             
+        self._setSyncPhase(None)
+        self._log(logging.info, "Sync phases duration: " + ", ".join(f"{phase}={duration:.3f}s" for (phase, duration) in self.sync_timings.items()))
         if not(self.isNodeSynced()):
             self._log(logging.error, f"Could not sync node: maximum sync attempts reached ({self.max_sync_attempts}/{self.max_sync_attempts})")
         elif autostart_mining: # Node is now synced, start automining if enabled
             self.startMining()
 
-        self.syncWaitForAllPeersThread = None
-
     @_requireSynced(not_synced_return_value=True)
     def RPC_getLastBlock(self, data, client_addr) -> bool:
         """Ask a peer for its blockchain's latest block height."""
@@ -292,61 +556,232 @@ class FullNode(socketserver.ThreadingTCPServer):
             data = {'listLastBlocks': {'lastBlockHeight': lastBlockHeight}}
             
             self._log(logging.debug, f"Sending block height {lastBlockHeight} to {peer}")
-            self.client.send_data_to_peer(data, peer) # TODO : check return data
+            self.client.send_data_to_peer(data, peer, key="listLastBlocks") # TODO : check return data
 
         return True
 
     def RPC_listLastBlocks(self, data, client_addr) -> bool:
         """Waits for receiving block heights from all peers."""
-        def _syncWaitForAllPeers():
-            while (len(self.syncBlockHeightReceivedFromPeer) != len(self.peers_server.keys())): # Try to get data from all peers
-                pass
-
         peer = self.peers_server[client_addr]
-        self.syncBlockHeightReceivedFromPeer[client_addr] = data['lastBlockHeight']
         self._log(logging.debug, f"Received block height {data['lastBlockHeight']} from {peer}")
-        
-        if not self.syncWaitForAllPeersThread:
-            self.syncWaitForAllPeersThread = Thread(target=_syncWaitForAllPeers)
-            self.syncWaitForAllPeersThread.start()
-        else:
-            return True # Run this RPC only once and wait for thread to finish or timeout
 
-        self.syncWaitForAllPeersThread.join(timeout=3)
-        if (len(self.syncBlockHeightReceivedFromPeer) < len(self.peers_server.keys())//2): # If less than half of peers responded, abort sync
+        with self.sync_condition:
+            if self.sync_phase != 'heights': # Heights received too late or outside of a sync attempt
+                return True
+
+            first_height = not self.syncBlockHeightReceivedFromPeer
+            self.syncBlockHeightReceivedFromPeer[client_addr] = data['lastBlockHeight']
+            self.sync_condition.notify_all()
+            if not first_height:
+                return True # Run this RPC only once and wait for the other heights or timeout
+
+            self.sync_condition.wait_for(lambda: len(self.syncBlockHeightReceivedFromPeer) >= len(self.peers_server.keys()), self.sync_heights_timeout)
+            heights = dict(self.syncBlockHeightReceivedFromPeer)
+            self._setSyncPhase('headers' if self.headers_first_sync else 'blocks')
+
+        if (len(heights) < len(self.peers_server.keys())//2): # If less than half of peers responded, abort sync
             self.synced = SyncState.NOT_ENOUGH_HEIGHTS_RECEIVED
             self._log(logging.error, 
-                f"Could not sync node, not enough data received from peers: received={len(self.syncBlockHeightReceivedFromPeer)} < required={len(self.peers_server.keys())//2}")
+                f"Could not sync node, not enough data received from peers: received={len(heights)} < required={len(self.peers_server.keys())//2}")
             return True
 
-        self._log(logging.debug, f"Got {len(self.syncBlockHeightReceivedFromPeer)} block heights from peers: {self.syncBlockHeightReceivedFromPeer}")
-
-        if (self.hardSync): # Reset blockchain state in case of hard sync
-            self.blockchain.blockChain = []
-            self.blockchain.createGenesisBlock()
+        self._log(logging.debug, f"Got {len(heights)} block heights from peers: {heights}")
 
         # Getting peer with highest returned block height and storing both the address and block height received for checking in updateInventory request
-        self.chosen_peer = max(self.syncBlockHeightReceivedFromPeer, key=self.syncBlockHeightReceivedFromPeer.get)
-        self.sync_height = self.syncBlockHeightReceivedFromPeer[self.chosen_peer]
-        peer = self.peers_server[self.chosen_peer]
+        candidates = [addr for addr in heights if not addr in self.sync_refused_peers]
+        if not candidates:
+            self.synced = SyncState.INVALID_PEER
+            self._log(logging.error, f"Could not sync node, all peers refused to send their blocks")
+            return True
+        self.chosen_peer = max(candidates, key=heights.get)
+        self.sync_height = heights[self.chosen_peer]
 
-        if (self.sync_height > self.blockchain.currentHeight):
-            self._log(logging.debug, f"Sending 'getInventory' request to {peer}")
+        if (self.sync_height > self.blockchain.currentHeight or self.hardSync):
+            # Hard sync replaces the full blockchain (unless resuming), else the last block is requested again for checking the chain continuity
+            if self.sync_resume_height is not None:
+                from_height = self.sync_resume_height
+            else:
+                from_height = 0 if self.hardSync else self.blockchain.currentHeight
+
+            if self.snapshot_sync and self.blockchain.currentHeight == 0 and not self.hardSync:
+                self._setSyncPhase('snapshot')
+                self._log(logging.debug, f"Sending 'getSnapshot' request to {self.peers_server[self.chosen_peer]}")
+                self.client.send_data_to_peer({'getSnapshot': {}}, self.peers_server[self.chosen_peer])
+            elif self.headers_first_sync:
+                self._requestHeaders(from_height)
+            else:
+                self._startInventoryDownload(from_height)
+        else: # If maximum received height is same or less than current blockchain height, node is synced
+            self.synced = SyncState.ALREADY_SYNCED
+            self._log(logging.warning, f"Blockchain is already synced at highest block height")
+
+        return True
+
+    def _requestHeaders(self, from_height: int):
+        """Headers-first sync: asks the chosen peer for the hashes of its blocks before downloading them from all peers."""
+        with self.sync_lock:
+            self.sync_headers = {}
+            self.sync_headers_from = from_height
+            peer = self.peers_server[self.chosen_peer]
+            self._log(logging.debug, f"Sending 'getHeaders' request to {peer} for blocks {from_height} to {self.sync_height}")
             self.client.send_data_to_peer({
-                'getInventory': {
-                    'fromHeight': self.blockchain.currentHeight,
+                'getHeaders': {
+                    'fromHeight': from_height,
                     'toHeight': self.sync_height
                 }
             }, peer)
-        else: # If maximum received height is same or less than current blockchain height, node is synced
-            self.synced = SyncState.ALREADY_SYNCED
-            self._log(logging.warning, f"Blockchain is already synced at highest block height")
+
+    def _startInventoryDownload(self, from_height: int):
+        with self.sync_lock:
+            self.sync_requests = {}
+            self.sync_retry = []
+            self.sync_received = {}
+            self.sync_validator.reset()
+            self.sync_failed_peers = set()
+            self.sync_next_height = from_height
+            self.sync_start_height = self.blockchain.currentHeight
+            self._requestInventory()
+
+        if self.headers_first_sync:
+            Thread(target=self._syncWatchdog, daemon=True).start()
+
+    def _pickSyncPeer(self, to_height: int, load: dict) -> tuple:
+        """Returns the least busy peer able to send blocks up to 'to_height', or None if all peers have 'sync_max_in_flight' pending requests."""
+        if self.headers_first_sync:
+            candidates = [addr for (addr, height) in self.syncBlockHeightReceivedFromPeer.items() 
+                          if height >= to_height and addr in self.peers_server and not addr in self.sync_failed_peers]
+        else:
+            candidates = [self.chosen_peer]
+
+        candidates = [addr for addr in candidates if load.get(addr, 0) < self.sync_max_in_flight]
+        return min(candidates, key=lambda addr: load.get(addr, 0)) if candidates else None
+
+    def _requestInventory(self):
+        """Sends 'getInventory' requests for the next batches of blocks until each peer has 'sync_max_in_flight' pending requests (sync_lock must be held).
+
+        Blocks are only requested to the chosen peer, unless headers-first sync is enabled where batches are spread over all peers with a high enough chain.
+        """
+        load = {} # Number of pending requests for each peer
+        for (_, client_addr, _) in self.sync_requests.values():
+            load[client_addr] = load.get(client_addr, 0) + 1
+
+        while self.sync_retry or self.sync_next_height <= self.sync_height:
+            if self.sync_retry: # Batches to reassign first
+                from_height, to_height = self.sync_retry[0]
+            else:
+                from_height = self.sync_next_height
+                to_height = min(from_height + self.sync_batch_size - 1, self.sync_height)
+
+            client_addr = self._pickSyncPeer(to_height, load)
+            if client_addr is None:
+                break
+
+            if self.sync_retry:
+                self.sync_retry.pop(0)
+            else:
+                self.sync_next_height = to_height + 1
+            self.sync_requests[from_height] = (to_height, client_addr, time.time())
+            load[client_addr] = load.get(client_addr, 0) + 1
+
+            peer = self.peers_server[client_addr]
+            self._log(logging.debug, f"Sending 'getInventory' request to {peer} for blocks {from_height} to {to_height}")
+            self.client.send_data_to_peer({
+                'getInventory': {
+                    'fromHeight': from_height,
+                    'toHeight': to_height
+                }
+            }, peer)
+
+    def _failSyncPeer(self, client_addr: tuple, reason: str):
+        """Headers-first sync: stops requesting blocks to a peer and reassigns its pending batches to other peers (sync_lock must be held)."""
+        self._log(logging.warning, f"Reassigning blocks requested to {client_addr} during sync: {reason}")
+        self.sync_failed_peers.add(client_addr)
+        for (from_height, (to_height, addr, _)) in list(self.sync_requests.items()):
+            if addr == client_addr:
+                del self.sync_requests[from_height]
+                self.sync_retry.append((from_height, to_height))
+        self.sync_retry.sort()
+
+        self._requestInventory()
+        if not self.sync_requests: # No peer left to download the remaining blocks
+            self.synced = SyncState.INVALID_STATE
+            self._log(logging.error, f"Could not sync node, no peer left for downloading blocks from height {self.blockchain.currentHeight + 1}")
+
+    def _syncWatchdog(self):
+        """Headers-first sync: reassigns the batches of peers not answering within 'sync_request_timeout' seconds."""
+        while self.synced == SyncState.WAITING:
+            time.sleep(self.sync_request_timeout / 4)
+            with self.sync_lock:
+                now = time.time()
+                for (to_height, client_addr, sent_time) in list(self.sync_requests.values()):
+                    if self.synced == SyncState.WAITING and now - sent_time > self.sync_request_timeout and not client_addr in self.sync_failed_peers:
+                        self._failSyncPeer(client_addr, "request timeout")
+
+    def _applyInventory(self, blocks: list) -> bool:
+        """Replaces the blockchain from the height of the first block with a batch of blocks, returns False if the batch doesn't extend the chain.
+
+        The replaced blocks are kept in 'sync_original' (see '_restoreOriginalChain'). A batch starting with the genesis block (hard sync)
+        must have the same genesis block as the current chain.
+        With 'sync_validation', the blocks must also pass the stateless checks (see SyncValidator.py) and the checks depending on the ledger,
+        each block being checked then committed in order (the caller restores the original chain if a block is invalid).
+        """
+        first_height = blocks[0].height
+        if self.blockchain.pruned_snapshot is not None and first_height < self.blockchain.ledger.base: # Missing blocks can't be rolled back
+            self._log(logging.warning, f"Received blocks from height {first_height} below the snapshot the chain is pruned to")
+            return False
+        if first_height > len(self.blockchain.blockChain) or (first_height == 0 and blocks[0].getHash() != self.blockchain.blockChain[0].getHash()):
+            return False
+
+        invalid = self.sync_validator.checkStateless(blocks) if self.sync_validation else None
+        if invalid is not None:
+            self._log(logging.warning, f"Received invalid block #{invalid[0]} during sync: {invalid[1]}")
+            return False
+
+        previous_block = self.blockchain.blockChain[first_height - 1] if first_height > 0 else None
+        for block in blocks: # Check the batch is a continuous chain extending the current chain
+            if previous_block is not None and (block.height != previous_block.height + 1 or block.previousHash != previous_block.getHash()):
+                return False
+            previous_block = block
+
+        chain = self.blockchain.blockChain
+        fork_height, original = self.sync_original if self.sync_original is not None else (len(chain), [])
+        if first_height < fork_height: # Blocks below the fork height are still the original ones
+            fork_height, original = first_height, list(chain[first_height:fork_height]) + original
+        self.sync_original = (fork_height, original)
+        del chain[first_height:]
+
+        for block in blocks:
+            if self.sync_validation and block.height > 0 and not self._validateBlockState(block):
+                self._log(logging.warning, f"Received invalid block #{block.height} during sync: not allowed to mine or spending missing funds")
+                return False
+            self.blockchain.addBlock(block)
+            self.mempool.removeConfirmed(block)
 
         return True
 
+    def _restoreOriginalChain(self, keep_longer=False):
+        """Replaces the blocks synced since the start of the sync by the original blocks of the chain (sync_lock must be held).
+
+        :param keep_longer: keep the synced blocks if they already form a longer chain than the original one (interrupted sync being resumed)
+        """
+        if self.sync_original is None:
+            return
+        fork_height, original = self.sync_original
+        chain = self.blockchain.blockChain
+        if keep_longer and len(chain) > fork_height + len(original):
+            return
+
+        self._log(logging.warning, f"Restoring the original chain from block {fork_height} ({len(chain) - fork_height} synced blocks discarded)")
+        del chain[fork_height:]
+        for block in original:
+            self.blockchain.addBlock(block)
+        self.sync_original = None
+        self.sync_resume_height = None
+        self.wallet.balance = self.blockchain.getBalance(self.wallet.address)
+
     @_requireSynced(not_synced_return_value=True)
     def RPC_getInventory(self, data, client_addr) -> bool:
-        """Ask a peer for certains blocks."""
+        """Ask a peer for certains blocks, refused ('inventoryRefused') if some of them are pruned."""
         peer = self.peers_server[client_addr]
         from_height = data['fromHeight']
         to_height = data['toHeight']
@@ -354,57 +789,206 @@ class FullNode(socketserver.ThreadingTCPServer):
         self._log(logging.debug, f"Received 'getInventory' request from {peer} with data : {data}")
         if (from_height > to_height):
             self._log(logging.error, f"Malformed inventory request: from_height > to_height")
-        elif (to_height > 0 and to_height <= self.blockchain.currentHeight):
+        elif (from_height >= 0 and to_height <= self.blockchain.currentHeight and self.blockchain.blockChain[from_height] is None): # Pruned blocks can't be sent
+            self._log(logging.debug, f"Refusing inventory to {peer}: blocks from {from_height} are pruned")
+            self.client.send_data_to_peer({'inventoryRefused': {'fromHeight': from_height, 'toHeight': to_height}}, peer)
+        elif (from_height >= 0 and to_height <= self.blockchain.currentHeight):
             data = {'updateInventory': []}
             for block in self.blockchain.blockChain[from_height:to_height+1]: # +1 for index offset
-                data['updateInventory'].append(block.toJSON())
+                data['updateInventory'].append(self._encodeBlock(block))
 
             self._log(logging.debug, f"Sending inventory to {peer}")
             self.client.send_data_to_peer(data, peer)
 
         return True
 
-    def RPC_updateInventory(self, data, client_addr) -> bool:
-        """Update the node's blockchain for blocks received by a chosen peer."""
-        if (client_addr == self.chosen_peer): # Peer verification
-            blocks = data
-            required_blocks = self.sync_height - self.blockchain.currentHeight + 1 # +1 for height index offset
-            if (len(blocks) == required_blocks):
-                original_chain = [b for b in self.blockchain.blockChain]
-                if self.hardSync:
-                    self.blockchain.blockChain = []
-                    
-                for json_block in [json.loads(b) for b in blocks]:
-                    json_block['transactionStore'] = TransactionStore.fromJSON(json_block['transactionStore'])
-                    block = Block.fromJSON(json_block)
-
-                    """Skip blockchain validation allowing for dynamic difficulty change and faster node syncying (not the best way...)."""
-                    # if not(self.validateNewBlock(block)):
-                    # 	self._log(logging.error, 
-                    # 		f"Could not update inventory, blockchain is invalid for block {block.height}: last_block_hash={self.blockchain.lastBlock.getHash()}, new_block_previous_hash={block.previousHash}")
-                    # 	break
-
-                    self.blockchain.addBlock(block)
-
-                if (self.blockchain.currentHeight != self.sync_height):
+    def RPC_inventoryRefused(self, data, client_addr) -> bool:
+        """Requests the blocks refused by a peer (pruned) to another peer."""
+        with self.sync_lock:
+            request = self.sync_requests.get(data['fromHeight'])
+            if not self.synced == SyncState.WAITING or request is None or request[1] != client_addr:
+                self._log(logging.warning, f"Received unexpected 'inventoryRefused' request from {client_addr}")
+            elif self.headers_first_sync:
+                self._failSyncPeer(client_addr, "blocks pruned")
+            else: # Another peer is chosen on the next attempt
+                self.sync_refused_peers.add(client_addr)
+                self.synced = SyncState.INVALID_PEER
+                self._log(logging.warning, f"Chosen peer {client_addr} refused to send blocks from {data['fromHeight']} (pruned)")
+        return True
+
+    @_requireSynced(not_synced_return_value=True)
+    def RPC_getHeaders(self, data, client_addr) -> bool:
+        """Ask a peer for the headers of certains blocks (headers-first sync): height, hash, previous hash, nonce and hashed header (see Block.getHeader)."""
+        peer = self.peers_server[client_addr]
+        from_height = data['fromHeight']
+        to_height = data['toHeight']
+
+        self._log(logging.debug, f"Received 'getHeaders' request from {peer} with data : {data}")
+        if (from_height > to_height or from_height < 0):
+            self._log(logging.error, f"Malformed headers request: from_height={from_height}, to_height={to_height}")
+        elif (to_height <= self.blockchain.currentHeight and self.blockchain.blockChain[from_height] is not None):
+            headers = [[block.height, block.getHash(), block.previousHash, block.nonce, block.getHeader()]
+                       for block in self.blockchain.blockChain[from_height:to_height+1]] # +1 for index offset
+            self.client.send_data_to_peer({'listHeaders': {'headers': headers}}, peer)
+
+        return True
+
+    def RPC_listHeaders(self, data, client_addr) -> bool:
+        """Checks the headers chain received from the chosen peer and starts downloading the blocks from all peers.
+
+        The headers must form a chain extending the local block preceding the first header. The hash of MERKLE_VERSION blocks is computed
+        again from their header, whose height and previous hash must match. With 'sync_validation', each hash must also be below
+        the PoW target at its height. The hashes of other versions cover the transactions and are only checked against the downloaded blocks.
+        """
+        headers = data['headers']
+        with self.sync_lock:
+            if (client_addr != self.chosen_peer or not self.synced == SyncState.WAITING):
+                self._log(logging.warning, f"Received unexpected 'listHeaders' request from {client_addr}")
+                return True
+
+            expected_height = self.sync_headers_from
+            previous_block = self.blockchain.blockChain[expected_height - 1] if expected_height > 0 else None
+            previous_hash = previous_block.getHash() if previous_block is not None else None
+            for (height, block_hash, block_previous_hash, nonce, header) in headers:
+                reason = None
+                if height != expected_height or (previous_hash is not None and block_previous_hash != previous_hash):
+                    reason = "discontinuous headers chain"
+                elif header is not None and (Block.decodeHeader(header) != (Block.MERKLE_VERSION, height, block_previous_hash)
+                                             or Block.hashHeader(header, nonce) != block_hash):
+                    reason = "header not matching its hash"
+                elif header is None and self.block_version == Block.MERKLE_VERSION:
+                    reason = "missing header"
+                elif self.sync_validation and self.isPoW() and height > 0 and int(block_hash, 16) >= self.consensusAlgorithm.getTarget(self.getDifficulty(height)):
+                    reason = "hash above the PoW target"
+                if reason is not None:
                     self.synced = SyncState.INVALID_STATE
-                    self.blockchain.blockChain = original_chain # Restore original chain
-                else:
-                    self.synced = SyncState.FULLY_SYNCED
-                    self._log(logging.info,
-                        f"Finished syncing blockchain state from block {original_chain[-1].height} to block {self.sync_height} (chosen_peer={self.chosen_peer}) [success]")
-            elif (required_blocks == 0):
-                self.synced = SyncState.ALREADY_SYNCED
-                self._log(logging.warning, 
-                    f"Blockchain state is already updated from {client_addr}")
-            else:
+                    self._log(logging.warning, f"Received 'listHeaders' request with an invalid header at block {height}: {reason}")
+                    return True
+                self.sync_headers[height] = block_hash
+                expected_height += 1
+                previous_hash = block_hash
+
+            if (expected_height != self.sync_height + 1):
                 self.synced = SyncState.INVALID_STATE
-                self._log(logging.warning, 
-                    f"Received 'updateInventory' request with wrong number of blocks: len_block={len(blocks)}, required_blocks={required_blocks}")
+                self._log(logging.warning, f"Received 'listHeaders' request with wrong number of headers: len_headers={len(headers)}, sync_height={self.sync_height}")
+                return True
+
+        self._setSyncPhase('blocks')
+        self._startInventoryDownload(self.sync_headers_from)
+        return True
+
+    @_requireSynced(not_synced_return_value=True)
+    def RPC_getSnapshot(self, data, client_addr) -> bool:
+        """Sends a snapshot of the ledger (last saved snapshot, or the ledger at the last block) and the blocks from the snapshot height to a peer."""
+        peer = self.peers_server[client_addr]
+        snapshot = self.blockchain.snapshot
+        if snapshot is None or snapshot.height > self.blockchain.currentHeight or self.blockchain.blockChain[snapshot.height].getHash() != snapshot.tipHash:
+            snapshot = self.blockchain.getSnapshot()
+
+        self._log(logging.debug, f"Sending snapshot at height {snapshot.height} and {self.blockchain.currentHeight - snapshot.height} blocks to {peer}")
+        self.client.send_data_to_peer({'snapshot': {
+            'commitment': snapshot.getHash(),
+            'snapshot': snapshot.toJSON(),
+            'blocks': [self._encodeBlock(block) for block in self.blockchain.blockChain[snapshot.height:]]
+        }}, peer)
+        return True
+
+    def RPC_snapshot(self, data, client_addr) -> bool:
+        """Restores the ledger from the snapshot of the chosen peer and requests the blocks mined since.
+
+        The commitment is computed by the peer sending the snapshot, so it only detects a corrupted transfer: without 'snapshot_checkpoints',
+        the snapshot of the chosen peer is trusted on first use (with a warning), a dishonest peer being able to forge any balances.
+        With 'snapshot_checkpoints', only the snapshots whose commitment is configured for their height are accepted.
+        With 'sync_validation', the blocks following the snapshot are validated against its ledger, the node reverting to its genesis block if one is invalid.
+        """
+        if client_addr != self.chosen_peer or self.sync_phase != 'snapshot' or not self.synced == SyncState.WAITING:
+            self._log(logging.warning, f"Received unexpected 'snapshot' request from {client_addr}")
+            return True
+
+        try:
+            snapshot = Snapshot.fromJSON(json.loads(data['snapshot']))
+            blocks = [FullNode._decodeBlock(b) for b in data['blocks']]
+            if snapshot.getHash() != data['commitment']:
+                raise ValueError(f"snapshot doesn't match its commitment {data['commitment']}")
+            if self.snapshot_checkpoints is not None and self.snapshot_checkpoints.get(snapshot.height) != data['commitment']:
+                raise ValueError(f"snapshot at height {snapshot.height} doesn't match a checkpoint")
+            with self.sync_lock:
+                genesis = self.blockchain.blockChain[0]
+                # Blocks following the snapshot are validated as with 'updateInventory' (only their continuity without 'sync_validation')
+                self.blockchain.loadSnapshot(snapshot, blocks[:1] if self.sync_validation else blocks)
+                if self.sync_validation and len(blocks) > 1 and not self._applyInventory(blocks[1:]):
+                    self.sync_original = None
+                    self.blockchain.dropSnapshot(genesis)
+                    raise ValueError(f"invalid blocks following the snapshot at height {snapshot.height}")
+                self.wallet.balance = self.blockchain.getBalance(self.wallet.address)
+        except (ValueError, KeyError, TypeError, AttributeError, IndexError, struct.error) as e: # Malformed or invalid snapshot
+            self.synced = SyncState.INVALID_PEER
+            self._log(logging.warning, f"Received invalid snapshot from {client_addr}: {e!r}")
+            return True
+
+        if self.snapshot_checkpoints is None:
+            self._log(logging.warning, f"Trusting the unverified snapshot at height {snapshot.height} of {client_addr}, configure 'snapshot_checkpoints' for checking it")
+        self._log(logging.info, f"Restored ledger from snapshot at height {snapshot.height} with {len(blocks) - 1} following blocks (chosen_peer={self.chosen_peer}) [success]")
+        if self.blockchain.currentHeight >= self.sync_height:
+            self.synced = SyncState.FULLY_SYNCED
+        elif self.headers_first_sync: # Blocks mined since the snapshot was sent
+            self._setSyncPhase('headers')
+            self._requestHeaders(self.blockchain.currentHeight + 1)
         else:
+            self._setSyncPhase('blocks')
+            self._startInventoryDownload(self.blockchain.currentHeight + 1)
+        return True
+
+    def RPC_updateInventory(self, data, client_addr) -> bool:
+        """Applies a batch of blocks received by a peer and requests the next batches."""
+        if (client_addr != self.chosen_peer and not self.headers_first_sync): # Peer verification
             self.synced = SyncState.INVALID_PEER
             self._log(logging.warning, 
                 f"Received 'updateInventory' request from non-chosen peer: client_addr={client_addr}")
+            return True
+
+        blocks = [FullNode._decodeBlock(b) for b in data]
+
+        """Unless 'sync_validation' is disabled, blocks are fully validated, PoW hashes being checked against the difficulty at their height."""
+        with self.sync_lock:
+            request = self.sync_requests.get(blocks[0].height) if blocks else None
+            if not self.synced == SyncState.WAITING or request is None or request[1] != client_addr:
+                self._log(logging.warning, f"Received unexpected 'updateInventory' request from {client_addr}: len_block={len(blocks)}")
+                return True
+
+            if self.headers_first_sync and any(self.sync_headers.get(block.height) != block.getHash() for block in blocks):
+                self._failSyncPeer(client_addr, "blocks not matching the headers chain")
+                return True
+
+            to_height = self.sync_requests.pop(blocks[0].height)[0]
+            self.sync_received[blocks[0].height] = blocks
+            if self.sync_validation: # Stateless checks run in the background while the next batches are requested
+                self.sync_validator.submit(blocks)
+            if blocks[-1].height < to_height: # Request missing blocks of an incomplete batch
+                self.sync_retry.insert(0, (blocks[-1].height + 1, to_height))
+            self._requestInventory() # Refill the freed request slot before applying, the peers send the next batches meanwhile
+
+            # Apply received batches in order
+            while self.sync_received and min(self.sync_received) <= len(self.blockchain.blockChain):
+                batch = self.sync_received.pop(min(self.sync_received))
+                if not self._applyInventory(batch):
+                    self._restoreOriginalChain() # Chain from the peer is not continuous or invalid, discard all its blocks
+                    self.synced = SyncState.INVALID_STATE
+                    self.sync_resume_height = None # Start over on next attempt
+                    self._log(logging.warning, 
+                        f"Received 'updateInventory' request with a discontinuous or invalid chain from block {batch[0].height} to block {batch[-1].height}")
+                    return True
+
+                self.sync_resume_height = self.blockchain.currentHeight + 1
+                self._log(logging.debug, f"Applied blocks {batch[0].height} to {batch[-1].height} ({self.blockchain.currentHeight}/{self.sync_height})")
+
+            if (self.blockchain.currentHeight >= self.sync_height):
+                self.synced = SyncState.FULLY_SYNCED
+                self.sync_resume_height = None
+                self._log(logging.info,
+                    f"Finished syncing blockchain state from block {self.sync_start_height} to block {self.sync_height} (chosen_peer={self.chosen_peer}) [success]")
+            else:
+                self._requestInventory()
 
         return True
 
@@ -422,14 +1006,13 @@ class FullNode(socketserver.ThreadingTCPServer):
     @_requireSynced(not_synced_return_value=True)
     def RPC_newBlock(self, data, client_addr) -> bool:
         """Validates a new block received from the network."""
-        data = json.loads(data)
-        data['transactionStore'] = TransactionStore.fromJSON(data['transactionStore']);
-        block = Block.fromJSON(data)
+        block = FullNode._decodeBlock(data)
         peer = self.peers_server[client_addr]
-        self._log(logging.debug, f"Received 'newBlock' request from {peer} with data : {data}")
+        self._log(logging.debug, f"Received 'newBlock' request from {peer} with data : {block}")
         if (self.validateNewBlock(block)):
             self.consensusAlgorithm.stopMining() # Stop mining for this block and start mining next one
             self.blockchain.addBlock(block)
+            self.mempool.removeConfirmed(block)
             self._log(logging.info, f"Validated block #{block.height} from {peer} (hash: {block.getHash()}) [success]")
             self.updateBalance()
         else:
@@ -437,10 +1020,27 @@ class FullNode(socketserver.ThreadingTCPServer):
                       f"Block #{block.height} from {peer} is invalid: hash={block.getHash()}, currentHeight={self.blockchain.currentHeight}")
         return True
 
+    def _onPeerDropped(self, server_address: tuple):
+        """Forgets a peer disconnected by the client (e.g. too slow), reassigning the blocks requested to it during sync."""
+        self._log(logging.warning, f"Peer {server_address} dropped by the client")
+        for client_addr in [c for (c, s) in list(self.peers_server.items()) if s == server_address]:
+            if self.headers_first_sync and self.synced == SyncState.WAITING:
+                with self.sync_lock:
+                    if any(addr == client_addr for (_, addr, _) in self.sync_requests.values()):
+                        self._failSyncPeer(client_addr, "peer dropped")
+            elif self.synced == SyncState.WAITING and client_addr == self.chosen_peer: # Blocks requested won't be received
+                self.synced = SyncState.INVALID_PEER
+            self.peers_server.pop(client_addr, None)
+            self.syncBlockHeightReceivedFromPeer.pop(client_addr, None)
+
     def RPC_end(self, data, client_addr) -> bool:
         """Terminates a peer's connection."""
         server_address = tuple(data['server_address'])
         self._log(logging.debug, f"Received disconnect request from {server_address}")
+        if self.headers_first_sync and self.synced == SyncState.WAITING:
+            with self.sync_lock:
+                if any(addr == client_addr for (_, addr, _) in self.sync_requests.values()):
+                    self._failSyncPeer(client_addr, "peer disconnected")
         self.client.disconnect(server_address, True)  # Disconnects and remove the peer from the peers list
 
         return False
\ No newline at end of file
@@ -0,0 +1,164 @@
+import itertools
+import logging
+import traceback
+from queue import SimpleQueue
+from threading import Event, Lock, Thread
+from typing import Callable, Tuple
+
+from app.TCPHandler import dispatchRPC
+from app.Transport import *
+
+class InProcessNetwork:
+    """Registry of the nodes of a simulation running in the same process, exchanging messages through in-memory queues instead of TCP sockets.
+
+    Messages are passed as already decoded dicts (no framing, encoding or kernel round trip) and nodes don't bind any port,
+    the server addresses only identify the nodes. The 'RPC_' methods are called the same way as with TCP:
+    each connection has its own handler thread, handling the messages of the connection in order.
+    """
+    def __init__(self):
+        self.servers = {} # Key: (HOST, PORT) of a node / Value: InProcessServer of the node
+        self._lock = Lock()
+        self._client_ports = itertools.count(1) # Pseudo client ports identifying each connection (see FullNode.peers_server)
+
+    def register(self, server: 'InProcessServer'):
+        with self._lock:
+            if server.address in self.servers:
+                raise ValueError(f"Address {server.address} already used in the in-process network")
+            self.servers[server.address] = server
+
+    def unregister(self, server: 'InProcessServer'):
+        with self._lock:
+            if self.servers.get(server.address) is server:
+                del self.servers[server.address]
+
+    def open(self, client_host: str, peer: Tuple[str, int]) -> 'InProcessConnection':
+        """Opens a connection to the node at address 'peer', returns None if no node is listening."""
+        with self._lock:
+            server = self.servers.get(peer)
+            client_addr = (client_host, next(self._client_ports))
+        return server.accept(client_addr) if server is not None else None
+
+class InProcessConnection:
+    """One-directional connection to a node: messages are queued and handled by a thread of the receiving node."""
+    def __init__(self, server: 'InProcessServer', client_addr: Tuple[str, int]):
+        self.server = server
+        self.client_addr = client_addr
+        self.closed = False
+        self._inbox = SimpleQueue()
+        self._thread = Thread(target=self._handle, daemon=True)
+        self._thread.start()
+
+    def send(self, data: dict) -> bool:
+        if self.closed:
+            return False
+        self._inbox.put(data)
+        return True
+
+    def close(self):
+        """Closes the connection once the already queued messages are handled (like a closed socket)."""
+        if not self.closed:
+            self.closed = True
+            self._inbox.put(None)
+
+    def _handle(self):
+        """Thread equivalent of 'TCPHandler.handle' for the in-memory connection."""
+        node = self.server.node
+        keep_alive = True
+        while (keep_alive):
+            payload = self._inbox.get()
+            if payload is None: # Connection closed by the peer or the node
+                break
+
+            try:
+                keep_alive = dispatchRPC(node, payload, self.client_addr)
+            except Exception as e:
+                self.server._log(logging.error, f"Exception in InProcessConnection: {traceback.format_exc()}")
+                keep_alive = False
+
+        self.closed = True
+        self.server.connections.discard(self)
+        self.server._log(logging.info, f"Closed connection with {self.client_addr} [success]")
+
+class InProcessServer(TransportServer):
+    """Receiving side of a node in an 'InProcessNetwork', registered from the node creation so peers can connect before the server is started.
+
+    :param node: the FullNode whose 'RPC_' methods are called
+    :param network: the in-process network of the simulation
+    :param address: (HOST, PORT) identifying the node in the network
+    """
+    def __init__(self, node, network: InProcessNetwork, address: Tuple[str, int]):
+        self.node = node
+        self.network = network
+        self.address = tuple(address)
+        self.connections = set()
+        self._is_shut_down = Event()
+        self._is_shut_down.set()
+        self.network.register(self)
+
+    def accept(self, client_addr: Tuple[str, int]) -> InProcessConnection:
+        connection = InProcessConnection(self, client_addr)
+        self.connections.add(connection)
+        return connection
+
+    def serve_forever(self):
+        self._is_shut_down.clear()
+        self._is_shut_down.wait()
+
+    def shutdown(self):
+        self._is_shut_down.set()
+
+    def close(self):
+        """Stops accepting connections and closes the connections received from peers."""
+        self.shutdown()
+        self.network.unregister(self)
+        for connection in list(self.connections):
+            connection.close()
+
+    def _log(self, level_func: Callable, msg: str):
+        level_func(f"H:[{self.node.id}] " + msg)
+
+class InProcessClient(Transport):
+    """Counterpart of 'TCPClient' for nodes of an 'InProcessNetwork', messages are passed to the peers without being serialized."""
+    def __init__(self, server_addr, network: InProcessNetwork):
+        super(InProcessClient, self).__init__()
+        self.peers = {} # Key : (HOST, PORT) / Value : InProcessConnection to the peer
+        self.binary_peers = set() # Unused, kept for the same interface as 'TCPClient'
+        self.network = network
+        self.server_addr = tuple(server_addr)
+
+    def send_data_to_peer(self, data: dict, peer: Tuple[str, int], key=None) -> bool:
+        logging.debug(f"Trying to send {data} to {peer}")
+        connection = self.peers.get(peer)
+        if connection is not None and connection.send(data):
+            return True
+
+        logging.error(f" InProcessClient : Could not send to {peer}")
+        return False
+
+    def connect(self, peer: Tuple[str, int]) -> bool:
+        peer = tuple(peer)
+        if peer in self.peers:  # Prevent connecting back to already connected peers
+            return False
+
+        connection = self.network.open(self.server_addr[0], peer)
+        if connection is None:
+            logging.error(f"connect: no node at {peer} in the in-process network")
+            return False
+
+        self.peers[peer] = connection
+        return connection.send({'connect': {'server_address': self.server_addr, 'peers': list(self.peers.keys())}})
+
+    def disconnect(self, peer: Tuple[str, int], clear=False) -> bool:
+        peer = tuple(peer)
+        if not peer in self.peers:
+            return False
+
+        self.peers[peer].close()
+        if clear:
+            del self.peers[peer]
+
+        return True
+
+    def broadcast(self, data: dict, key=None):
+        for connection in list(self.peers.values()):
+            connection.send(data)
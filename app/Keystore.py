@@ -0,0 +1,103 @@
+import hashlib as h
+import hmac
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Union
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+class Keystore:
+    """File caching the keys derived from the wallet seeds, so a wallet created again skips the key derivation (see Wallet.py).
+
+    Entries are identified by an HMAC of the seed and the KDF iterations, the seeds themselves are not stored.
+    With a 'password', each derived key is encrypted with AES-GCM under a key derived once from the password (scrypt, random salt stored in the file),
+    the HMAC key being derived along with it: seeds can't be brute-forced from the entry ids without the password.
+    Without password, the HMAC key is the salt of the file (only defeating precomputed tables) and the derived keys (hence the wallets private keys)
+    are stored in clear: only use it for simulations.
+
+    :param file: path of the keystore file, created on the first 'save'
+    :param password: password encrypting the keystore, None for an unencrypted keystore
+    """
+
+    CHECK_DATA = b'baroucoin keystore' # Encrypted with the keystore key for detecting a wrong password on load
+    VERSION = 2 # Format of the entry ids, entries of keystores of other versions are dropped on load (their keys are derived again)
+
+    def __init__(self, file: Union[str, Path], password: bytes=None):
+        self.file = str(file)
+        self._keys = {} # Key: entry id / Value: derived key, encrypted (nonce + ciphertext) with a password
+        self._lock = Lock()
+        self._salt = None
+        self._check = None
+        if Path(self.file).is_file():
+            with open(self.file) as f:
+                data = json.load(f)
+            self._salt = bytes.fromhex(data['salt']) if data['salt'] is not None else None
+            self._check = bytes.fromhex(data['check']) if data['check'] is not None else None
+            if data.get('version') == Keystore.VERSION:
+                self._keys = {entry: bytes.fromhex(value) for (entry, value) in data['keys'].items()}
+            if (self._check is not None) != (password is not None):
+                raise ValueError(f"Keystore '{self.file}' is {'encrypted' if self._check is not None else 'not encrypted'}")
+
+        if self._salt is None:
+            self._salt = os.urandom(16)
+        self._cipher = None
+        self._entry_key = self._salt
+        if password is not None:
+            key = Scrypt(salt=self._salt, length=64, n=2**14, r=8, p=1).derive(password)
+            self._cipher = AESGCM(key[:32])
+            self._entry_key = key[32:]
+            if self._check is None:
+                self._check = self._encrypt(Keystore.CHECK_DATA, b'check')
+            elif self._decrypt(self._check, b'check') != Keystore.CHECK_DATA:
+                raise ValueError(f"Wrong password for keystore '{self.file}'")
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _entry(self, seed: bytes, iterations: int) -> str:
+        return hmac.new(self._entry_key, b'%d:' % iterations + seed, h.sha256).hexdigest()
+
+    def _encrypt(self, data: bytes, entry: bytes) -> bytes:
+        nonce = os.urandom(12)
+        return nonce + self._cipher.encrypt(nonce, data, entry) # The entry id is authenticated, an entry can't be moved to another seed
+
+    def _decrypt(self, data: bytes, entry: bytes) -> bytes:
+        try:
+            return self._cipher.decrypt(data[:12], data[12:], entry)
+        except InvalidTag:
+            return None
+
+    def get(self, seed: bytes, iterations: int) -> bytes:
+        """Returns the key derived from the seed with the given KDF iterations, or None if not cached."""
+        entry = self._entry(seed, iterations)
+        with self._lock:
+            value = self._keys.get(entry)
+        if value is None or self._cipher is None:
+            return value
+        return self._decrypt(value, entry.encode())
+
+    def put(self, seed: bytes, iterations: int, derived_key: bytes):
+        """Caches a derived key, written to the file on the next 'save'."""
+        entry = self._entry(seed, iterations)
+        value = self._encrypt(derived_key, entry.encode()) if self._cipher is not None else derived_key
+        with self._lock:
+            self._keys[entry] = value
+
+    def save(self):
+        """Writes the keystore, replacing the file atomically (a crash leaves the previous keystore)."""
+        with self._lock:
+            data = {
+                'version': Keystore.VERSION,
+                'salt': self._salt.hex(),
+                'check': self._check.hex() if self._check is not None else None,
+                'keys': {entry: value.hex() for (entry, value) in self._keys.items()}
+            }
+        with open(self.file + '.tmp', 'w') as f:
+            f.write(json.dumps(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.file + '.tmp', self.file)
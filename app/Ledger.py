@@ -0,0 +1,111 @@
+from threading import RLock
+
+from app.StakeTree import *
+
+class Ledger:
+    """Address balances kept up to date incrementally as blocks are applied.
+
+    The balance changes of each applied block are recorded so the ledger can be rolled back block by block
+    when the end of the chain is replaced (sync, restored chain, ...).
+    A ledger restored from a snapshot has no balance changes recorded for the blocks up to the snapshot:
+    rolling back one of them resets the ledger, the chain being applied again from the first block.
+    Positive balances are mirrored in a stake tree used for drawing PoS leaders (see StakeTree.py).
+    The nonce of an address is the number of its signed transactions applied, the next signed transaction of the address carrying it (see Transaction.py).
+    """
+    ISSUER = "0" # Address issuing the initial supply in the genesis block (see Blockchain.createGenesisBlock), which has no stake
+
+    def __init__(self):
+        self.balances = {} # Key: address / Value: balance (addresses with a null balance are not stored)
+        self.lock = RLock()
+        self.stakes = StakeTree()
+        self.base = 0 # Number of blocks applied before the recorded changes (blocks covered by a restored snapshot)
+        self._changes = [] # Balance changes of each applied block, in chain order
+        self._stakes_lengths = [] # Number of addresses in the stake tree before each applied block
+        self.nonces = {} # Key: address / Value: number of signed transactions sent (addresses without signed transaction are not stored)
+        self._nonce_changes = [] # Signed transactions count of each sender of each applied block, None for blocks without signed transaction
+
+    def __len__(self):
+        """Number of blocks applied to the ledger."""
+        return self.base + len(self._changes)
+
+    @staticmethod
+    def getBlockChanges(block) -> dict:
+        """Computes the balance change of each address involved in a block (mining reward and transactions)."""
+        changes = {block.miner: block.reward}
+        for transaction in block.transactionStore.transactions:
+            for (sender, amount) in transaction.senders:
+                changes[sender] = changes.get(sender, 0) - amount
+            for (receiver, amount) in transaction.receivers:
+                changes[receiver] = changes.get(receiver, 0) + amount
+
+        return changes
+
+    @staticmethod
+    def getNonceChanges(block) -> dict:
+        """Counts the signed transactions of each sender in a block, None if the block has no signed transaction."""
+        changes = None
+        for transaction in block.transactionStore.transactions:
+            if transaction.nonces:
+                changes = changes if changes is not None else {}
+                for (sender, _) in transaction.senders:
+                    changes[sender] = changes.get(sender, 0) + 1
+        return changes
+
+    def getBalance(self, address: str) -> int:
+        return self.balances.get(address, 0)
+
+    def getNonce(self, address: str) -> int:
+        """Returns the nonce expected in the next signed transaction of an address."""
+        return self.nonces.get(address, 0)
+
+    def applyBlock(self, block):
+        with self.lock:
+            changes = Ledger.getBlockChanges(block)
+            self._stakes_lengths.append(len(self.stakes))
+            self._update(changes, 1)
+            self._changes.append(changes)
+            nonce_changes = Ledger.getNonceChanges(block)
+            if nonce_changes is not None:
+                self._updateNonces(nonce_changes, 1)
+            self._nonce_changes.append(nonce_changes)
+
+    def rollback(self, length: int):
+        """Reverts the last applied blocks until only 'length' blocks remain applied."""
+        with self.lock:
+            if length < self.base: # Changes of the blocks covered by the snapshot are unknown
+                self.restore({}, [], 0)
+            while len(self) > length:
+                self._update(self._changes.pop(), -1)
+                nonce_changes = self._nonce_changes.pop()
+                if nonce_changes is not None:
+                    self._updateNonces(nonce_changes, -1)
+                self.stakes.truncate(self._stakes_lengths.pop()) # Addresses added by the block are removed, keeping the same leaves order as nodes without the block
+
+    def restore(self, balances: dict, stakes: list, length: int, nonces: dict=None):
+        """Replaces the ledger state with the balances, stakes (in stake tree order) and nonces after the first 'length' blocks (see Snapshot.py)."""
+        with self.lock:
+            self.balances = dict(balances)
+            self.nonces = dict(nonces or {})
+            self._nonce_changes = []
+            self.stakes = StakeTree.fromList(stakes)
+            self.base = length
+            self._changes = []
+            self._stakes_lengths = []
+
+    def _update(self, changes: dict, sign: int):
+        for (address, amount) in changes.items():
+            balance = self.balances.get(address, 0) + sign * amount
+            if balance:
+                self.balances[address] = balance
+            else:
+                self.balances.pop(address, None)
+            if address != Ledger.ISSUER:
+                self.stakes.setStake(address, balance)
+
+    def _updateNonces(self, changes: dict, sign: int):
+        for (address, count) in changes.items():
+            nonce = self.nonces.get(address, 0) + sign * count
+            if nonce:
+                self.nonces[address] = nonce
+            else:
+                self.nonces.pop(address, None)
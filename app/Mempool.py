@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from threading import RLock
+from typing import Callable
+
+from app.Transaction import *
+
+class Mempool:
+    """Pool of pending transactions keyed by transaction hash.
+
+    Transactions are kept in arrival order with an index of transaction hashes per sender address.
+    When adding a transaction would exceed 'max_transactions' or 'max_bytes', the oldest transactions are evicted first.
+
+    :param max_transactions: maximum number of transactions in the pool
+    :param max_bytes: maximum total size of the pool (size of the JSON serialized transactions)
+    """
+    def __init__(self, max_transactions: int=10_000, max_bytes: int=5_000_000):
+        self.max_transactions = max_transactions
+        self.max_bytes = max_bytes
+        self.size = 0 # Total size in bytes of the pooled transactions
+        self._transactions = OrderedDict() # Key: transaction hash / Value: (transaction, size)
+        self._by_sender = {} # Key: sender address / Value: dict of transaction hashes (used as an ordered set)
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._transactions)
+
+    def __contains__(self, txid: str):
+        return txid in self._transactions
+
+    @property
+    def transactions(self) -> list:
+        """Pending transactions in arrival order."""
+        with self._lock:
+            return [t for (t, _) in self._transactions.values()]
+
+    def getTransactionsFrom(self, address: str) -> list:
+        with self._lock:
+            return [self._transactions[txid][0] for txid in self._by_sender.get(address, ())]
+
+    def selectTransactions(self, getBalance: Callable, getNonce: Callable=None) -> list:
+        """Returns the pending transactions, in arrival order, that a block can include without any sender spending more than its balance.
+
+        Debits are aggregated per sender like the block validation (see FullNode.validateTransactions): the balance of each sender of
+        the '_by_sender' index is read once, transactions malformed or overspending one of their senders are skipped (and kept in the pool).
+        With 'getNonce', only signed transactions carrying the next nonce of each of their senders are selected (see Ledger.getNonce).
+        """
+        with self._lock:
+            balances = {sender: getBalance(sender) for sender in self._by_sender}
+            nonces = {sender: getNonce(sender) for sender in self._by_sender} if getNonce is not None else None
+            selected = []
+            for (t, _) in self._transactions.values():
+                if (t.isWellFormed() and all(amount <= balances[addr] for (addr, amount) in t.senders)
+                        and (nonces is None or (t.nonces and all(nonce == nonces[addr] for ((addr, _), nonce) in zip(t.senders, t.nonces))))):
+                    for (addr, amount) in t.senders:
+                        balances[addr] -= amount
+                        if nonces is not None:
+                            nonces[addr] += 1
+                    selected.append(t)
+
+        return selected
+
+    def add(self, t: Transaction) -> bool:
+        """Adds a transaction to the pool, returns False if it is a duplicate or too large to fit in the pool."""
+        txid = t.getHash()
+        size = len(t.toJSON())
+        with self._lock:
+            if txid in self._transactions or size > self.max_bytes or self.max_transactions <= 0:
+                return False
+
+            while len(self._transactions) >= self.max_transactions or self.size + size > self.max_bytes:
+                self.remove(next(iter(self._transactions))) # Evict oldest transaction
+
+            self._transactions[txid] = (t, size)
+            self.size += size
+            for (sender, _) in t.senders:
+                self._by_sender.setdefault(sender, {})[txid] = None
+
+        return True
+
+    def remove(self, txid: str) -> bool:
+        with self._lock:
+            if not txid in self._transactions:
+                return False
+
+            t, size = self._transactions.pop(txid)
+            self.size -= size
+            for (sender, _) in t.senders:
+                txids = self._by_sender.get(sender)
+                if txids is not None:
+                    txids.pop(txid, None)
+                    if not txids:
+                        del self._by_sender[sender]
+
+        return True
+
+    def removeConfirmed(self, block) -> int:
+        """Removes the transactions included in a block, returns the number of transactions removed."""
+        return sum(self.remove(t.getHash()) for t in block.transactionStore.transactions)
+
+    def clear(self):
+        with self._lock:
+            self._transactions.clear()
+            self._by_sender.clear()
+            self.size = 0
@@ -0,0 +1,73 @@
+from __future__ import annotations # Allows for using class type hinting within class (see https://stackoverflow.com/a/33533514)
+import hashlib as h
+
+class MerkleTree:
+    """Merkle tree of the transactions of a block, committing to all of them with a single 32 bytes root.
+
+    Leaves are the transaction hashes, inner nodes hash their two children prefixed by INNER_PREFIX (so an inner node can't be
+    passed off as a transaction). A node without sibling (last node of a level with an odd number of nodes) is moved up unchanged,
+    instead of being paired with itself, so two different lists of transactions can't have the same root.
+    Appending a leaf only updates the last node of each level, in O(log n) hashes.
+
+    :param leaves: hashes (32 bytes) of the transactions
+    """
+
+    INNER_PREFIX = b'\x01'
+    EMPTY_ROOT = bytes(32) # Root of a block without transactions
+
+    def __init__(self, leaves: list=()):
+        self.levels = [[]] # Nodes of each level, from the leaves to the root
+        for leaf in leaves:
+            self.append(leaf)
+
+    def __len__(self):
+        """Number of leaves in the tree."""
+        return len(self.levels[0])
+
+    @property
+    def root(self) -> bytes:
+        return self.levels[-1][0] if self.levels[0] else MerkleTree.EMPTY_ROOT
+
+    @staticmethod
+    def hashPair(left: bytes, right: bytes) -> bytes:
+        return h.sha3_256(MerkleTree.INNER_PREFIX + left + right).digest()
+
+    def append(self, leaf: bytes):
+        """Adds a leaf after the last one, updating its ancestors."""
+        index = len(self.levels[0])
+        self.levels[0].append(leaf)
+        level = 0
+        while len(self.levels[level]) > 1:
+            nodes = self.levels[level]
+            parent = index // 2
+            node = MerkleTree.hashPair(nodes[2*parent], nodes[2*parent + 1]) if 2*parent + 1 < len(nodes) else nodes[2*parent]
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            upper = self.levels[level + 1]
+            if parent == len(upper):
+                upper.append(node)
+            else:
+                upper[parent] = node
+            index = parent
+            level += 1
+
+    def getProof(self, index: int) -> list:
+        """Returns the inclusion proof of the leaf at 'index': the (sibling, sibling is on the left) pairs hashed with the leaf up to the root."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"No leaf #{index} in the tree ({len(self)} leaves)")
+
+        proof = []
+        for nodes in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(nodes): # No sibling for a node moved up unchanged
+                proof.append((nodes[sibling], sibling < index))
+            index //= 2
+        return proof
+
+    @staticmethod
+    def verifyProof(leaf: bytes, proof: list, root: bytes) -> bool:
+        """Checks the leaf is in the tree of the given root."""
+        node = leaf
+        for (sibling, is_left) in proof:
+            node = MerkleTree.hashPair(sibling, node) if is_left else MerkleTree.hashPair(node, sibling)
+        return node == root
@@ -0,0 +1,153 @@
+import logging
+import logging.handlers
+import multiprocessing as mp
+import traceback
+from threading import Event, Lock, Thread
+from types import SimpleNamespace
+from typing import Tuple
+
+def _runNode(wallet_seed: str, kdf_profile: str, node_kwargs: dict, control, events, metrics_interval: float, log_level: int):
+    """Child process code: runs a FullNode, executes the commands received on the control channel and streams its metrics and logs to the simulation."""
+    from app.FullNode import FullNode, Wallet # Imported here as the module is loaded again in the spawned process
+
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(events)]
+    root.setLevel(log_level) # Only send the records the simulation process would handle
+
+    node = FullNode(existing_wallet=Wallet(wallet_seed, kdf_profile=kdf_profile), **node_kwargs)
+    Thread(target=node.serve_forever, daemon=True).start()
+    stopped = Event()
+
+    def _streamMetrics():
+        while not stopped.wait(metrics_interval):
+            events.put(('metrics', node.getMetrics()))
+
+    Thread(target=_streamMetrics, daemon=True).start()
+    control.send(('ok', node.getMetrics()))
+
+    while True:
+        try:
+            method, args, kwargs = control.recv()
+        except EOFError: # Simulation process ended
+            break
+
+        try:
+            control.send(('ok', getattr(node, method)(*args, **kwargs)))
+        except Exception as e:
+            control.send(('error', traceback.format_exc()))
+
+        if method == 'server_close':
+            break
+
+    stopped.set()
+    events.put(('metrics', node.getMetrics()))
+
+class NodeProcess:
+    """Runs a FullNode in its own OS process, exposing the node interface used by the Orchestrator and the ChartsRenderer.
+
+    Commands are sent over a pipe (control channel) and wait for the result of the node's method.
+    The node height and balance are streamed back every 'metrics_interval' seconds through the pool's events queue (see NodeProcessPool).
+
+    :param pool: pool receiving the metrics and logs of the node
+    :param wallet_seed: seed of the node's wallet (the keys are derived in the node's process)
+    :param node_kwargs: FullNode constructor parameters (except the wallet)
+    :param kdf_profile: key derivation profile of the node's wallet (see Wallet.py)
+    """
+    def __init__(self, pool: 'NodeProcessPool', wallet_seed: str, node_kwargs: dict, metrics_interval: float=0.25, kdf_profile: str='default'):
+        self.control, child_control = pool.context.Pipe()
+        self._lock = Lock()
+        self.process = pool.context.Process(target=_runNode, args=(wallet_seed, kdf_profile, node_kwargs, child_control, pool.events, metrics_interval, logging.getLogger().getEffectiveLevel()), daemon=True)
+        self.process.start()
+        child_control.close() # Only the child keeps its end, so the pipe reports EOF if the node process dies
+
+        status, metrics = self.control.recv() # Wait for the node to be created
+        self.server_address = tuple(node_kwargs['server_address'])
+        self.id = metrics['id']
+        self.wallet = SimpleNamespace(address=metrics['address'], balance=metrics['balance'])
+        self.blockchain = SimpleNamespace(currentHeight=metrics['height'])
+        self.hashRate = metrics['hashRate']
+
+    def call(self, method: str, *args, **kwargs):
+        """Calls a method of the node in its process and returns the result."""
+        with self._lock:
+            self.control.send((method, args, kwargs))
+            status, result = self.control.recv()
+
+        if status == 'error':
+            raise RuntimeError(f"Node {self.id} failed to run '{method}':\n{result}")
+        return result
+
+    def updateMetrics(self, metrics: dict):
+        self.wallet.balance = metrics['balance']
+        self.blockchain.currentHeight = metrics['height']
+        self.hashRate = metrics['hashRate']
+
+    def startMining(self):
+        return self.call('startMining')
+
+    def stopMining(self):
+        return self.call('stopMining')
+
+    def syncWithPeers(self, autostart_mining=True, hard_sync=False):
+        return self.call('syncWithPeers', autostart_mining=autostart_mining, hard_sync=hard_sync)
+
+    def isNodeSynced(self) -> bool:
+        return self.call('isNodeSynced')
+
+    def addToTransactionPool(self, t) -> bool:
+        return self.call('addToTransactionPool', t)
+
+    def connectToPeer(self, server_address: Tuple[str, int]) -> bool:
+        return self.call('connectToPeer', server_address)
+
+    def setGenesisBlock(self, block):
+        return self.call('setGenesisBlock', block)
+
+    def setDifficulty(self, difficulty: float, height: int=None):
+        return self.call('setDifficulty', difficulty, height)
+
+    def server_close(self):
+        """Stops the node and waits for its process to end."""
+        try:
+            self.call('server_close')
+        except (EOFError, BrokenPipeError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.control.close()
+
+class NodeProcessPool:
+    """Spawns the nodes processes of a simulation and dispatches the metrics and logs streamed back by the nodes.
+
+    Log records of the nodes are handled by the logging handlers of the simulation process (so the renderer log filter still applies).
+    """
+    def __init__(self):
+        self.context = mp.get_context('spawn') # Avoid forking the simulation threads
+        self.events = self.context.Queue()
+        self.nodes = {} # Key: node id / Value: NodeProcess
+        self._listener = Thread(target=self._dispatchEvents, daemon=True)
+        self._listener.start()
+
+    def spawn(self, wallet_seed: str, kdf_profile: str='default', **node_kwargs) -> NodeProcess:
+        node = NodeProcess(self, wallet_seed, node_kwargs, kdf_profile=kdf_profile)
+        self.nodes[node.id] = node
+        return node
+
+    def close(self):
+        for node in list(self.nodes.values()):
+            if node.process.is_alive():
+                node.server_close()
+        self.events.put(None)
+        self._listener.join(timeout=5)
+
+    def _dispatchEvents(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                break
+
+            if isinstance(event, logging.LogRecord):
+                logging.getLogger().handle(event)
+            elif event[0] == 'metrics' and event[1]['id'] in self.nodes:
+                self.nodes[event[1]['id']].updateMetrics(event[1])
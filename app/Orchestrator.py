@@ -1,8 +1,9 @@
 import logging
 import random
-from threading import Thread
+from threading import Event, Thread
 
 from app.FullNode import *
+from app.NodeProcess import *
 from app.ChartsRenderer import *
 
 class Orchestrator(Thread):
@@ -15,6 +16,11 @@ class Orchestrator(Thread):
     - maxNodes: maximum numbers of peers allowed
     - epochTime: speed of the simulations for triggering events
     - miningDifficulty: float value in 0.5 increments representing the mining difficulty for PoW
+    - miningWorkers: number of processes used by each node for mining with PoW
+    - asyncioMode: run each node's networking on an asyncio event loop instead of one thread per peer connection
+    - inProcess: nodes exchange messages through in-memory queues instead of TCP sockets (see InProcessNetwork.py)
+    - processMode: run each node in its own OS process, controlled from the simulation process (see NodeProcess.py)
+    - requireSignatures: nodes only accept transactions signed by their senders (not supported with 'processMode', the wallets keys staying in the node processes)
     - initialSupply: amount of coins minted in the first block (miner is address 0x0)
     - initialTransferAmount: amount of coins sent initially to the starting nodes
 
@@ -29,17 +35,20 @@ class Orchestrator(Thread):
 
         self.setup()
         self.isRunning = True
-        self.isPaused = False
+        self.resumed = Event() # Cleared while the simulation is paused
+        self.resumed.set()
         self.transactions = self._getNextTransaction()
         self.nodes = []
+        self.network = None # InProcessNetwork of the nodes if 'inProcess' is set
+        self.processPool = None # NodeProcessPool of the nodes if 'processMode' is set
         self.renderer = renderer
 
     def _pause(f):
         """Decorator for pausing the simulation and resuming after the function's execution."""
         def make_pause(self, *args):
-            self.isPaused = True # Pause the simulation
+            self.resumed.clear() # Pause the simulation
             f(self, *args)
-            self.isPaused = False # Unpause the simulation
+            self.resumed.set() # Unpause the simulation
         return make_pause
 
     def _wrap_parameters(self) -> dict:
@@ -50,6 +59,7 @@ class Orchestrator(Thread):
         d['epochTime'] = self.epochTime
         d['isRunning'] = self.isRunning
         d['miningDifficulty'] = self.miningDifficulty
+        d['miningWorkers'] = self.miningWorkers
         d['transactionFrequency'] = self.transactionFrequency
         d['disconnectFrequency'] = self.disconnectFrequency
         d['newPeerFrequency'] = self.newPeerFrequency
@@ -61,15 +71,35 @@ class Orchestrator(Thread):
         """Generate a random number between 1 and 100 (included) and return True if below or equal threshold (must be percentage value)."""
         return random.randint(1, 100) <= 25*threshold
 
+    def _createNode(self, i: int, wallet: Wallet=None):
+        """Creates the i-th node of the simulation, in its own process with 'processMode'.
+
+        :param wallet: wallet of the node (created from the seed 'i' if not given)
+        """
+        node_kwargs = dict(
+            consensusAlgorithm=self.isPos(),
+            difficulty=self.miningDifficulty,
+            mining_workers=self.miningWorkers,
+            asyncio_mode=self.asyncioMode,
+            require_signatures=self.requireSignatures,
+            difficulty_schedule=list(self.difficultySchedule), # New nodes check the synced blocks against the difficulty they were mined with
+            server_address=("127.0.0.1", 10000 + i) # TODO: handle invalid/busy socket
+        )
+        if self.processMode:
+            return self.processPool.spawn(wallet_seed=str(i), kdf_profile=self.kdfProfile, **node_kwargs) # Keys derived in parallel by the node processes
+
+        if wallet is None:
+            wallet = createWallets([str(i)], kdf_profile=self.kdfProfile, keystore=self.keystore)[0] # Saves the key derived in the keystore
+        return FullNode(existing_wallet=wallet, in_process_network=self.network, **node_kwargs)
+
     def _setupNodes(self):
-        self.nodes = [
-            FullNode(
-                consensusAlgorithm=self.isPos(),
-                difficulty=self.miningDifficulty, 
-                existing_wallet=Wallet(str(i)), 
-                server_address=("127.0.0.1", 10000 + i)
-            ) for i in range(self.startingNodes)
-        ]
+        self.network = InProcessNetwork() if self.inProcess else None
+        self.processPool = NodeProcessPool() if self.processMode else None
+        if self.processMode:
+            self.nodes = [self._createNode(i) for i in range(self.startingNodes)]
+        else: # Derive the keys of all the starting nodes at once
+            wallets = createWallets([str(i) for i in range(self.startingNodes)], self.walletWorkers, self.kdfProfile, self.keystore)
+            self.nodes = [self._createNode(i, wallet) for (i, wallet) in enumerate(wallets)]
 
         # Setup genesis chain and sends coins to the initial nodes (critical for being able to mine in PoS)
         genesisChain = Blockchain()
@@ -81,14 +111,14 @@ class Orchestrator(Thread):
         )
 
         for node in self.nodes:
-            node.blockchain.blockChain[0] = genesisChain.blockChain[0]
-            node.wallet.balance = self.initialTransferAmount
-            Thread(target=node.serve_forever).start() # Initiate server on all nodes
+            node.setGenesisBlock(genesisChain.blockChain[0])
+            if not self.processMode: # Node processes start their server on creation
+                Thread(target=node.serve_forever).start() # Initiate server on all nodes
 
         for i in range(self.numberOfNodes - 1):  # Make nodes all connected to each other
             node = self.nodes[i]
             for peer in self.nodes[i+1:]:
-                if (node.client.connect(peer.server_address)):
+                if (node.connectToPeer(peer.server_address)):
                     self._log(logging.info,
                               f"Connected {node.id} {node.server_address} to {peer.id} {peer.server_address} [success]")
                 else:
@@ -106,8 +136,10 @@ class Orchestrator(Thread):
         for node in self.nodes:
             node.stopMining()
 
+        height = max(node.blockchain.currentHeight for node in self.nodes) + 1 # Same change height on all nodes
+        self.difficultySchedule = [change for change in self.difficultySchedule if change[0] < height] + [(height, self.miningDifficulty)]
         for node in self.nodes:
-            node.consensusAlgorithm.blockDifficulty = self.miningDifficulty
+            node.setDifficulty(self.miningDifficulty, height)
 
         for node in self.nodes:
             node.startMining()
@@ -127,13 +159,19 @@ class Orchestrator(Thread):
 
             amount = random.randint(1, int(sender.wallet.balance/10))
             self._log(logging.info, f"Sending {amount} coin(s) from {sender.id} to {receiver.id}")
-            yield Transaction(senders=[(sender.wallet.address, amount)],
-                              receivers=[(receiver.wallet.address, amount)])
+            t = Transaction(senders=[(sender.wallet.address, amount)], receivers=[(receiver.wallet.address, amount)])
+            if isinstance(sender.wallet, Wallet): # Nodes running in their own process don't share their keys
+                t.sign(sender.wallet, nonces=[sender.getNextNonce(sender.wallet.address)])
+            yield t
 
     def _log(self, level_func: Callable, msg: str):
         level_func(f"M:[_MAIN_] " + msg)
         self.renderer.log(level_func.__name__, msg)
 
+    @property
+    def isPaused(self) -> bool:
+        return not self.resumed.is_set()
+
     @property
     def numberOfNodes(self) -> int:
         return len(self.nodes)
@@ -152,15 +190,34 @@ class Orchestrator(Thread):
         newPeerFrequency: float=.2, 
         consensus: str="PoW",
         initialSupply=100_000,
-        initialTransferAmount=100
+        initialTransferAmount=100,
+        miningWorkers: int=1,
+        asyncioMode: bool=False,
+        inProcess: bool=False,
+        processMode: bool=False,
+        kdfProfile: str='default',
+        keystoreFile: str=None,
+        walletWorkers: int=1,
+        requireSignatures: bool=False
     ):
         self.consensus = consensus
         self.startingNodes = startingNodes
         self.maxNodes = maxNodes
         self.epochTime = epochTime  # in milliseconds, control speed of the simulation
         self.miningDifficulty = miningDifficulty
+        self.difficultySchedule = [(0, miningDifficulty)] # (height, difficulty) of each difficulty change (see FullNode.getDifficulty)
+        self.miningWorkers = miningWorkers
+        self.asyncioMode = asyncioMode
+        self.inProcess = inProcess
+        self.processMode = processMode
+        self.kdfProfile = kdfProfile # Key derivation profile of the nodes wallets (see Wallet.py)
+        self.keystore = Keystore(keystoreFile) if keystoreFile is not None else None # Unencrypted cache of the wallets keys (simulation only)
+        self.walletWorkers = walletWorkers # Processes deriving the keys of the starting nodes wallets
+        self.requireSignatures = requireSignatures
 
         assert self.maxNodes >= self.startingNodes
+        assert not (self.inProcess and self.processMode) # Nodes in different processes communicate through TCP
+        assert not (self.requireSignatures and self.processMode) # Transactions can't be signed without the keys of the node processes
         
         self.transactionFrequency = transactionFrequency
         self.disconnectFrequency = disconnectFrequency
@@ -185,8 +242,7 @@ class Orchestrator(Thread):
         self.renderer.render(self._wrap_parameters()) # First rendering pass loads the charts faster
 
         while self.isRunning:
-            while self.isPaused:
-                pass
+            self.resumed.wait()
 
             if (self._roll(self.disconnectFrequency) and self.numberOfNodes > 1):
                 chosenNode = random.choice(self.nodes)
@@ -206,6 +262,9 @@ class Orchestrator(Thread):
         for node in self.nodes:
             node.server_close()  # Stops the node's server
 
+        if self.processPool is not None:
+            self.processPool.close()
+
     def stop(self):
         self.isRunning = False
 
@@ -215,17 +274,13 @@ class Orchestrator(Thread):
             return False
 
         self._log(logging.info, f"Adding new peer to network...")
-        new_node = FullNode(
-            consensusAlgorithm=self.isPos(),
-            difficulty=self.miningDifficulty,
-            existing_wallet=Wallet(str(self.numberOfNodes)),
-            server_address=("127.0.0.1", 10000 + self.numberOfNodes) # TODO: handle invalid/busy socket
-        )
+        new_node = self._createNode(self.numberOfNodes)
         self.nodes.append(new_node)
-        Thread(target=new_node.serve_forever).start()
+        if not self.processMode:
+            Thread(target=new_node.serve_forever).start()
         
         for peer in self.nodes[:-1]:
-            new_node.client.connect(peer.server_address)
+            new_node.connectToPeer(peer.server_address)
 
         new_node.syncWithPeers()
 
@@ -1,34 +1,71 @@
 import time
 import hashlib as h
+from threading import Event
 
 from app.ConsensusAlgorithm import *
-from app.TreeLeaf import *
+from app.StakeTree import *
 
-class ProofOfStake(ConsensusAlgorithm, dict):
-    """Proof of Stake consensus based on a node's balance and difficulty setting for creating a target threshold before mining a block."""
-    def __init__(self, blockDifficulty, wallet):
+class ProofOfStake(ConsensusAlgorithm):
+    """Proof of Stake consensus based on a node's balance and difficulty setting for creating a target threshold before mining a block.
+
+    With a 'slot_time', the hashing lottery is replaced by leader selection: time after each block is divided in slots of 'slot_time' seconds
+    and the leader of each slot is drawn from the stake tree of the chain, seeded by the previous block hash (see 'pickTheWinner').
+    Any node can check the leader of a block with one hash and a O(log n) lookup.
+
+    With 'scheduled' mining, the lottery evaluates each timestamp tick once ahead of time and sleeps until the first eligible one
+    instead of spinning on 'time.time()' (see 'mineScheduled'). Ticks are coarser than the timestamps a spinning node evaluates,
+    the threshold of each tick being scaled up so the expected number of eligible timestamps per second stays the same.
+
+    :param blockDifficulty: divides the balance-derived threshold of the hashing lottery (unused with a 'slot_time')
+    :param wallet: wallet of the mining node
+    :param blockchain: blockchain of the node, holding the stake tree (required for leader selection)
+    :param slot_time: seconds per slot for leader selection (None for the hashing lottery)
+    :param scheduled: sleep until the next eligible timestamp of the hashing lottery instead of spinning
+    :param tick_time: seconds between two timestamps evaluated by scheduled mining
+    :param lookahead: seconds of upcoming ticks evaluated at once by scheduled mining
+    """
+    DEFAULT_TICK_TIME = 0.001 # About a thousand hashes per second of scheduled mining, instead of one per timestamp evaluated by a spinning node
+
+    def __init__(self, blockDifficulty, wallet, blockchain=None, slot_time: float=None, scheduled=False, tick_time: float=DEFAULT_TICK_TIME, lookahead: float=0.5):
         super(ProofOfStake, self).__init__()
         self.blockDifficulty = blockDifficulty
         self.node_wallet = wallet
-        # self.rootNode = TreeLeaf() # TODO build the tree
+        self.blockchain = blockchain
+        self.slot_time = slot_time
+        self.scheduled = scheduled
+        self.tick_time = tick_time
+        self.spin_tick_time = None # Mean interval between the timestamps evaluated by the spinning lottery, measured on first use
+        self.lookahead = lookahead
+        self.alreadyFound = False
+        self._stopped = Event() # Wakes up a node waiting for its slot or eligible timestamp
 
     def _get_time_bytes(self) -> bytes:
         return int(time.time() * 10**7).to_bytes(8, 'big')
 
+    def isLeaderSelection(self) -> bool:
+        return self.slot_time is not None
+
     def mine(self, block):
         """Compares a hash value updated by a timestamp to a threshold based on the node's wallet balance and a difficulty setting.
 
         The hash value is based on the previous block hash, the node's wallet address and a current timestamp.
         If this value is below the threshold, the node can mine the next block. 
         The greater the balance, the higher the threshold and hence, the more chances the node can mine the next blocks.
+        With leader selection, waits for the first slot led by the node instead (see 'mineSlot').
         """
         
         if (self.node_wallet.balance == 0):
             raise ValueError("Node can't mine if its balance is zero")
 
         self.alreadyFound = False
+        self._stopped.clear()
+        if self.isLeaderSelection():
+            return self.mineSlot(block)
+
         base = block.previousHash.encode() + self.node_wallet.address.encode()
         threshold = int(2**256 * self.node_wallet.balance / self.blockDifficulty)
+        if self.scheduled:
+            return self.mineScheduled(block, base, threshold)
 
         block.nonce = self._get_time_bytes()
         trigger = int.from_bytes(h.sha3_256(base + block.nonce).digest(), 'big')
@@ -40,18 +77,96 @@ class ProofOfStake(ConsensusAlgorithm, dict):
 
         return not self.alreadyFound
 
+    def mineScheduled(self, block, base: bytes, threshold: int) -> bool:
+        """Evaluates the upcoming ticks once each, 'lookahead' seconds at a time, and sleeps until the first eligible one (or the end of the batch).
+
+        Nonces are the same timestamps (in 100 ns units) as the spinning lottery, spaced by 'tick_time' with a threshold scaled
+        accordingly (see 'getTickThreshold'). Returns False if mining was stopped while sleeping.
+        """
+        tick = max(1, round(self.tick_time * 10**7))
+        threshold = self.getTickThreshold(threshold)
+        nonce = 0
+        while not self.alreadyFound:
+            nonce = max(nonce, (int(time.time() * 10**7) // tick + 1) * tick) # Past ticks can't be used anymore
+            batch_end = nonce + round(self.lookahead * 10**7)
+            while nonce < batch_end and int.from_bytes(h.sha3_256(base + nonce.to_bytes(8, 'big')).digest(), 'big') > threshold:
+                nonce += tick
+
+            if self._stopped.wait(max(0., min(nonce, batch_end) / 10**7 - time.time())):
+                return False
+            if nonce < batch_end: # Eligible timestamp reached
+                block.nonce = nonce
+                return True
+
+        return False
+
+    def getTickThreshold(self, threshold: int) -> int:
+        """Scales the threshold of a timestamp evaluated by the spinning lottery to a tick of scheduled mining.
+
+        A tick stands for the 'tick_time / spin_tick_time' timestamps a spinning node would evaluate in the same time,
+        its probability of being eligible being multiplied as much (for small probabilities, and at most 1).
+        """
+        return min(2**256, int(threshold * max(1., self.tick_time / self.getSpinTickTime())))
+
+    def getSpinTickTime(self) -> float:
+        """Returns the mean interval between the distinct timestamps evaluated by the spinning lottery, measured on first use."""
+        if self.spin_tick_time is None:
+            base = b'0' * 128
+            ticks = set()
+            start = time.perf_counter()
+            while time.perf_counter() - start < 0.05:
+                nonce = self._get_time_bytes()
+                int.from_bytes(h.sha3_256(base + nonce).digest(), 'big')
+                ticks.add(nonce)
+            self.spin_tick_time = (time.perf_counter() - start) / len(ticks)
+
+        return self.spin_tick_time
+
+    def mineSlot(self, block) -> bool:
+        """Finds the first slot after the previous block led by the node and sleeps until its start, the block nonce storing the slot number.
+
+        Returns False if mining was stopped before the slot started (e.g. a new block was received).
+        """
+        if self.blockchain.getStakes().getStake(self.node_wallet.address) == 0:
+            raise ValueError("Node can't mine without stake in the chain")
+        if block.previousHash != self.blockchain.lastBlock.getHash(): # Chain changed since the block creation
+            return False
+
+        slot = 0
+        while not self.alreadyFound and self.pickTheWinner(block.previousHash, slot) != self.node_wallet.address:
+            slot += 1
+
+        slot_start = self.getSlotStart(slot)
+        if self._stopped.wait(max(0., slot_start - time.time())) or self.alreadyFound:
+            return False
+
+        block.nonce = slot
+        block.timestamp = max(time.time(), slot_start)
+        return True
+
+    def getSlotStart(self, slot: int) -> float:
+        """Time from which a block can be created for a slot following the last block of the chain."""
+        return self.blockchain.lastBlock.timestamp + (slot + 1) * self.slot_time
+
     def stopMining(self):
         self.alreadyFound = True
+        self._stopped.set()
+
+    def pickTheWinner(self, previousHash: str, slot: int) -> str:
+        """Draws the leader of a slot following the block 'previousHash' (last block of the chain) with a probability proportional to its stake.
+
+        The draw is seeded by the previous block hash and the slot number, so every node picks the same winner.
+        Returns None if no address has a stake.
+        """
+        stakes = self.blockchain.getStakes()
+        with self.blockchain.ledger.lock:
+            if stakes.total == 0:
+                return None
+            seed = int.from_bytes(h.sha3_256(previousHash.encode() + slot.to_bytes(8, 'big')).digest(), 'big')
+            return stakes.pickTheWinner(seed % stakes.total)
 
-    # def pickTheWinner(self, number):
-    # 	return self.pickTheWinnerRecursive(number, self.rootNode)
-
-    # def pickTheWinnerRecursive(self, number, node: TreeLeaf):
-    # 	if node.leftChild is None and node.rightChild is None:
-    # 		return node.value
-    # 	elif node.rightChild is None:
-    # 		return self.pickTheWinnerRecursive(self, number, node.leftChild)  # if there's only one child
-    # 	elif node.leftChild.number > number:
-    # 		return self.pickTheWinnerRecursive(self, number, node.leftChild)
-    # 	else:
-    # 		return self.pickTheWinnerRecursive(self, number, node.rightChild)
+    def checkLeader(self, block) -> bool:
+        """Checks a new block following the last block of the chain was created by the leader of its slot, after the slot started."""
+        return (isinstance(block.nonce, int) and block.nonce >= 0
+                and block.timestamp >= self.getSlotStart(block.nonce)
+                and self.pickTheWinner(block.previousHash, block.nonce) == block.miner)
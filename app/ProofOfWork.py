@@ -1,31 +1,159 @@
+import hashlib as h
+import multiprocessing as mp
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 from app.ConsensusAlgorithm import *
 from math import modf
 
-class ProofOfWork(ConsensusAlgorithm, dict):
-    """Proof of Work consensus based on the number of leading zeros and ones for adjusting the mining difficulty."""
-    def __init__(self, blockDifficulty):
+NONCE_CHUNK_SIZE = 4096 # Number of nonces a worker process tries before fetching a new range (and checking for a stop signal)
+
+_stop_event = None
+_next_chunk = None
+
+def _initWorker(stop_event, next_chunk):
+    """Keeps the shared stop signal and nonce range counter in the worker process globals (they can only be shared on pool creation)."""
+    global _stop_event, _next_chunk
+    _stop_event = stop_event
+    _next_chunk = next_chunk
+
+def _searchNonces(prefix: bytes, suffix: bytes, target: int, start_nonce: int) -> tuple:
+    """Worker process code: tries nonce ranges taken from the shared counter until a hash is below target or mining is stopped.
+
+    Returns the winning nonce (or None) and the number of hashes computed.
+    """
+    midstate = h.sha3_256(prefix)
+    hashes = 0
+    while not _stop_event.is_set():
+        with _next_chunk.get_lock():
+            chunk = _next_chunk.value
+            _next_chunk.value += 1
+
+        first_nonce = start_nonce + chunk * NONCE_CHUNK_SIZE
+        for nonce in range(first_nonce, first_nonce + NONCE_CHUNK_SIZE):
+            _hash = midstate.copy()
+            _hash.update(b'%d' % nonce)
+            _hash.update(suffix)
+            if int.from_bytes(_hash.digest(), 'big') < target:
+                return nonce, hashes + nonce - first_nonce + 1
+        hashes += NONCE_CHUNK_SIZE
+
+    return None, hashes
+
+class ProofOfWork(ConsensusAlgorithm):
+    """Proof of Work consensus based on the number of leading zeros and ones for adjusting the mining difficulty.
+
+    :param blockDifficulty: number of leading zeroes (in 0.5 increments) required for the block hash
+    :param workers: number of processes used for mining, 1 mines in the calling thread
+    """
+    def __init__(self, blockDifficulty, workers: int=1):
         super(ProofOfWork, self).__init__()
         self.blockDifficulty = blockDifficulty
+        self.workers = workers
+        self.hashRate = 0. # Hashes per second measured on the last mined block
+        self.alreadyFound = False
+        self._pool = None
+
+    def getTarget(self, blockDifficulty: float=None) -> int:
+        """Converts the difficulty (the current one if not given) to an integer target the block hash must be strictly below.
+
+        A whole difficulty of N leading hex zeroes means hash < 16**(64 - N).
+        The half step additionally requires the next hex digit to be '0' or '1', dividing the target by 8.
+        """
+
+        frac, whole = modf(self.blockDifficulty if blockDifficulty is None else blockDifficulty)
+        if frac != 0 and frac != 0.5 or whole < 0:
+            raise ValueError("blockDifficulty must be a positive integer or float with a decimal part equal to 0.5")
+
+        return 2**(256 - 4*int(whole) - (3 if frac else 0))
+
+    def checkHash(self, block, blockDifficulty: float=None) -> bool:
+        return int(block.getHash(), 16) < self.getTarget(blockDifficulty)
 
     def mine(self, block):
         """Increases the block nonce until a suitable hash is found.
-        
+
         Run in a thread by the FullNode.
         If the difficulty is a whole number, the hash must contains a given number of leading zeroes.
-        Else the hash must contains the whole part of leadings zeroes plus an additional '1' or '0' 
+        Else the hash must contains the whole part of leadings zeroes plus an additional '1' or '0'
+
+        Each attempt copies the block header midstate and only hashes the nonce and the constant suffix (see Block.getHeaderMidstate).
+        With more than one worker, the nonce space is split in ranges searched by a pool of processes (see 'mineParallel').
         """
-        
-        frac, whole = modf(self.blockDifficulty)
-        if frac != 0 and frac != 0.5 or whole < 0:
-            raise ValueError("blockDifficulty must be a positive integer or float with a decimal part equal to 0.5")
 
-        whole = int(whole)
+        target = self.getTarget()
         self.alreadyFound = False
 
-        while not self.alreadyFound and (block.getHash()[0:whole] != '0' * whole or (not block.getHash()[whole] in ['0', '1'] if frac else False)):
-            block.nonce += 1
+        if self.workers > 1:
+            return self.mineParallel(block, target)
+
+        start = time.perf_counter()
+        midstate, suffix = block.getHeaderMidstate()
+        first_nonce = nonce = block.nonce
+        while not self.alreadyFound:
+            _hash = midstate.copy()
+            _hash.update(b'%d' % nonce)
+            _hash.update(suffix)
+            if int.from_bytes(_hash.digest(), 'big') < target:
+                break
+            nonce += 1
+
+        block.nonce = nonce
+        self._updateHashRate(nonce - first_nonce + 1, start)
 
         return not self.alreadyFound
 
+    def mineParallel(self, block, target: int) -> bool:
+        """Searches the nonce space with 'workers' processes, each receiving the serialized block header template.
+
+        The first winning nonce (or a call to 'stopMining') sets the shared stop signal ending all workers after their current range.
+        """
+
+        if self._pool is None:
+            context = mp.get_context('spawn') # Avoid forking the node's server and handler threads
+            self._stop_event = context.Event()
+            self._next_chunk = context.Value('Q', 0)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                             initializer=_initWorker, initargs=(self._stop_event, self._next_chunk))
+
+        self._stop_event.clear()
+        self._next_chunk.value = 0
+        if self.alreadyFound: # 'stopMining' called before the stop signal could be cleared
+            return False
+
+        start = time.perf_counter()
+        prefix, suffix = block.getHeaderTemplate()
+        pending = {self._pool.submit(_searchNonces, prefix, suffix, target, block.nonce) for _ in range(self.workers)}
+        winning_nonce = None
+        hashes = 0
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                nonce, count = future.result()
+                hashes += count
+                if nonce is not None and (winning_nonce is None or nonce < winning_nonce):
+                    winning_nonce = nonce
+            self._stop_event.set() # First finished worker either found a nonce or was stopped, stop the others
+
+        self._updateHashRate(hashes, start)
+        if winning_nonce is None:
+            return False
+
+        block.nonce = winning_nonce
+        return not self.alreadyFound
+
+    def _updateHashRate(self, hashes: int, start: float):
+        elapsed = time.perf_counter() - start
+        self.hashRate = hashes / elapsed if elapsed > 0 else 0.
+
     def stopMining(self):
         self.alreadyFound = True
+        if self._pool is not None:
+            self._stop_event.set()
+
+    def shutdown(self):
+        """Stops the mining processes (if any)."""
+        self.stopMining()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,113 @@
+import itertools
+import logging
+import socket
+import time
+from collections import OrderedDict
+from threading import Condition, Thread
+from typing import Callable, Tuple
+
+class SendQueue:
+    """Bounded queue of encoded messages for a peer, sent in order by its own writer thread.
+
+    Queuing never blocks the caller (mining thread, RPC handlers) on a slow peer.
+    Messages queued with the same key replace each other until sent (e.g. a newer block at the same height).
+    When the queue reaches 'high_watermark' messages, the peer is considered too slow: 'on_overflow' is called
+    and new messages with a key are dropped until the writer drains the queue down to 'low_watermark' messages (a newer message
+    with the same key replaces them anyway). Messages without a key (e.g. sync responses) can't be dropped without the peer
+    waiting for them: 'on_message_lost' is called instead, the peer being expected to be disconnected.
+
+    :param peer: (HOST, PORT) of the peer
+    :param sock: connected socket to the peer
+    :param high_watermark: number of pending messages from which the peer is throttled
+    :param low_watermark: number of pending messages under which the peer accepts messages again
+    :param on_overflow: function called with the queue when the high watermark is reached
+    :param on_message_lost: function called with the queue when a message without key is not queued while throttled
+    """
+    def __init__(self, peer: Tuple[str, int], sock: socket.socket, high_watermark: int=1000, low_watermark: int=100, on_overflow: Callable=None,
+                 on_message_lost: Callable=None):
+        if not 0 <= low_watermark < high_watermark:
+            raise ValueError(f"Watermarks must verify 0 <= low_watermark < high_watermark: low_watermark={low_watermark}, high_watermark={high_watermark}")
+        self.peer = peer
+        self.sock = sock
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.on_overflow = on_overflow
+        self.on_message_lost = on_message_lost
+        self.throttled = False
+        self.dropped = 0 # Number of messages dropped while throttled
+        self.sent = 0
+        self.latency = 0. # Moving average of the seconds between queuing and sending a message
+        self._messages = OrderedDict() # Key: coalescing key or message counter / Value: (encoded message, time queued)
+        self._counter = itertools.count()
+        self._condition = Condition()
+        self._closed = False
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def put(self, data: bytes, key=None) -> bool:
+        """Queues a message for the peer, returns False if the queue is closed or the peer is throttled."""
+        overflow = lost = False
+        with self._condition:
+            if self._closed:
+                return False
+
+            if key is not None and key in self._messages: # Coalesce with the pending message, keeping its place in the queue
+                self._messages[key] = (data, self._messages[key][1])
+                return True
+
+            if not self.throttled and len(self._messages) >= self.high_watermark:
+                self.throttled = overflow = True
+            if self.throttled:
+                self.dropped += 1
+                lost = key is None
+            else:
+                self._messages[key if key is not None else next(self._counter)] = (data, time.perf_counter())
+                self._condition.notify()
+
+        if overflow:
+            logging.warning(f"SendQueue: peer {self.peer} is too slow, throttling ({self.high_watermark} messages pending)")
+            if self.on_overflow is not None:
+                self.on_overflow(self)
+        if lost and self.on_message_lost is not None:
+            self.on_message_lost(self)
+
+        return not self.throttled
+
+    def close(self, flush_timeout: float=None):
+        """Stops the writer thread once the pending messages are sent, or after 'flush_timeout' seconds.
+
+        Pending messages are discarded if 'flush_timeout' is 0.
+        """
+        with self._condition:
+            self._closed = True
+            if flush_timeout == 0:
+                self._messages.clear()
+            self._condition.notify()
+
+        self._thread.join(flush_timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._messages or self._closed)
+                if not self._messages: # Closed and all messages sent
+                    return
+
+                _, (data, queued) = self._messages.popitem(last=False)
+                if self.throttled and len(self._messages) <= self.low_watermark:
+                    self.throttled = False
+
+            try:
+                self.sock.sendall(data)
+            except OSError as e:
+                logging.error(f"SendQueue: could not send to {self.peer}: {e}")
+                with self._condition:
+                    self._closed = True
+                    self._messages.clear()
+                return
+
+            self.sent += 1
+            self.latency = 0.9 * self.latency + 0.1 * (time.perf_counter() - queued) if self.sent > 1 else time.perf_counter() - queued
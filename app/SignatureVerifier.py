@@ -0,0 +1,85 @@
+import multiprocessing as mp
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from cryptography.exceptions import InvalidSignature
+
+from app.Transaction import *
+from app.Wallet import *
+
+MIN_PARALLEL_BATCH = 64 # Smaller batches are verified in the calling thread, not being worth the transfer to the worker processes
+
+def verifySignatures(items: list) -> bool:
+    """Verifies the signatures of a batch of transactions, stopping on the first invalid one. Run by the worker processes of 'SignatureVerifier'.
+
+    :param items: list of (transaction id, sender addresses, signatures) of each transaction
+    """
+    for (txid, addresses, signatures) in items:
+        if not signatures or len(signatures) != len(addresses):
+            return False
+        txid = bytes.fromhex(txid)
+        for (addr, (key, signature)) in zip(addresses, signatures):
+            try:
+                public_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256K1(), key)
+                if Wallet.addressFromPublicKey(public_key) != addr: # Key must be the sender's
+                    return False
+                public_key.verify(signature, txid, ec.ECDSA(hashes.SHA256()))
+            except (ValueError, InvalidSignature):
+                return False
+    return True
+
+class SignatureVerifier:
+    """Batched verification of the transaction signatures, with a cache of the verified signatures.
+
+    A transaction verified once (e.g. when entering the mempool) is not verified again when received in a block: the last 'cache_size'
+    verified (transaction id, signatures) pairs are kept, the least recently used being evicted first.
+    Batches of at least MIN_PARALLEL_BATCH unverified transactions are split between a pool of 'workers' processes.
+
+    :param workers: number of processes verifying the signatures
+    :param cache_size: maximum number of verified transactions kept in the cache
+    """
+    def __init__(self, workers: int=1, cache_size: int=100_000):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.hits = 0 # Number of transactions found in the cache
+        self._cache = OrderedDict() # Key: (transaction id, signatures) / Value: None
+        self._lock = Lock()
+        self._pool = None
+
+    def verify(self, transactions: list) -> bool:
+        """Checks each transaction is signed by all its senders."""
+        pending = [] # (cache key, transaction sender addresses)
+        with self._lock:
+            for t in transactions:
+                key = (t.getTxid(), t.signatures)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                else:
+                    pending.append((key, tuple(addr for (addr, _) in t.senders)))
+
+        if not pending:
+            return True
+
+        items = [(txid, addresses, signatures) for ((txid, signatures), addresses) in pending]
+        if self.workers > 1 and len(items) >= MIN_PARALLEL_BATCH:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context('spawn')) # Avoid forking the node's threads
+            chunk = -(-len(items) // self.workers)
+            valid = all(self._pool.map(verifySignatures, [items[i:i + chunk] for i in range(0, len(items), chunk)]))
+        else:
+            valid = verifySignatures(items)
+
+        if valid: # An invalid batch isn't cached, its valid transactions being verified again
+            with self._lock:
+                for (key, _) in pending:
+                    self._cache[key] = None
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return valid
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
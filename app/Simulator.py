@@ -0,0 +1,253 @@
+import hashlib as h
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Callable, Union
+
+from app.Block import *
+from app.Blockchain import *
+from app.FullNode import FullNode
+from app.ProofOfStake import *
+from app.ProofOfWork import *
+from app.TransactionStore import *
+
+class SampledProofOfWork(ProofOfWork):
+    """Proof of Work whose block discovery is sampled by the simulator: simulated blocks carry no nonce meeting the target."""
+    def checkHash(self, block, blockDifficulty: float=None) -> bool:
+        return True
+
+class SimNode:
+    """Lightweight node of a simulation holding a real blockchain, validating blocks with the 'FullNode' validation code.
+
+    :param address: address of the node (no wallet keys are derived for simulated nodes)
+    :param consensusAlgorithm: SampledProofOfWork or ProofOfStake instance holding the difficulty
+    :param hash_rate: hashes (PoW) or stake attempts (PoS) per second
+    """
+
+    # Validation code shared with the real nodes
+    validateNewBlock = FullNode.validateNewBlock
+    validateTransaction = FullNode.validateTransaction
+    validateTransactions = FullNode.validateTransactions
+    _validateBlockState = FullNode._validateBlockState
+    _validateDebits = FullNode._validateDebits
+    computeReward = FullNode.computeReward
+    getDifficulty = FullNode.getDifficulty
+    block_version = Block.JSON_VERSION
+    require_signatures = False
+
+    def __init__(self, address: str, consensusAlgorithm: ConsensusAlgorithm, hash_rate: float):
+        self.address = address
+        self.consensusAlgorithm = consensusAlgorithm
+        self.hash_rate = hash_rate
+        self.difficulty_schedule = [(0, consensusAlgorithm.blockDifficulty)]
+        self.blockchain = Blockchain()
+        self.peers = [] # List of (SimNode, link latency in seconds)
+        self.round = 0 # Incremented on each new tip, discards the discovery events scheduled for a previous tip
+        self.blocks_mined = 0
+        self.reorgs = 0
+
+    @property
+    def id(self) -> str:
+        return self.address[:6]
+
+    def isNodeSynced(self) -> bool:
+        return True
+
+    def isPoW(self) -> bool:
+        return isinstance(self.consensusAlgorithm, ProofOfWork)
+
+    def isPoS(self) -> bool:
+        return isinstance(self.consensusAlgorithm, ProofOfStake)
+
+    def getDiscoveryRate(self) -> float:
+        """Expected number of blocks found per second by the node on its current tip.
+
+        PoW: each hash is below the target with probability target / 2**256.
+        PoS: each attempt is below the threshold of 'ProofOfStake.mine' with probability balance / blockDifficulty.
+        """
+        if self.isPoW():
+            return self.hash_rate * self.consensusAlgorithm.getTarget() / 2**256
+
+        balance = self.blockchain.getBalance(self.address)
+        return self.hash_rate * min(1., balance / self.consensusAlgorithm.blockDifficulty)
+
+    def _log(self, level_func: Callable, msg: str):
+        level_func(f"S:[{self.id}] " + msg)
+
+class Simulator:
+    """Discrete-event simulation of a PoW or PoS network running on a virtual clock.
+
+    Events are kept in a priority queue ordered by virtual time and processed one after the other, no real time is spent waiting or mining.
+    The time before a node finds a block is sampled from an exponential distribution of rate 'SimNode.getDiscoveryRate'
+    (re-sampled on each new tip, which is exact since the distribution is memoryless). Blocks are relayed to the peers of each node
+    accepting them with a delay made of the link latency, an exponential jitter and the transfer time of the block.
+    Nodes receiving a block higher than their tip on another fork switch to that fork (longest chain rule).
+
+    :param consensus: "PoW" or "PoS"
+    :param nodes: number of nodes
+    :param difficulty: PoW or PoS 'blockDifficulty'
+    :param hash_rates: hashes (or PoS attempts) per second, for all nodes or a list with one value per node
+    :param peers_per_node: number of random peers each node connects to (connections are bidirectional)
+    :param latency: mean link latency in seconds
+    :param bandwidth: link bandwidth in bytes per second
+    :param initial_balance: coins sent to each node in the genesis block (stake for PoS)
+    :param seed: seed of the random generator, making runs reproducible
+    """
+    def __init__(self, consensus: str="PoW", nodes: int=10, difficulty: float=4, hash_rates: Union[float, list]=100_000,
+                 peers_per_node: int=8, latency: float=0.1, bandwidth: float=1_000_000, initial_balance: int=100, seed: int=None):
+        assert consensus in ("PoW", "PoS")
+        self.consensus = consensus
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.random = random.Random(seed)
+        self.now = 0. # Virtual time in seconds
+        self.events_processed = 0
+        self.blocks = {} # Key: block hash / Value: block mined during the simulation (blocks are shared by all nodes' blockchains)
+        self.block_sizes = {} # Key: block hash / Value: size of the JSON encoded block in bytes
+        self.propagation_delays = [] # Seconds between a block creation and its acceptance by each node
+        self._queue = [] # Heap of (virtual time, sequence number, function, arguments)
+        self._sequence = itertools.count()
+
+        if not isinstance(hash_rates, list):
+            hash_rates = [hash_rates] * nodes
+        assert len(hash_rates) == nodes
+
+        self.nodes = []
+        for i in range(nodes):
+            address = h.sha3_256(f"simulated-node-{i}".encode()).hexdigest()
+            consensusAlgorithm = SampledProofOfWork(difficulty) if consensus == "PoW" else ProofOfStake(difficulty, None)
+            self.nodes.append(SimNode(address, consensusAlgorithm, hash_rates[i]))
+
+        genesisChain = Blockchain()
+        genesisChain.createGenesisBlock(consensus=(consensus == "PoS"), beneficiaries=[n.address for n in self.nodes],
+                                        initial_supply=initial_balance * nodes, initial_beneficiary_amount=initial_balance)
+        genesisChain.lastBlock.timestamp = 0.
+        self.blocks[genesisChain.lastBlock.getHash()] = genesisChain.lastBlock
+        for node in self.nodes:
+            node.blockchain.addBlock(genesisChain.lastBlock)
+
+        self._connectNodes(peers_per_node)
+
+    def _connectNodes(self, peers_per_node: int):
+        """Connects each node to random peers, each link having its own latency."""
+        links = set()
+        for (i, node) in enumerate(self.nodes):
+            for j in self.random.sample(range(len(self.nodes) - 1), min(peers_per_node, len(self.nodes) - 1)):
+                j += j >= i # Skip the node itself
+                peer = self.nodes[j]
+                link = (min(i, j), max(i, j))
+                if not link in links:
+                    links.add(link)
+                    latency = self.random.uniform(0.5, 1.5) * self.latency
+                    node.peers.append((peer, latency))
+                    peer.peers.append((node, latency))
+
+    def schedule(self, delay: float, function: Callable, *args):
+        heapq.heappush(self._queue, (self.now + delay, next(self._sequence), function, args))
+
+    def run(self, duration: float) -> dict:
+        """Processes the events until the virtual clock reaches 'duration' seconds (from the current time), returns the statistics of the simulation."""
+        start = time.perf_counter()
+        end = self.now + duration
+        if self.events_processed == 0:
+            for node in self.nodes:
+                self._scheduleDiscovery(node)
+
+        while self._queue and self._queue[0][0] <= end:
+            self.now, _, function, args = heapq.heappop(self._queue)
+            function(*args)
+            self.events_processed += 1
+
+        self.now = end
+        return self.getStats(time.perf_counter() - start, duration)
+
+    def _scheduleDiscovery(self, node: SimNode):
+        node.round += 1
+        rate = node.getDiscoveryRate()
+        if rate > 0:
+            self.schedule(self.random.expovariate(rate), self._discoverBlock, node, node.round)
+
+    def _discoverBlock(self, node: SimNode, round: int):
+        if round != node.round: # Node switched to a new tip since the discovery was scheduled
+            return
+
+        previous_block = node.blockchain.lastBlock
+        block = Block(
+            timestamp=self.now,
+            transactionStore=TransactionStore(),
+            height=previous_block.height + 1,
+            consensusAlgorithm=node.isPoS(),
+            previousHash=previous_block.getHash(),
+            miner=node.address,
+            reward=node.computeReward(),
+            nonce=int(self.now * 10**7)) # Same time resolution as the PoS nonce (see ProofOfStake._get_time_bytes)
+        self.blocks[block.getHash()] = block
+        self.block_sizes[block.getHash()] = len(block.toJSON()) # Computed once instead of on each relay
+        node.blocks_mined += 1
+        node.blockchain.addBlock(block)
+        self._relay(node, block, None)
+        self._scheduleDiscovery(node)
+
+    def _relay(self, node: SimNode, block: Block, sender: SimNode):
+        size = self.block_sizes[block.getHash()]
+        for (peer, latency) in node.peers:
+            if peer is not sender and peer.blockchain.currentHeight < block.height: # Heights never decrease, the peer would ignore the block
+                delay = latency + self.random.expovariate(1 / (latency / 10)) + size / self.bandwidth
+                self.schedule(delay, self._receiveBlock, peer, block, node)
+
+    def _receiveBlock(self, node: SimNode, block: Block, sender: SimNode):
+        if block.height <= node.blockchain.currentHeight:
+            return # Already known block or shorter fork
+
+        if node.validateNewBlock(block):
+            node.blockchain.addBlock(block)
+        elif not self._switchFork(node, block):
+            return
+
+        self.propagation_delays.append(self.now - block.timestamp)
+        self._relay(node, block, sender)
+        self._scheduleDiscovery(node)
+
+    def _switchFork(self, node: SimNode, block: Block) -> bool:
+        """Replaces the end of the node's chain with the fork ending with 'block' (ancestors are fetched from the blocks known by the simulation)."""
+        chain = node.blockchain.blockChain
+        fork = [block]
+        while fork[-1].height > 0:
+            parent = self.blocks.get(fork[-1].previousHash)
+            if parent is None:
+                return False
+            if parent.height < len(chain) and chain[parent.height] is parent: # Common ancestor found
+                break
+            fork.append(parent)
+
+        del chain[fork[-1].height:]
+        for fork_block in reversed(fork):
+            node.blockchain.addBlock(fork_block)
+        node.reorgs += 1
+        return True
+
+    def getMainChain(self) -> list:
+        """Longest chain among the nodes (first node's chain on ties)."""
+        return max((node.blockchain.blockChain for node in self.nodes), key=len)
+
+    def getStats(self, wall_time: float=0., duration: float=0.) -> dict:
+        main_chain = self.getMainChain()
+        heights = [node.blockchain.currentHeight for node in self.nodes]
+        blocks_mined = sum(node.blocks_mined for node in self.nodes)
+        return {
+            'virtualTime': self.now,
+            'wallTime': wall_time,
+            'speedup': duration / wall_time if wall_time > 0 else 0.,
+            'events': self.events_processed,
+            'blocksMined': blocks_mined,
+            'mainChainHeight': main_chain[-1].height,
+            'staleBlocks': blocks_mined - main_chain[-1].height,
+            'reorgs': sum(node.reorgs for node in self.nodes),
+            'meanBlockInterval': self.now / main_chain[-1].height if main_chain[-1].height else 0.,
+            'meanPropagationDelay': sum(self.propagation_delays) / len(self.propagation_delays) if self.propagation_delays else 0.,
+            'minHeight': min(heights),
+            'maxHeight': max(heights),
+            'blocksPerMiner': {node.id: sum(1 for b in main_chain if b.miner == node.address) for node in self.nodes},
+        }
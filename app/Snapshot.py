@@ -0,0 +1,58 @@
+from __future__ import annotations # Allows for using class type hinting within class (see https://stackoverflow.com/a/33533514)
+import hashlib as h
+import json
+import os
+from typing import Union
+
+class Snapshot:
+    """State of the ledger after the block at 'height', for restoring balances without replaying the chain up to it.
+
+    The snapshot is identified by its commitment hash ('getHash'), covering the height, tip hash, balances, stakes and nonces.
+
+    :param height: height of the last block applied to the ledger
+    :param tipHash: hash of the block at 'height'
+    :param balances: dict of the non-null balances of the addresses
+    :param stakes: list of [address, stake] in the stake tree leaves order (see StakeTree.py)
+    :param nonces: dict of the nonces of the addresses having sent signed transactions (see Ledger.getNonce)
+    """
+    def __init__(self, height: int, tipHash: str, balances: dict, stakes: list, nonces: dict=None):
+        self.height = height
+        self.tipHash = tipHash
+        self.balances = balances
+        self.stakes = [tuple(s) for s in stakes] # Ensure elements are tuples since they can be loaded from JSON (which dumps tuples as lists)
+        self.nonces = nonces or {}
+
+    def __repr__(self):
+        return f"Snapshot(height={self.height}, tipHash={self.tipHash}, addresses={len(self.balances)})"
+
+    def getHash(self) -> str:
+        """Commitment hash of the snapshot."""
+        return h.sha3_256(self.toJSON().encode()).hexdigest()
+
+    def toJSON(self) -> str:
+        if not self.nonces: # Snapshots without signed transactions keep their commitment
+            return json.dumps({k: v for (k, v) in self.__dict__.items() if k != 'nonces'}, sort_keys=True)
+        return json.dumps(self.__dict__, sort_keys=True)
+
+    @classmethod
+    def fromJSON(cls, snapshot: dict) -> Snapshot:
+        return cls(**snapshot)
+
+    def save(self, file: Union[str, bytes]):
+        """Writes the snapshot with its commitment, replacing the file atomically (a crash leaves the previous snapshot)."""
+        with open(file + '.tmp', 'w') as f:
+            f.write(json.dumps({'commitment': self.getHash(), 'snapshot': self.toJSON()}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(file + '.tmp', file)
+
+    @classmethod
+    def load(cls, file: Union[str, bytes]) -> Snapshot:
+        """Reads a snapshot saved by 'save', raises ValueError if its content doesn't match its commitment."""
+        with open(file) as f:
+            data = json.load(f)
+
+        snapshot = cls.fromJSON(json.loads(data['snapshot']))
+        if snapshot.getHash() != data['commitment']:
+            raise ValueError(f"Snapshot '{file}' doesn't match its commitment {data['commitment']}")
+        return snapshot
@@ -0,0 +1,92 @@
+from __future__ import annotations # Allows for using class type hinting within class (see https://stackoverflow.com/a/33533514)
+from app.TreeLeaf import *
+
+class StakeTree:
+    """Sum tree of the addresses' stakes, drawing an address with a probability proportional to its stake in O(log n).
+
+    Stakes are held by the leaves of a complete binary tree of 'TreeLeaf', in order of first appearance of the addresses (so nodes applying
+    the same chain build the same tree and draw the same winners), inner nodes hold the total stake of their subtree.
+    The tree doubles its capacity when full, stake updates and draws only walk from a leaf to the root (or back).
+    """
+    def __init__(self):
+        self.root = TreeLeaf()
+        self.slots = [self.root] # Leaves of the tree from left to right, the first 'len(self)' being used by an address
+        self.index = {} # Key: address / Value: position of the address' leaf in 'slots'
+
+    def __len__(self):
+        """Number of addresses in the tree."""
+        return len(self.index)
+
+    @property
+    def total(self) -> int:
+        return self.root.value
+
+    def getStake(self, address: str) -> int:
+        position = self.index.get(address)
+        return self.slots[position].value if position is not None else 0
+
+    def setStake(self, address: str, stake: int):
+        """Updates the stake of an address, adding a leaf for addresses not yet in the tree (negative stakes count as zero)."""
+        stake = max(stake, 0)
+        position = self.index.get(address)
+        if position is None:
+            if stake == 0:
+                return
+            position = self._addLeaf(address)
+
+        leaf = self.slots[position]
+        leaf.add(stake - leaf.value)
+
+    def toList(self) -> list:
+        """Returns the (address, stake) of each address in leaves order (see 'fromList')."""
+        return [(self.slots[position].address, self.slots[position].value) for position in range(len(self))]
+
+    @classmethod
+    def fromList(cls, stakes: list) -> StakeTree:
+        """Builds the tree holding the given (address, stake) in the same leaves order, including the addresses without stake anymore."""
+        tree = cls()
+        for (address, stake) in stakes:
+            tree.slots[tree._addLeaf(address)].add(stake)
+        return tree
+
+    def truncate(self, length: int):
+        """Removes the addresses added after the first 'length' ones (used for rolling back the blocks that added them)."""
+        for position in range(len(self) - 1, length - 1, -1):
+            leaf = self.slots[position]
+            leaf.add(-leaf.value)
+            del self.index[leaf.address]
+            leaf.address = None
+
+    def pickTheWinner(self, number: int) -> str:
+        """Returns the address whose cumulated stake range (in leaves order) contains 'number', which must be in [0, total)."""
+        if not 0 <= number < self.total:
+            raise ValueError(f"Number {number} out of the stake range [0, {self.total})")
+        return self.pickTheWinnerRecursive(number, self.root)
+
+    def pickTheWinnerRecursive(self, number: int, node: TreeLeaf) -> str:
+        if node.isLeaf():
+            return node.address
+        elif node.rightChild is None: # If there's only one child
+            return self.pickTheWinnerRecursive(number, node.leftChild)
+        elif number < node.leftChild.value:
+            return self.pickTheWinnerRecursive(number, node.leftChild)
+        else:
+            return self.pickTheWinnerRecursive(number - node.leftChild.value, node.rightChild)
+
+    def _addLeaf(self, address: str) -> int:
+        position = len(self.index)
+        if position == len(self.slots): # Tree is full: the current tree becomes the left half of a tree twice as large
+            right = self._emptySubtree(len(self.slots))
+            self.root = TreeLeaf(child1=self.root, child2=right)
+
+        self.slots[position].address = address
+        self.index[address] = position
+        return position
+
+    def _emptySubtree(self, leaves: int) -> TreeLeaf:
+        if leaves == 1:
+            leaf = TreeLeaf()
+            self.slots.append(leaf)
+            return leaf
+        left = self._emptySubtree(leaves // 2)
+        return TreeLeaf(child1=left, child2=self._emptySubtree(leaves // 2))
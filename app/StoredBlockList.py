@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from typing import Callable
+
+from app.Block import *
+from app.BlockLog import *
+
+class StoredBlockList:
+    """List of blocks stored in a block log and decoded lazily when accessed, keeping the last accessed blocks in a bounded LRU cache.
+
+    Supports the list operations used on 'Blockchain.blockChain' (length, indexing, slicing, iteration, appending, replacing and removing blocks).
+    Like 'BlockList', calls 'onChange' with the lowest modified index before any change other than appending.
+    Replacing or removing blocks rewrites the end of the log from the first modified block.
+
+    :param log: block log holding the blocks
+    :param onChange: function called with the index of the first modified block
+    :param cache_size: maximum number of decoded blocks kept in memory
+    """
+    def __init__(self, log: BlockLog, onChange: Callable, cache_size: int=1024):
+        self.log = log
+        self.cache_size = cache_size
+        self._onChange = onChange
+        self._cache = OrderedDict() # Key: height / Value: decoded block, most recently used last
+
+    def __len__(self):
+        return len(self.log)
+
+    def __repr__(self):
+        return f"StoredBlockList({len(self)} blocks in '{self.log.path}')"
+
+    def _index(self, key: int) -> int:
+        index = key + len(self) if key < 0 else key
+        if not 0 <= index < len(self):
+            raise IndexError("block index out of range")
+        return index
+
+    def _get(self, index: int, cache=True) -> Block:
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+
+        block = self.log.read(index)
+        if cache:
+            self._cache[index] = block
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return block
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._get(i, cache=False) for i in range(*key.indices(len(self)))]
+        return self._get(self._index(key))
+
+    def __iter__(self):
+        """Iterates over the blocks without evicting the cached ones (e.g. the tip)."""
+        for i in range(len(self)):
+            yield self._get(i, cache=False)
+
+    def append(self, block: Block):
+        with self.log.lock:
+            self.log.append(block)
+            self._cache[len(self) - 1] = block
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def extend(self, blocks):
+        for block in blocks:
+            self.append(block)
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            (start, stop, step) = key.indices(len(self))
+            if step != 1:
+                raise ValueError("Extended slices are not supported by StoredBlockList")
+            self._rewrite(start, list(value) + self[max(start, stop):])
+        else:
+            index = self._index(key)
+            self._rewrite(index, [value] + self[index + 1:])
+
+    def __delitem__(self, key):
+        if isinstance(key, slice):
+            indices = range(*key.indices(len(self)))
+            if not indices:
+                return
+            if indices.step == 1: # Only the blocks after the slice are kept (none for the usual 'del chain[height:]')
+                kept = self[indices.stop:]
+            else:
+                kept = [block for (i, block) in enumerate(self[min(indices):], min(indices)) if i not in indices]
+            self._rewrite(min(indices), kept)
+        else:
+            index = self._index(key)
+            self._rewrite(index, self[index + 1:])
+
+    def insert(self, index, block: Block):
+        index = max(0, min(index + len(self) if index < 0 else index, len(self)))
+        self._rewrite(index, [block] + self[index:])
+
+    def pop(self, index=-1) -> Block:
+        index = self._index(index)
+        block = self[index]
+        del self[index]
+        return block
+
+    def clear(self):
+        self._rewrite(0, [])
+
+    def _rewrite(self, index: int, blocks: list):
+        """Replaces the blocks from 'index' with 'blocks'."""
+        self._onChange(index)
+        with self.log.lock:
+            self.log.truncate(index)
+            for height in [height for height in self._cache if height >= index]:
+                del self._cache[height]
+            self.extend(blocks)
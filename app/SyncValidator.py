@@ -0,0 +1,100 @@
+import multiprocessing as mp
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.Block import *
+
+MAX_FUTURE_TIME = 3600 # Seconds a block timestamp can be ahead of the validating node's clock
+
+def checkBlocks(blocks: list, targets: list, reward: int, version: int, now: float) -> tuple:
+    """Checks the rules of a batch of blocks not depending on the chain: PoW hash target (if 'targets' holds the target of each block),
+    timestamp, reward, version and structure of the transactions. Run by the worker processes of 'SyncValidator'.
+
+    The genesis block is not checked (its reward is the initial supply and it has no previous block).
+    Returns the hashes of the checked blocks and the (height, reason) of the first invalid block, or None if all blocks are valid.
+    """
+    hashes = []
+    for (i, block) in enumerate(blocks):
+        hashes.append(block.getHash())
+        if block.height == 0:
+            continue
+
+        reason = None
+        if block.timestamp - now > MAX_FUTURE_TIME:
+            reason = "timestamp too far in the future"
+        elif block.reward != reward:
+            reason = f"wrong reward {block.reward}"
+        elif block.version != version:
+            reason = f"wrong version {block.version}"
+        elif targets is not None and int(hashes[-1], 16) >= targets[i]:
+            reason = "hash above the PoW target"
+        elif not all(t.isWellFormed() for t in block.transactionStore.transactions):
+            reason = "malformed transaction"
+
+        if reason is not None:
+            return hashes, (block.height, reason)
+
+    return hashes, None
+
+class SyncValidator:
+    """Validation pipeline of the blocks received by a syncing node, in three stages.
+
+    1. Stateless checks ('checkBlocks') of each batch start as soon as the batch is received ('submit'), in a pool of 'workers' processes,
+       while the next batches are requested and the previous ones applied. With a single worker, they run in a background thread.
+    2. Stateful checks (PoS right to mine, balances spent) run sequentially against the ledger when the batch is applied,
+       each block being checked as the successor of the last applied block (see FullNode._applyInventory).
+    3. Valid blocks are committed to the chain in order, the ledger being updated incrementally for checking the next blocks.
+    PoW hashes are checked against the difficulty at the height of each block (see FullNode.getDifficulty), the difficulty changing during the simulation.
+
+    Each batch sent to a worker is pickled with all its transactions, which costs about as much as checking it in the background thread:
+    workers only pay off with idle cores and large batches ('sync_batch_size') of blocks with many transactions.
+    On a single core, or for small batches, keep a single worker (see bench/bench_sync_validation.py).
+
+    :param node: FullNode applying the blocks, only weakly referenced so that the node doesn't outlive its last user (and keep its socket bound)
+    :param workers: number of processes running the stateless checks (a single thread if less than 2)
+    """
+    def __init__(self, node, workers: int=1):
+        self._node = weakref.ref(node)
+        self.workers = workers
+        self._pool = None
+        self._checks = {} # Key: height of the first block of a submitted batch / Value: future of the 'checkBlocks' result
+
+    def submit(self, blocks: list):
+        """Starts the stateless checks of a received batch."""
+        node = self._node()
+        targets = [node.consensusAlgorithm.getTarget(node.getDifficulty(block.height)) for block in blocks] if node.isPoW() else None
+        args = (blocks, targets, node.computeReward(), node.block_version, time.time())
+        if self._pool is None:
+            if self.workers > 1:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context('spawn')) # Avoid forking the node's threads
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='SyncValidator')
+        self._checks[blocks[0].height] = self._pool.submit(checkBlocks, *args)
+
+    def checkStateless(self, blocks: list) -> tuple:
+        """Waits for the stateless checks of a batch (running them now if the batch was not submitted), returns the (height, reason) of the first invalid block or None.
+
+        Hashes computed by the workers are cached in the blocks, so they aren't computed again for checking the chain continuity.
+        """
+        future = self._checks.pop(blocks[0].height, None)
+        if future is None:
+            self.submit(blocks)
+            future = self._checks.pop(blocks[0].height)
+
+        hashes, invalid = future.result()
+        for (block, block_hash) in zip(blocks, hashes):
+            block.cacheHash(block_hash)
+        return invalid
+
+    def reset(self):
+        """Drops the checks of the batches of a previous sync attempt."""
+        for future in self._checks.values():
+            future.cancel()
+        self._checks = {}
+
+    def shutdown(self):
+        self.reset()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
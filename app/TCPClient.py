@@ -7,19 +7,43 @@ import socket
 from dotenv import load_dotenv
 from typing import Tuple
 
+from app.Framing import *
+from app.SendQueue import *
+from app.Transport import *
+
 load_dotenv()
 
 PEERS_JSON_PATH = os.getenv("PEERS_JSON_PATH")
 DNS_SERVER_IP = os.getenv("DNS_SERVER_IP")
 
 
-class TCPClient(object):
-    """Helper class for managing peers socket interactions."""
-    def __init__(self, server_addr):
+class TCPClient(Transport):
+    """Helper class for managing peers socket interactions.
+
+    Messages are sent as binary frames to peers who acknowledged it on connect and in the legacy format otherwise (see Framing.py).
+    Each peer has its own bounded send queue and writer thread so a slow peer doesn't delay the others (see SendQueue.py).
+    Peers reaching the high watermark of their queue are throttled, or disconnected if 'slow_peer_policy' is 'drop'.
+    A throttled peer is disconnected when a message that can't be replaced by a newer one (without coalescing key) is dropped.
+    """
+
+    negotiation_timeout = 1 # Seconds to wait for the binary framing acknowledgement of a peer on connect
+    flush_timeout = 1 # Seconds to wait for the pending messages to be sent on disconnect
+
+    def __init__(self, server_addr, checksum=True, high_watermark=1000, low_watermark=100, slow_peer_policy='throttle'):
         super(TCPClient, self).__init__()
         # TODO: simplifiy peer structure using only sockets attributes (see https://docs.python.org/3/library/socket.html?highlight=socket#socket.socket.getpeername)
         self.peers = {}  # Key : (HOST, PORT) / Value : socket representing the peer connection
+        self.queues = {} # Key : (HOST, PORT) / Value : SendQueue of the peer
+        self.binary_peers = set() # Peers accepting binary frames
+        self.checksum = checksum
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.slow_peer_policy = slow_peer_policy
         self.server_addr = server_addr
+        if not slow_peer_policy in ('throttle', 'drop'):
+            raise ValueError(f"slow_peer_policy must be 'throttle' or 'drop': slow_peer_policy={slow_peer_policy}")
+        if not 0 <= low_watermark < high_watermark: # Checked before connecting to peers (see SendQueue), 'peers' being set for __del__
+            raise ValueError(f"Watermarks must verify 0 <= low_watermark < high_watermark: low_watermark={low_watermark}, high_watermark={high_watermark}")
         # self.register_to_dns_and_fetch_peers()
         # self.connect_to_all_peers()
 
@@ -47,16 +71,19 @@ class TCPClient(object):
                 host, port = tuple(peer.split(':'))
                 self.peers[(host, int(port))] = None  # Socket will be instanced later in connect method
 
-    def send_data_to_peer(self, data: dict, peer: Tuple[str, int]):
+    def send_data_to_peer(self, data: dict, peer: Tuple[str, int], key=None) -> bool:
+        """Queues a message for a peer, a pending message with the same 'key' is replaced (see SendQueue.put)."""
         logging.debug(f"Trying to send {data} to {peer}")
-        if peer in self.peers:
-            sock = self.peers[peer]
-            try:
-                sock.send(self._encapsulateMsg(json.dumps(data)))
-            except Exception as e:
-                logging.error(f" In send_data_to_peer : {e}")
+        queue = self.queues.get(peer)
+        if queue is not None:
+            return queue.put(self._encode(data, peer in self.binary_peers), key)
         else:
             logging.error(f" TCPClient : Could not find {peer} in {self.peers} ")
+            return False
+
+    def getLatencies(self) -> dict:
+        """Average seconds between queuing and sending a message for each peer."""
+        return {peer: queue.latency for (peer, queue) in list(self.queues.items())}
 
     def connect(self, peer: Tuple[str, int]) -> bool:
         if peer in self.peers:  # Prevent connecting back to already connected peers
@@ -67,7 +94,10 @@ class TCPClient(object):
             sock.connect(peer)
             self.peers[peer] = sock
             data = {'connect': {'server_address': self.server_addr, 'peers': list(self.peers.keys())}}
-            sock.send(self._encapsulateMsg(json.dumps(data)))  # Sends server listening port for the remote peer to connect
+            sock.sendall(self._encapsulateMsg(json.dumps(data)))  # Sends server listening port for the remote peer to connect
+            if self._negotiateFraming(sock):
+                self.binary_peers.add(peer)
+            self.queues[peer] = SendQueue(peer, sock, self.high_watermark, self.low_watermark, self._onSlowPeer, self._dropPeer)
         except Exception as e:
             logging.error(f"connect: {e}")
             return False  # TODO : Handle connect exception
@@ -78,6 +108,10 @@ class TCPClient(object):
         if not peer in self.peers:
             return False
 
+        queue = self.queues.pop(peer, None) if clear else self.queues.get(peer)
+        if queue is not None:
+            queue.close(self.flush_timeout)
+
         try:
             self.peers[peer].close()
         except Exception as e:
@@ -86,23 +120,58 @@ class TCPClient(object):
 
         if clear:
             del self.peers[peer]
+            self.binary_peers.discard(peer)
             
         return True
 
-    def broadcast(self, data: dict):
-        for (peer, sock) in list(self.peers.items()):
-            try:
-                sock.send(self._encapsulateMsg(json.dumps(data)))
-            except BrokenPipeError as e:
-                logging.error(f"broadcasting: {e} to {peer}")
-            except Exception as e:
-                logging.error(f"Unexpected error during broadcasting: {e}")
+    def broadcast(self, data: dict, key=None):
+        """Queues a message for all peers without waiting for it to be sent."""
+        encoded = {} # Encode the message only once for each format
+        for (peer, queue) in list(self.queues.items()):
+            binary = peer in self.binary_peers
+            if not binary in encoded:
+                encoded[binary] = self._encode(data, binary)
+            queue.put(encoded[binary], key)
+
+    def _onSlowPeer(self, queue: SendQueue):
+        if self.slow_peer_policy == 'drop':
+            self._dropPeer(queue)
+
+    def _dropPeer(self, queue: SendQueue):
+        if self.queues.get(queue.peer) is not queue: # Already dropped
+            return
+
+        logging.warning(f"Disconnecting slow peer {queue.peer}")
+        self.queues.pop(queue.peer, None)
+        queue.close(0) # Don't wait for the writer thread, closing the socket stops it
+        self.disconnect(queue.peer, True)
+        if self.on_peer_dropped is not None:
+            self.on_peer_dropped(queue.peer)
+
+    def _negotiateFraming(self, sock: socket.socket) -> bool:
+        """Waits for the peer acknowledging binary frames after the 'connect' message, legacy peers never answer."""
+        sock.settimeout(self.negotiation_timeout)
+        try:
+            ack = b''
+            while len(ack) < len(ACK):
+                received = sock.recv(len(ACK) - len(ack))
+                if not received:
+                    break
+                ack += received
+        except socket.timeout:
+            ack = b''
+        finally:
+            sock.settimeout(None)
+
+        return ack == ACK
+
+    def _encode(self, data: dict, binary: bool) -> bytes:
+        return encodeFrame(data, self.checksum) if binary else self._encapsulateMsg(json.dumps(data))
 
     def _encapsulateMsg(self, msg: str) -> bytes:
-        """Encaspulate the 'msg' data by converting it to base64 and wrapping it in a JSON object with special character delimiter '|' for separating messages.
+        """Encaspulate the 'msg' data in the legacy format (see Framing.py).
 
         This system allows for easy parsing of multiple messages coming on the socket receive buffer. 
         """
         
-        # TODO: Could add a checksum and replace the use of special character with a data length prefix
-        return (json.dumps({'msg': base64.b64encode(msg.encode('utf-8')).decode('utf-8')}) + '|').encode('utf-8')
+        return encodeLegacy(msg)
@@ -1,30 +1,138 @@
 from __future__ import annotations # Allows for using class type hinting within class (see https://stackoverflow.com/a/33533514)
+import hashlib as h
+import sys
 from json import dumps
 
+from app.BinaryCodec import *
+
+def internAddress(address: str) -> str:
+    """Returns the interned address, a single string being shared by all the transactions and blocks of an address."""
+    return sys.intern(address) if type(address) is str else address
+
 class Transaction:
-    """Represents a transaction between two peers."""
-    def __init__(self, senders: list, receivers: list):
-        """Senders and receivers are a list of tuples with the addresses and the amounts."""
+    """Represents a transaction between two peers.
+
+    Senders and receivers are stored as immutable tuples of (address, amount) with interned addresses.
+    A signed transaction carries a (public key, signature) pair for each sender (see 'sign' and SignatureVerifier.py), the signatures covering
+    the transaction id ('getTxid'). The hash of a signed transaction ('getHash') also covers its signatures.
+    A signed transaction also carries a nonce for each sender, covered by the transaction id: the nonce must be the number of signed transactions
+    of the sender already confirmed (see Ledger.getNonce), so a confirmed transaction can't be replayed.
+    """
+    __slots__ = ('senders', 'receivers', 'signatures', 'nonces')
+
+    def __init__(self, senders: list, receivers: list, signatures: list=(), nonces: list=()):
+        """Senders and receivers are a list of tuples with the addresses and the amounts.
+
+        Signatures are a list of (public key, signature) pairs in the order of the senders, as bytes or hex strings (loaded from JSON).
+        Nonces are a list of integers in the order of the senders, set before signing.
+        """
         total_in = 0
         for (addr, amount) in senders:
             total_in += amount
         # Ensure elements are tuples since they can be loaded from JSON (which dumps tuples as lists)
-        self.senders = [tuple(t) for t in senders]
+        self.senders = tuple((internAddress(addr), amount) for (addr, amount) in senders)
 
         total_out = 0
         for (addr, amount) in receivers:
             total_out += amount
         if total_out > total_in:
             raise ValueError("Sum of amount in must be >= Sum of amount out")
-        # Ensure elements are tuples since they can be loaded from JSON (which dumps tuples as lists)
-        self.receivers = [tuple(t) for t in receivers]
+        self.receivers = tuple((internAddress(addr), amount) for (addr, amount) in receivers)
+        self.signatures = tuple(tuple(bytes.fromhex(v) if isinstance(v, str) else bytes(v) for v in pair) for pair in signatures)
+        self.nonces = tuple(nonces)
 
     def __repr__(self):
         return f"(in:{self.senders}, out:{self.receivers})"
 
+    def isWellFormed(self) -> bool:
+        """Checks the transaction has senders and receivers, without duplicate inputs or negative amounts spent (which could offset other debits)."""
+        return (any(self.senders)
+                and any(self.receivers)
+                and len(self.signatures) in (0, len(self.senders)) # Unsigned or signed by each sender
+                and len(self.nonces) == len(self.signatures) # Nonce of each signing sender
+                and all(type(nonce) is int and nonce >= 0 for nonce in self.nonces)
+                and len(self.senders) == len(set(self.senders)) # Check for duplicate inputs
+                and all(amount >= 0 for (_, amount) in self.senders))
+
+    def getHash(self) -> str:
+        return h.sha3_256(self.toJSON().encode()).hexdigest()
+
+    def getTxid(self) -> str:
+        """Hash of the transaction without its signatures, signed by the senders (same as 'getHash' for an unsigned transaction)."""
+        if self.nonces:
+            return h.sha3_256(dumps({'nonces': self.nonces, 'receivers': self.receivers, 'senders': self.senders}, sort_keys=True).encode()).hexdigest()
+        return h.sha3_256(dumps({'receivers': self.receivers, 'senders': self.senders}, sort_keys=True).encode()).hexdigest()
+
+    def sign(self, *wallets, nonces: list=None) -> Transaction:
+        """Signs the transaction id with the wallet of each sender, replacing the previous signatures.
+
+        :param nonces: nonce of each sender (see Ledger.getNonce), keeping the current nonces if None (all 0 without nonces)
+        """
+        if nonces is not None:
+            self.nonces = tuple(nonces)
+        elif not self.nonces:
+            self.nonces = (0,) * len(self.senders)
+        if len(self.nonces) != len(self.senders):
+            raise ValueError(f"Expected {len(self.senders)} nonces, got {len(self.nonces)}")
+        wallets = {w.address: w for w in wallets}
+        txid = bytes.fromhex(self.getTxid())
+        signatures = []
+        for (addr, _) in self.senders:
+            if addr not in wallets:
+                raise ValueError(f"Missing wallet for signing the transaction of sender {addr}")
+            signatures.append((wallets[addr].public_key_bytes, wallets[addr].sign(txid)))
+        self.signatures = tuple(signatures)
+        return self
+
     def toJSON(self):
-        return dumps(self, default=lambda o: o.__dict__, sort_keys=True)
+        if self.signatures: # Unsigned transactions keep their encoding (and hash)
+            return dumps({'nonces': self.nonces, 'receivers': self.receivers, 'senders': self.senders,
+                          'signatures': [(key.hex(), signature.hex()) for (key, signature) in self.signatures]}, sort_keys=True)
+        return dumps({'receivers': self.receivers, 'senders': self.senders}, sort_keys=True)
 
     @classmethod
     def fromJSON(cls, store: dict) -> Transaction:
-        return cls(**store)
\ No newline at end of file
+        return cls(**store)
+
+    def toBytes(self) -> bytes:
+        """Binary encoding of the transaction (see BinaryCodec.py)."""
+        if len(self.senders) > MAX_SENDERS:
+            raise ValueError(f"Too many senders ({len(self.senders)}) to be encoded")
+        parts = [COUNT.pack(len(self.senders) | SIGNED_FLAG if self.signatures else len(self.senders))]
+        for (addr, amount) in self.senders:
+            parts += (packString(addr), AMOUNT.pack(amount))
+        parts.append(COUNT.pack(len(self.receivers)))
+        for (addr, amount) in self.receivers:
+            parts += (packString(addr), AMOUNT.pack(amount))
+        for ((key, signature), nonce) in zip(self.signatures, self.nonces):
+            parts += (packBytes(key), packBytes(signature), NONCE.pack(nonce))
+        return b''.join(parts)
+
+    @classmethod
+    def fromBytes(cls, data: bytes) -> Transaction:
+        return cls.decode(memoryview(data), 0)[0]
+
+    @classmethod
+    def decode(cls, view: memoryview, offset: int) -> tuple:
+        """Decodes the transaction encoded at 'offset', returns the transaction and the offset following it."""
+        entries = ([], [])
+        signed = False
+        for entry in entries:
+            (count,) = COUNT.unpack_from(view, offset)
+            if entry is entries[0]: # Senders count carries the signed flag
+                signed, count = count & SIGNED_FLAG, count & MAX_SENDERS
+            offset += COUNT.size
+            for _ in range(count):
+                end = offset + 1 + view[offset] # Inlined 'unpackString'
+                entry.append((str(view[offset + 1:end], 'utf-8'), AMOUNT.unpack_from(view, end)[0]))
+                offset = end + AMOUNT.size
+
+        signatures = []
+        nonces = []
+        for _ in range(len(entries[0]) if signed else 0):
+            key, offset = unpackBytes(view, offset)
+            signature, offset = unpackBytes(view, offset)
+            signatures.append((key, signature))
+            nonces.append(NONCE.unpack_from(view, offset)[0])
+            offset += NONCE.size
+        return cls(*entries, signatures, nonces), offset
@@ -1,13 +1,23 @@
 from __future__ import annotations # Allows for using class type hinting within class (see https://stackoverflow.com/a/33533514)
+from app.MerkleTree import *
 from app.Transaction import *
 
 import json
 
-class TransactionStore(dict):
-    """Stores all transactions within a block."""
+class TransactionStore:
+    """Stores all transactions within a block.
+
+    The Merkle root of the transactions is computed once on the first 'getMerkleRoot' and updated incrementally by 'addTransaction'
+    while the tree is kept (see 'releaseMerkleTree').
+    Transactions are held in a tuple copied from the given list, so the store (and the cached hash of its block) can only change through 'addTransaction'.
+    """
+    __slots__ = ('transactions', 'revision', '_tree', '_root')
+
     def __init__(self, transactions: list(Transaction) = None):
-        super(TransactionStore, self).__init__()
-        self.transactions = transactions if transactions != None else []
+        self.transactions = tuple(transactions) if transactions != None else ()
+        self.revision = 0 # Incremented on each new transaction for invalidating the cached header of the block holding the store
+        self._tree = None # Merkle tree of the transactions
+        self._root = None # Merkle root of the transactions, None until computed
     
     def __str__(self):
         return str(self.transactions)
@@ -16,8 +26,48 @@ class TransactionStore(dict):
         return str(self.transactions)
 
     def addTransaction(self, transaction: Transaction):
-        self.transactions.append(transaction)
+        self.transactions += (transaction,)
+        self.revision += 1
+        if self._tree is not None:
+            self._tree.append(bytes.fromhex(transaction.getHash()))
+            self._root = self._tree.root
+        else:
+            self._root = None
+
+    def getMerkleRoot(self) -> bytes:
+        if self._root is None:
+            self._tree = MerkleTree([bytes.fromhex(t.getHash()) for t in self.transactions])
+            self._root = self._tree.root
+        return self._root
+
+    def releaseMerkleTree(self):
+        """Only keeps the Merkle root (e.g. for blocks of the chain), the tree being built again for a proof or a new transaction."""
+        self.getMerkleRoot()
+        self._tree = None
+
+    def getMerkleProof(self, index: int) -> list:
+        """Returns the inclusion proof of the transaction at 'index' (see MerkleTree.getProof)."""
+        tree = self._tree if self._tree is not None else MerkleTree([bytes.fromhex(t.getHash()) for t in self.transactions])
+        return tree.getProof(index)
     
     @classmethod
     def fromJSON(cls, store: list) -> TransactionStore:
-        return cls(transactions=[Transaction.fromJSON(json.loads(t)) for t in store])
\ No newline at end of file
+        return cls(transactions=[Transaction.fromJSON(json.loads(t)) for t in store])
+
+    def toBytes(self) -> bytes:
+        return STORE_COUNT.pack(len(self.transactions)) + b''.join(t.toBytes() for t in self.transactions)
+
+    @classmethod
+    def fromBytes(cls, data: bytes) -> TransactionStore:
+        return cls.decode(memoryview(data), 0)[0]
+
+    @classmethod
+    def decode(cls, view: memoryview, offset: int) -> tuple:
+        """Decodes the store encoded at 'offset', returns the store and the offset following it."""
+        (count,) = STORE_COUNT.unpack_from(view, offset)
+        offset += STORE_COUNT.size
+        transactions = []
+        for _ in range(count):
+            transaction, offset = Transaction.decode(view, offset)
+            transactions.append(transaction)
+        return cls(transactions), offset
@@ -0,0 +1,39 @@
+from typing import Tuple
+
+class Transport:
+    """Client side of a node's networking: connections to the peers' servers and sending of RPC messages.
+
+    Implementations: TCPClient (sockets, one writer thread per peer), AsyncTCPClient (asyncio event loop) and InProcessClient (in-memory queues).
+    Messages are dicts mapping an RPC method name to its JSON serializable data (see TCPHandler.WHITELISTED_FUNCTIONS).
+    """
+
+    on_peer_dropped = None # Function called with the server address of a peer disconnected by the transport (e.g. too slow)
+
+    def connect(self, peer: Tuple[str, int]) -> bool:
+        """Opens a connection to a peer's server and sends it a 'connect' message, returns False if already connected or unreachable."""
+        pass
+
+    def disconnect(self, peer: Tuple[str, int], clear=False) -> bool:
+        pass
+
+    def send_data_to_peer(self, data: dict, peer: Tuple[str, int], key=None) -> bool:
+        pass
+
+    def broadcast(self, data: dict, key=None):
+        pass
+
+class TransportServer:
+    """Server side of a node's networking replacing the socketserver loop: receives the peers' messages and calls the node's 'RPC_' methods (see TCPHandler.dispatchRPC).
+
+    Implementations: AsyncNetwork and InProcessServer.
+    """
+    def serve_forever(self):
+        """Handles peer connections until 'shutdown' is called."""
+        pass
+
+    def shutdown(self):
+        pass
+
+    def close(self):
+        """Closes all connections (the server can't be used afterwards)."""
+        pass
@@ -1,9 +1,32 @@
 class TreeLeaf:
-    def __init__(self, value=0, child1=False, child2=False):
+    """Node of a sum tree: a leaf holds the value of an address (e.g. its stake), an inner node the sum of its children's values.
+
+    :param value: value of the leaf (ignored for inner nodes)
+    :param child1: left child of an inner node
+    :param child2: right child of an inner node
+    :param address: address whose value is held by the leaf (None for an empty leaf)
+    """
+    def __init__(self, value=0, child1=False, child2=False, address=None):
+        self.parent = None
+        self.address = address
         if child1 is False and child2 is False:
             self.value = value
+            self.leftChild = None
+            self.rightChild = None
         else:
-            self.leftChild = child1
-            self.rightChild = child2
-            self.value = child1.value + child2.value
+            self.leftChild = child1 if child1 is not False else None
+            self.rightChild = child2 if child2 is not False else None
+            self.value = sum(child.value for child in (self.leftChild, self.rightChild) if child is not None)
+            for child in (self.leftChild, self.rightChild):
+                if child is not None:
+                    child.parent = self
+
+    def isLeaf(self) -> bool:
+        return self.leftChild is None and self.rightChild is None
 
+    def add(self, amount):
+        """Adds 'amount' to the value of the node and of all its ancestors."""
+        node = self
+        while node is not None:
+            node.value += amount
+            node = node.parent
@@ -1,32 +1,97 @@
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
 import base58
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.serialization import *
 
+from app.Keystore import *
+
+# PBKDF2 iterations of each key derivation profile, the 'simulation' profile deriving keys about 200 times faster for starting large simulations
+# Wallets of the same seed have different keys (and addresses) with different profiles
+KDF_PROFILES = {'default': 200_000, 'simulation': 1_000}
+
+def deriveKey(seed: bytes, iterations: int) -> bytes:
+    """Derives the private key of a wallet from its seed (run by the worker processes of 'createWallets')."""
+    salt = b'' # Empty salt for the purpose of generating the same addresses (useful for the simulation)
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=iterations)
+    return kdf.derive(seed)
+
+def createWallets(seeds: list, workers: int=1, kdf_profile: str='default', keystore: Keystore=None) -> list:
+    """Creates the wallets of a list of seeds, deriving the keys not found in the 'keystore' in a pool of 'workers' processes.
+
+    The keys derived are added to the keystore, saved once all the keys are derived.
+    """
+    iterations = KDF_PROFILES[kdf_profile]
+    derived = {seed.encode('utf-8'): None for seed in seeds}
+    if keystore is not None:
+        derived = {seed: keystore.get(seed, iterations) for seed in derived}
+
+    missing = [seed for (seed, key) in derived.items() if key is None]
+    if workers > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn')) as pool: # Avoid forking the caller's threads
+            keys = list(pool.map(deriveKey, missing, [iterations] * len(missing)))
+    else:
+        keys = [deriveKey(seed, iterations) for seed in missing]
+
+    for (seed, key) in zip(missing, keys):
+        derived[seed] = key
+        if keystore is not None:
+            keystore.put(seed, iterations, key)
+    if keystore is not None and missing:
+        keystore.save()
+
+    return [Wallet(seed, kdf_profile=kdf_profile, derived_key=derived[seed.encode('utf-8')]) for seed in seeds]
 
 class Wallet(object):
-    """Wallet associated with a FullNode."""
-    def __init__(self, seed: str, display_name=""):
+    """Wallet associated with a FullNode.
+
+    :param seed: seed the private key is derived from (see 'generate_keys')
+    :param kdf_profile: key derivation profile (see KDF_PROFILES)
+    :param keystore: keystore caching the derived keys (saved by the caller), None for always deriving the key
+    :param derived_key: key already derived from the seed (see 'createWallets')
+    """
+    def __init__(self, seed: str, display_name="", kdf_profile: str='default', keystore: Keystore=None, derived_key: bytes=None):
         super(Wallet, self).__init__()
         self.display_name = display_name
         self.balance = 0
-        self.secret_key = self.generate_keys(seed.encode('utf-8'))
+        self.secret_key = self.generate_keys(seed.encode('utf-8'), kdf_profile, keystore, derived_key)
         self.address = self.generate_address()
 
-    def generate_keys(self, seed: bytes) -> ec.EllipticCurvePrivateKey:
-        salt = b'' # Empty salt for the purpose of generating the same addresses (useful for the simulation)
-        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=200_000)
-        dk = kdf.derive(seed)
+    def generate_keys(self, seed: bytes, kdf_profile: str='default', keystore: Keystore=None, derived_key: bytes=None) -> ec.EllipticCurvePrivateKey:
+        """Derives the private key from the seed with PBKDF2, unless the key is given or found in the keystore."""
+        iterations = KDF_PROFILES[kdf_profile]
+        dk = derived_key
+        if dk is None and keystore is not None:
+            dk = keystore.get(seed, iterations)
+        if dk is None:
+            dk = deriveKey(seed, iterations)
+            if keystore is not None:
+                keystore.put(seed, iterations, dk) # Written on the next 'save', once for a batch of wallets (see createWallets)
         return ec.derive_private_key(int.from_bytes(dk, "big"),
                                      ec.SECP256K1())  # An EllipticCurvePrivateKey object (see https://cryptography.io/en/latest/hazmat/primitives/asymmetric/ec/#cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey)
 
     def generate_address(self) -> bytes:
         """Generates a base58 encoded hash derived from the public key."""
+        return Wallet.addressFromPublicKey(self.secret_key.public_key())
+
+    @staticmethod
+    def addressFromPublicKey(public_key: ec.EllipticCurvePublicKey) -> str:
         digest = hashes.Hash(hashes.SHA256())
-        digest.update(self.secret_key.public_key().public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo))
+        digest.update(public_key.public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo))
         return base58.b58encode(digest.finalize()).decode('utf-8') # Store address as string
 
+    @property
+    def public_key_bytes(self) -> bytes:
+        """Compressed point of the public key (33 bytes), carried by the transactions signed by the wallet."""
+        return self.secret_key.public_key().public_bytes(Encoding.X962, PublicFormat.CompressedPoint)
+
+    def sign(self, data: bytes) -> bytes:
+        """Returns the DER encoded ECDSA signature of the data."""
+        return self.secret_key.sign(data, ec.ECDSA(hashes.SHA256()))
+
     def addToBalance(self, amount: int):
         if amount <= 0:
             raise ValueError("Amount cannot be negative or zero")
@@ -1,4 +1,5 @@
 import logging
+import os
 from dotenv import load_dotenv
 from pathlib import Path
 from streamlit.runtime.scriptrunner.script_run_context import add_script_run_ctx
@@ -77,14 +78,25 @@ if __name__ == "__main__":
     epoch_time_input = inputs_container.number_input("Epoch duration (in milliseconds)", 100, 1000*60*60, value=1000, step=100)
     if consensus_input[:3] == "PoW":
         mining_difficulty_input = inputs_container.number_input("Mining difficulty", 0., 15., value=5., step=0.5)
+        mining_workers_input = inputs_container.number_input("Mining processes per node", 1, os.cpu_count(), value=1, step=1)
     elif consensus_input[:3] == "PoS":
         mining_difficulty_input = inputs_container.number_input("Mining difficulty", 0, 10_000_000, value=20_000, step=1)
+        mining_workers_input = 1
 
     # Random events parameters
     transaction_frequency_input = inputs_container.slider("Transaction frequency", 0., 1., value=.3, format="%f")
     disconnect_frequency_input = inputs_container.slider("Disconnect frequency", 0., 1., value=.01, format="%f")
     new_peer_frequency_input = inputs_container.slider("New peer frequency", 0., 1., value=.02, format="%f")
 
+    # Networking parameters
+    asyncio_mode_input = inputs_container.checkbox("Run nodes networking on an asyncio event loop (instead of one thread per connection)")
+    in_process_input = inputs_container.checkbox("Exchange messages between nodes in memory (no TCP sockets, faster for large simulations)")
+    process_mode_input = inputs_container.checkbox("Run each node in its own process (mining and validation scale with the number of cores)")
+
+    # Wallets parameters
+    fast_kdf_input = inputs_container.checkbox("Derive the wallets keys with a low-cost KDF (faster startup, different addresses)")
+    keystore_input = inputs_container.checkbox("Cache the wallets keys on disk (unencrypted, faster restart)")
+
     # Tokenomics parameters
     initial_supply_input = inputs_container.number_input("Initial coin supply", 1, 2**32, value=100_000, step=1)
     initial_transfer_amount_input = inputs_container.number_input("Initial balance of starting nodes", 1, 2**32, value=50, step=1)
@@ -110,7 +122,14 @@ if __name__ == "__main__":
             new_peer_frequency_input,
             consensus_input[:3],
             initial_supply_input,
-            initial_transfer_amount_input
+            initial_transfer_amount_input,
+            mining_workers_input,
+            asyncio_mode_input,
+            in_process_input and not process_mode_input,
+            process_mode_input,
+            'simulation' if fast_kdf_input else 'default',
+            str(app_dir / '.keystore') if keystore_input else None,
+            os.cpu_count()
         )
 
         t = Thread(target=handle_input)
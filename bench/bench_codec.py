@@ -0,0 +1,56 @@
+"""Compares the JSON and binary encodings of blocks: size, encoding, decoding and hashing time.
+
+Merkle blocks use the binary encoding, their hash (after a change other than a new transaction) only covering the fixed-size header.
+
+Run with `python -m bench.bench_codec [transactions per block] [blocks]`.
+"""
+import json
+import sys
+import time
+
+from app.Block import *
+from app.Wallet import *
+
+def makeBlocks(transactions: int, count: int, version: int) -> list:
+    addresses = [Wallet(f"bench_{i}").address for i in range(8)]
+    blocks = []
+    previous_hash = "0"
+    for height in range(count):
+        store = TransactionStore([Transaction(senders=[(addresses[i % 8], 10 + i)], receivers=[(addresses[(i + 1) % 8], 10 + i)]) for i in range(transactions)])
+        block = Block(time.time(), store, height, False, previous_hash, addresses[height % 8], 1, nonce=height * 7919, version=version)
+        previous_hash = block.getHash()
+        blocks.append(block)
+    return blocks
+
+def decodeJSON(data: str) -> Block:
+    block = json.loads(data)
+    block['transactionStore'] = TransactionStore.fromJSON(block['transactionStore'])
+    return Block.fromJSON(block)
+
+def timeIt(function, items: list) -> float:
+    """Returns the microseconds per item spent by 'function'."""
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - start) / len(items) * 10**6
+
+def uncached(function):
+    """Invalidates the cached header before each call (the binary encoding of a BINARY_VERSION block reuses it)."""
+    def wrapper(block: Block):
+        block.reward = block.reward
+        return function(block)
+    return wrapper
+
+if __name__ == '__main__':
+    transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"{count} blocks of {transactions} transactions")
+    print(f"{'encoding':<8} {'bytes':>10} {'encode (us)':>12} {'decode (us)':>12} {'hash (us)':>12}")
+    for (name, version, encode, decode) in (("json", Block.JSON_VERSION, Block.toJSON, decodeJSON),
+                                            ("binary", Block.BINARY_VERSION, Block.toBytes, Block.fromBytes),
+                                            ("merkle", Block.MERKLE_VERSION, Block.toBytes, Block.fromBytes)):
+        blocks = makeBlocks(transactions, count, version)
+        encoded = [encode(b) for b in blocks]
+        assert all(decode(e).getHash() == b.getHash() for (e, b) in zip(encoded, blocks))
+        print(f"{name:<8} {sum(len(e) for e in encoded) // count:>10} {timeIt(uncached(encode), blocks):>12.1f} {timeIt(decode, encoded):>12.1f} {timeIt(uncached(Block.getHash), blocks):>12.1f}")
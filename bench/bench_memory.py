@@ -0,0 +1,54 @@
+"""Measures the heap used by a chain held in memory: bytes per block (without transactions) and per transaction.
+
+Blocks are decoded from their JSON encoding and hashed, like the blocks of a chain loaded from disk or received from peers.
+Run with `python -m bench.bench_memory [blocks] [transactions per block]`.
+"""
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from app.Block import *
+
+ADDRESSES = [f"address_{i:02d}_" + "x" * 32 for i in range(50)] # Same length as the base58 addresses of the wallets
+
+def makeEncodedBlocks(count: int, transactions: int) -> list:
+    encoded = []
+    previous_hash = "0"
+    for height in range(count):
+        store = TransactionStore([Transaction(senders=[(ADDRESSES[(height + i) % 50], 10)], receivers=[(ADDRESSES[(height + i + 1) % 50], 10)])
+                                  for i in range(transactions)])
+        block = Block(time.time(), store, height, False, previous_hash, ADDRESSES[height % 50], 1, nonce=height)
+        previous_hash = block.getHash()
+        encoded.append(block.toJSON())
+    return encoded
+
+def decode(data: str) -> Block:
+    block = json.loads(data)
+    block['transactionStore'] = TransactionStore.fromJSON(block['transactionStore'])
+    return Block.fromJSON(block)
+
+def measure(encoded: list) -> int:
+    """Returns the bytes allocated for holding the decoded and hashed blocks."""
+    gc.collect()
+    tracemalloc.start()
+    blocks = []
+    for data in encoded:
+        block = decode(data)
+        block.getHash()
+        blocks.append(block)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    transactions = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    empty = measure(makeEncodedBlocks(count, 0)) / count
+    full = measure(makeEncodedBlocks(count, transactions)) / count
+    print(f"{count} blocks of {transactions} transactions")
+    print(f"bytes per block (without transactions): {empty:.0f}")
+    print(f"bytes per transaction: {(full - empty) / transactions:.0f}")
@@ -0,0 +1,33 @@
+"""Measures the transactions per second whose signatures are verified: uncached, cached (e.g. verified at mempool entry) and in a process pool.
+
+Run with `python -m bench.bench_signatures [transactions] [workers]`.
+"""
+import os
+import sys
+import time
+
+from app.SignatureVerifier import *
+
+def measure(transactions: list, verifier: SignatureVerifier) -> float:
+    start = time.perf_counter()
+    assert verifier.verify(transactions)
+    return len(transactions) / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+    wallets = [Wallet(f"bench_{i}") for i in range(8)]
+    transactions = [Transaction(senders=[(wallets[i % 8].address, 10)], receivers=[(wallets[(i + 1) % 8].address, 10)]).sign(wallets[i % 8])
+                    for i in range(count)]
+
+    verifier = SignatureVerifier()
+    print(f"{count} signed transactions")
+    print(f"{'verification':<20} {'tx/s':>10}")
+    print(f"{'inline':<20} {measure(transactions, verifier):>10.0f}")
+    print(f"{'cached':<20} {measure(transactions, verifier):>10.0f}")
+
+    verifier = SignatureVerifier(workers=workers)
+    verifier.verify(transactions[:MIN_PARALLEL_BATCH]) # Don't count the start of the worker processes
+    print(f"{f'{workers} workers':<20} {measure(transactions[MIN_PARALLEL_BATCH:], verifier):>10.0f}")
+    verifier.shutdown()
@@ -0,0 +1,40 @@
+"""Measures the startup time of the nodes of a simulation: wallets creation (key derivation) and nodes creation.
+
+Wallets are created one after another, in bulk with a process pool, from a warm keystore and with the 'simulation' KDF profile.
+Run with `python -m bench.bench_startup [nodes] [workers]`.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from app.FullNode import *
+
+def startNodes(count: int, create_wallets) -> tuple:
+    """Returns the seconds spent creating the wallets and the nodes."""
+    start = time.perf_counter()
+    wallets = create_wallets([str(i) for i in range(count)])
+    created = time.perf_counter()
+    network = InProcessNetwork()
+    nodes = [FullNode(consensusAlgorithm=False, existing_wallet=w, server_address=('node', i), in_process_network=network) for (i, w) in enumerate(wallets)]
+    end = time.perf_counter()
+    for node in nodes:
+        node.server_close()
+    return created - start, end - created
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        keystore = Keystore(os.path.join(directory, 'keystore'))
+        createWallets([str(i) for i in range(count)], keystore=keystore) # Warm the keystore
+
+        print(f"{count} nodes")
+        print(f"{'wallets':<28} {'wallets (s)':>12} {'nodes (s)':>10}")
+        for (name, create_wallets) in (("sequential", lambda seeds: [Wallet(seed) for seed in seeds]),
+                                       (f"bulk, {workers} workers", lambda seeds: createWallets(seeds, workers=workers)),
+                                       ("keystore", lambda seeds: createWallets(seeds, keystore=Keystore(keystore.file))),
+                                       ("simulation profile", lambda seeds: createWallets(seeds, kdf_profile='simulation'))):
+            wallets_time, nodes_time = startNodes(count, create_wallets)
+            print(f"{name:<28} {wallets_time:>12.2f} {nodes_time:>10.2f}")
@@ -0,0 +1,62 @@
+"""Measures the blocks per second applied by a syncing node, without validation and with the validation pipeline (see SyncValidator.py).
+
+Blocks are mined at difficulty 1 and received as batches, like in 'FullNode.RPC_updateInventory': each batch is submitted to the
+stateless checks when received, and applied once all batches are received.
+Run with `python -m bench.bench_sync_validation [blocks] [transactions per block] [workers] [batch size]`.
+
+Each batch is pickled to a worker with all its transactions, which costs about as much as checking it inline: on a single core,
+several workers are slower than one (676 vs 2093 blocks/s for 1000 blocks of 10 transactions). They only pay off with idle cores
+and large batches of blocks with many transactions, e.g. `python -m bench.bench_sync_validation 2000 100 4 500`.
+"""
+import os
+import sys
+import time
+
+from app.FullNode import *
+
+def makeChain(count: int, transactions: int) -> list:
+    miner = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("bench_sync"), in_process_network=InProcessNetwork(), difficulty=1)
+    miner.blockchain.blockChain = []
+    miner.blockchain.createGenesisBlock(beneficiaries=[miner.wallet.address], initial_beneficiary_amount=count * transactions)
+    for height in range(count):
+        for i in range(transactions):
+            miner.mempool.add(Transaction(senders=[(miner.wallet.address, 1)], receivers=[(f"receiver_{i}", 1)]))
+        block = miner.createNewBlock()
+        miner.consensusAlgorithm.mine(block)
+        miner.blockchain.addBlock(block)
+        miner.mempool.removeConfirmed(block)
+    miner.server_close()
+    return [block.toJSON() for block in miner.blockchain.blockChain]
+
+def measure(encoded: list, validation: bool, workers: int, batch_size: int) -> float:
+    """Returns the blocks per second decoded, checked and applied by a node."""
+    node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("bench_sync_node"), in_process_network=InProcessNetwork(), difficulty=1,
+                    sync_validation=validation, sync_validation_workers=workers)
+    if validation and workers > 1: # Don't count the start of the worker processes
+        node.sync_validator.submit([FullNode._decodeBlock(encoded[0])])
+        node.sync_validator.reset()
+    try:
+        start = time.perf_counter()
+        blocks = [FullNode._decodeBlock(e) for e in encoded]
+        node.blockchain.blockChain[0] = blocks[0]
+        batches = [blocks[i:i + batch_size] for i in range(1, len(blocks), batch_size)]
+        if validation:
+            for batch in batches:
+                node.sync_validator.submit(batch)
+        for batch in batches:
+            assert node._applyInventory(batch)
+        return (len(blocks) - 1) / (time.perf_counter() - start)
+    finally:
+        node.server_close()
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    transactions = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else (os.cpu_count() or 1)
+    batch_size = int(sys.argv[4]) if len(sys.argv) > 4 else 50 # Default 'sync_batch_size'
+
+    encoded = makeChain(count, transactions)
+    print(f"{count} blocks of {transactions} transactions, batches of {batch_size} blocks")
+    print(f"{'validation':<20} {'blocks/s':>10}")
+    for (name, validation, w) in (("none", False, 1), ("1 worker", True, 1), (f"{workers} workers", True, workers)):
+        print(f"{name:<20} {measure(encoded, validation, w, batch_size):>10.0f}")
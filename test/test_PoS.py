@@ -2,6 +2,7 @@ import hashlib as h
 import time
 import unittest
 import warnings
+from threading import Thread
 
 from app.ProofOfStake import *
 from app.Blockchain import *
@@ -60,15 +61,137 @@ class PoSTests(unittest.TestCase):
         w_alice.balance = 2
 
         node_alice = FullNode(consensusAlgorithm=True, existing_wallet=w_alice)
+
+        self.addCleanup(node_alice.close) # Release the node's port for the next tests
         node_alice.blockchain.blockChain[0] = blockchain.blockChain[0]
         block = node_alice.createNewBlock()
         if node_alice.consensusAlgorithm.mine(block):
             node_alice.blockchain.addBlock(block)
 
         node_bob = FullNode(consensusAlgorithm=True, existing_wallet=w_bob)
+
+        self.addCleanup(node_bob.close) # Release the node's port for the next tests
         node_bob.blockchain.blockChain[0] = blockchain.blockChain[0]
 
         self.assertTrue(node_bob.validateNewBlock(node_alice.blockchain.lastBlock), f"Bob could not validate Alice's new block")
 
+    def test_stake_tree(self):
+        stakes = StakeTree()
+        balances = {f"address-{i}": (i * 37) % 11 for i in range(20)}
+        for (address, balance) in balances.items():
+            stakes.setStake(address, balance)
+        stakes.setStake("address-3", -5) # Negative balances have no stake
+        balances["address-3"] = 0
+
+        self.assertEqual(stakes.total, sum(balances.values()), f"Wrong total stake: expected {sum(balances.values())} got {stakes.total}")
+        cumulated = 0
+        for address in stakes.index: # Each number in [0, total) draws the address whose cumulated stake range contains it
+            for number in range(cumulated, cumulated + balances[address]):
+                self.assertEqual(stakes.pickTheWinner(number), address, f"Wrong winner for number {number}")
+            cumulated += balances[address]
+
+    def test_stake_rollback(self):
+        w_alice = Wallet("Alice")
+        w_bob = Wallet("Bob")
+        blockchain = Blockchain()
+        blockchain.createGenesisBlock(True, beneficiaries=[w_alice.address])
+        b = Block(timestamp=time.time(), transactionStore=TransactionStore([Transaction(senders=[(w_alice.address, 40)], receivers=[(w_bob.address, 40)])]),
+                  height=1, consensusAlgorithm=True, previousHash=blockchain.lastBlock.getHash(), miner=w_bob.address, reward=1)
+        blockchain.addBlock(b)
+        self.assertEqual(blockchain.getStakes().getStake(w_bob.address), 41)
+
+        del blockchain.blockChain[1:] # Bob's leaf is removed with the block adding it, keeping the same tree as a node without the block
+        fresh = Blockchain()
+        fresh.addBlock(blockchain.blockChain[0])
+
+        self.assertEqual(blockchain.getStakes().index, fresh.getStakes().index, "Stake tree differs from a node without the removed block")
+        self.assertTrue(blockchain.checkLedger(), "Stakes differ from the chain after rollback")
+
+    def test_leader_selection(self):
+        w_alice = Wallet("Alice")
+        w_bob = Wallet("Bob")
+        
+        blockchain = Blockchain()
+        blockchain.createGenesisBlock(True, beneficiaries=[w_alice.address]) # Only Alice has a stake
+        w_alice.balance = 100
+
+        node_alice = FullNode(consensusAlgorithm=True, existing_wallet=w_alice, pos_slot_time=0.01)
+
+        self.addCleanup(node_alice.close) # Release the node's port for the next tests
+        node_alice.blockchain.blockChain[0] = blockchain.blockChain[0]
+        node_alice.blockchain.lastBlock.timestamp = time.time() - 1 # First slot already started
+        block = node_alice.createNewBlock()
+        self.assertTrue(node_alice.consensusAlgorithm.mine(block), "Alice could not mine in leader selection mode")
+        self.assertEqual(block.nonce, 0, "Alice should lead every slot")
+
+        node_bob = FullNode(consensusAlgorithm=True, existing_wallet=w_bob, pos_slot_time=0.01)
+
+        self.addCleanup(node_bob.close) # Release the node's port for the next tests
+        node_bob.blockchain.blockChain[0] = node_alice.blockchain.lastBlock
+        self.assertTrue(node_bob.validateNewBlock(block), "Bob could not validate Alice's new block")
+
+        block.miner = w_bob.address # Bob has no stake and can't lead any slot
+        self.assertFalse(node_bob.validateNewBlock(block), "Bob validated a block from a miner without stake")
+
+    def test_scheduled_mining(self):
+        wallet = Wallet("test_PoS")
+        wallet.balance = 1
+
+        chain = Blockchain()
+        chain.createGenesisBlock(True)
+
+        PoS = ProofOfStake(100, wallet, scheduled=True)
+        PoS.spin_tick_time = 0.001 # Threshold not scaled: one eligible tick out of 100 on average
+        start = time.process_time()
+        self.assertTrue(PoS.mine(chain.lastBlock), "Scheduled mining did not find an eligible timestamp")
+        cpu_time = time.process_time() - start
+
+        to_hash = chain.lastBlock.previousHash.encode() + wallet.address.encode() + chain.lastBlock.nonce.to_bytes(8, 'big')
+        _hash = int.from_bytes(h.sha3_256(to_hash).digest(), 'big')
+        self.assertLessEqual(_hash, int(2**256 * wallet.balance / PoS.blockDifficulty), "Scheduled mining returned a non eligible timestamp")
+        self.assertEqual(chain.lastBlock.nonce % 10_000, 0, "Nonce is not one of the evaluated ticks")
+        self.assertLessEqual(chain.lastBlock.nonce / 10**7, time.time(), "Block was mined before its timestamp")
+        self.assertLess(cpu_time, 0.05, f"Scheduled mining used {cpu_time:.3f}s of CPU")
+
+    def test_scheduled_mining_cpu(self):
+        wallet = Wallet("test_PoS")
+        wallet.balance = 1
+
+        chain = Blockchain()
+        chain.createGenesisBlock(True)
+
+        cpu_times = []
+        for scheduled in (False, True): # Default tick of scheduled mining, no eligible timestamp before a long time
+            PoS = ProofOfStake(10**30, wallet, scheduled=scheduled)
+            miner = Thread(target=PoS.mine, args=(chain.lastBlock,))
+            start = time.process_time()
+            miner.start()
+            time.sleep(0.5)
+            PoS.stopMining()
+            miner.join()
+            cpu_times.append(time.process_time() - start)
+
+        self.assertLess(PoS.spin_tick_time, PoS.tick_time, "Default tick not coarser than the spinning lottery")
+        self.assertEqual(PoS.getTickThreshold(10**6), int(10**6 * PoS.tick_time / PoS.spin_tick_time), "Tick threshold not scaled")
+        self.assertLess(cpu_times[1], cpu_times[0] / 5, f"Scheduled mining CPU time not reduced : spinning={cpu_times[0]:.3f}s, scheduled={cpu_times[1]:.3f}s")
+
+    def test_scheduled_mining_stop(self):
+        wallet = Wallet("test_PoS")
+        wallet.balance = 1
+
+        chain = Blockchain()
+        chain.createGenesisBlock(True)
+
+        PoS = ProofOfStake(10**12, wallet, scheduled=True, tick_time=0.01) # No eligible tick before a long time
+        result = []
+        miner = Thread(target=lambda: result.append(PoS.mine(chain.lastBlock)))
+        miner.start()
+        time.sleep(0.2)
+        PoS.stopMining()
+        miner.join(timeout=1)
+
+        self.assertFalse(miner.is_alive(), "Scheduled mining did not wake up on stop")
+        self.assertEqual(result, [False])
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
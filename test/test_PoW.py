@@ -1,3 +1,5 @@
+import hashlib as h
+import json
 from math import modf
 import time
 import unittest
@@ -47,8 +49,95 @@ class PoWTests(unittest.TestCase):
         with self.assertRaises(ValueError):
             PoW.mine(chain.lastBlock)
 
+    def test_difficulty_parallel(self):
+        chain = Blockchain()
+        chain.createGenesisBlock()
+
+        PoW = ProofOfWork(2.5, workers=2)
+        try:
+            self.assertTrue(PoW.mine(chain.lastBlock), "Parallel mining did not find a nonce")
+            self.assertTrue(PoW.checkHash(chain.lastBlock),
+                            f"PoW parallel mining broken : hash={chain.lastBlock.getHash()}, difficulty={PoW.blockDifficulty}")
+            self.assertGreater(PoW.hashRate, 0, "Hash rate not reported for parallel mining")
+
+            PoW.blockDifficulty = 64 # Unreachable difficulty, mining has to be stopped
+            Thread(target=lambda: (time.sleep(0.5), PoW.stopMining())).start()
+            self.assertFalse(PoW.mine(chain.lastBlock), "Parallel mining did not stop")
+        finally:
+            PoW.shutdown()
+
+    def test_block_hash_cache(self):
+        chain = Blockchain()
+        chain.createGenesisBlock()
+        block = chain.lastBlock
+
+        PoW = ProofOfWork(1.5)
+        PoW.mine(block)
+        self.assertEqual(block.getHash(), h.sha3_256(block.toJSON().encode()).hexdigest(),
+                         f"Cached block hash differs from JSON hash : hash={block.getHash()}, json={block.toJSON()}")
+
+        previous_hash = block.getHash()
+        block.transactionStore.addTransaction(Transaction(senders=[(Wallet("first").address, 1)], receivers=[(Wallet("second").address, 1)]))
+        self.assertNotEqual(block.getHash(), previous_hash, "Block hash not updated after adding a transaction")
+        self.assertEqual(block.getHash(), h.sha3_256(block.toJSON().encode()).hexdigest(), "Cached block hash differs from JSON hash after adding a transaction")
+
+        previous_hash = block.getHash()
+        block.reward += 1
+        self.assertNotEqual(block.getHash(), previous_hash, "Block hash not updated after changing a field")
+        self.assertEqual(block.getHash(), h.sha3_256(block.toJSON().encode()).hexdigest(), "Cached block hash differs from JSON hash after changing a field")
+
+        transactions = [Transaction(senders=[(Wallet("first").address, 1)], receivers=[(Wallet("second").address, 1)])]
+        block.transactionStore = TransactionStore(transactions)
+        previous_hash = block.getHash()
+        transactions.append(transactions[0]) # List given to the store is copied
+        self.assertEqual(block.getHash(), previous_hash, "Block hash changed by a list not held by the block")
+        with self.assertRaises(AttributeError):
+            block.transactionStore.transactions.append(transactions[0])
+
+    def test_binary_block_hash(self):
+        chain = Blockchain()
+        chain.createGenesisBlock(beneficiaries=[Wallet("first").address], version=Block.BINARY_VERSION)
+        block = chain.lastBlock
+
+        PoW = ProofOfWork(1.5)
+        PoW.mine(block)
+        self.assertTrue(PoW.checkHash(block), f"Binary block mined with an invalid hash : hash={block.getHash()}")
+        self.assertEqual(block.getHash(), h.sha3_256(block.toBytes()[:-8] + b'%d' % block.nonce).hexdigest(),
+                         "Binary block hash differs from the hash of its binary encoding")
+        self.assertNotEqual(block.getHash(), Block.fromJSON({**json.loads(block.toJSON()), 'version': Block.JSON_VERSION,
+                                                             'transactionStore': block.transactionStore}).getHash(),
+                            "Block hash doesn't depend on the block version")
+
+        previous_hash = block.getHash()
+        block.transactionStore.addTransaction(Transaction(senders=[(Wallet("first").address, 1)], receivers=[(Wallet("second").address, 1)]))
+        self.assertNotEqual(block.getHash(), previous_hash, "Binary block hash not updated after adding a transaction")
+
+    def test_merkle_block_hash(self):
+        chain = Blockchain()
+        chain.createGenesisBlock(version=Block.MERKLE_VERSION)
+        block = chain.lastBlock
+        header_size = len(block.getHeaderTemplate()[0])
+        transactions = [Transaction(senders=[(f"sender_{i}", i + 1)], receivers=[(f"receiver_{i}", i + 1)]) for i in range(11)]
+        for t in transactions:
+            previous_hash = block.getHash()
+            block.transactionStore.addTransaction(t)
+            self.assertNotEqual(block.getHash(), previous_hash, "Merkle block hash not updated after adding a transaction")
+        self.assertEqual(len(block.getHeaderTemplate()[0]), header_size, "Hashed header size depends on the number of transactions")
+        self.assertEqual(block.getMerkleRoot(), TransactionStore(transactions).getMerkleRoot().hex(), "Incremental Merkle root differs from the full tree root")
+
+        PoW = ProofOfWork(1.5)
+        PoW.mine(block)
+        self.assertTrue(PoW.checkHash(block), f"Merkle block mined with an invalid hash : hash={block.getHash()}")
+        self.assertEqual(Block.fromBytes(block.toBytes()).getHash(), block.getHash(), "Merkle block hash changed by its binary encoding")
+
+        for (i, t) in enumerate(transactions):
+            self.assertTrue(Block.verifyTransaction(t, block.getMerkleProof(i), block.getMerkleRoot()), f"Inclusion proof of transaction #{i} rejected")
+        other = Transaction(senders=[("sender_0", 2)], receivers=[("receiver_0", 2)])
+        self.assertFalse(Block.verifyTransaction(other, block.getMerkleProof(0), block.getMerkleRoot()), "Inclusion proof accepted for another transaction")
+
     def test_block_validation_difficulty(self):
         node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet(""))
+        self.addCleanup(node.close) # Release the node's port for the next tests
         block = Block(timestamp=time.time(), transactionStore=TransactionStore(), height=1,
                       consensusAlgorithm=node.consensusAlgorithm, previousHash=node.blockchain.lastBlock.getHash(), miner=0, reward=node.computeReward(),
                       nonce=0)
@@ -66,6 +155,7 @@ class PoWTests(unittest.TestCase):
 
     def test_block_validation_timestamp(self):
         node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet(""))
+        self.addCleanup(node.close) # Release the node's port for the next tests
 
         # Timestamp 1 day in the future
         invalid_block = Block(timestamp=time.time() + 24 * 3600, transactionStore=TransactionStore(), height=1,
@@ -85,6 +175,7 @@ class PoWTests(unittest.TestCase):
 
     def test_block_validation_reward(self):
         node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet(""))
+        self.addCleanup(node.close) # Release the node's port for the next tests
 
         # Invalid null reward
         invalid_block = Block(timestamp=time.time(), transactionStore=TransactionStore(), height=1,
@@ -137,6 +228,72 @@ class PoWTests(unittest.TestCase):
             Transaction(senders=[(Wallet("first").address, 1)], receivers=[(Wallet("second").address, 1)])),
             "Correct transaction gets invalidated")
 
+    def test_block_double_spend(self):
+        node = self._init_node_with_transaction() # "first" holds 1 coin
+        first, second = Wallet("first").address, Wallet("second").address
+        spend = lambda amount, receiver=second: Transaction(senders=[(first, amount)], receivers=[(receiver, amount)])
+
+        self.assertTrue(node.validateTransactions([spend(1)]), "Transaction spending the whole balance gets invalidated")
+        self.assertTrue(all(node.validateTransaction(t) for t in [spend(1), spend(1, node.wallet.address)]))
+        self.assertFalse(node.validateTransactions([spend(1), spend(1, node.wallet.address)]), "Double spend within a block gets validated")
+        self.assertFalse(node.validateTransactions([spend(2), spend(-1)]),
+                         "Negative debit offsetting another transaction gets validated")
+
+        block = Block(timestamp=time.time(), transactionStore=TransactionStore([spend(1), spend(1, node.wallet.address)]), height=2, consensusAlgorithm=False,
+                      previousHash=node.blockchain.lastBlock.getHash(), miner=node.wallet.address, reward=node.computeReward())
+        node.consensusAlgorithm.mine(block)
+        self.assertFalse(node.validateNewBlock(block), "Block with a double spend gets validated")
+
+    def test_transaction_signatures(self):
+        node = self._init_node_with_transaction() # "first" holds 1 coin
+        node.require_signatures = True
+        first, second = Wallet("first"), Wallet("second")
+        spend = lambda receiver=second.address: Transaction(senders=[(first.address, 1)], receivers=[(receiver, 1)])
+
+        self.assertEqual(spend().getHash(), spend().getTxid(), "Unsigned transaction hash changed")
+        self.assertFalse(node.validateTransaction(spend()), "Unsigned transaction gets validated")
+        self.assertFalse(node.validateTransaction(Transaction(senders=[(first.address, 1)], receivers=[(second.address, 1)],
+                                                              signatures=[(second.public_key_bytes, second.sign(bytes.fromhex(spend().getTxid())))], nonces=[0])),
+                         "Transaction signed by another wallet gets validated")
+        signed = spend().sign(first)
+        self.assertFalse(node.validateTransaction(Transaction(senders=signed.senders, receivers=[(node.wallet.address, 1)], signatures=signed.signatures,
+                                                              nonces=signed.nonces)),
+                         "Transaction with a signature of another transaction gets validated")
+        for decoded in (Transaction.fromJSON(json.loads(signed.toJSON())), Transaction.fromBytes(signed.toBytes())):
+            self.assertEqual((decoded.getHash(), decoded.signatures, decoded.nonces), (signed.getHash(), signed.signatures, signed.nonces),
+                             "Signatures not decoded")
+
+        self.assertTrue(node.addToTransactionPool(signed), "Signed transaction rejected from the transaction pool")
+        block = node.createNewBlock()
+        node.consensusAlgorithm.mine(block)
+        hits = node.signature_verifier.hits
+        self.assertTrue(node.validateNewBlock(block), "Block with a signed transaction gets invalidated")
+        self.assertEqual(node.signature_verifier.hits, hits + 1, "Signature verified at transaction pool entry verified again")
+
+        node.blockchain.addBlock(block)
+        node.mempool.removeConfirmed(block)
+        self.assertEqual(node.getNextNonce(first.address), 1, "Confirmed signed transaction doesn't increment the sender nonce")
+        self.assertFalse(node.addToTransactionPool(signed), "Confirmed signed transaction replayed in the transaction pool")
+        self.assertFalse(node.validateTransactions([signed]), "Confirmed signed transaction replayed in a block")
+        free = lambda nonce, receiver=second.address: Transaction(senders=[(first.address, 0)], receivers=[(receiver, 0)]).sign(first, nonces=[nonce])
+        self.assertTrue(node.validateTransaction(free(1)), "Signed transaction with the next nonce gets invalidated")
+        self.assertTrue(node.validateTransactions([free(1), free(2)]), "Consecutive nonces in a block get invalidated")
+        self.assertFalse(node.validateTransactions([free(1), free(1, node.wallet.address)]), "Duplicated nonce in a block gets validated")
+        self.assertFalse(node.validateTransactions([free(2)]), "Nonce gap gets validated")
+        self.assertEqual(node.blockchain.getSnapshot().nonces, {first.address: 1}, "Nonces not in the ledger snapshot")
+        node.blockchain.blockChain = node.blockchain.blockChain[:-1]
+        self.assertEqual(node.blockchain.getNonce(first.address), 0, "Nonce not rolled back with the block")
+
+        verifier = SignatureVerifier(workers=2)
+        try:
+            batch = [spend().sign(first) for _ in range(MIN_PARALLEL_BATCH)] # ECDSA signatures are randomized, each transaction being verified
+            self.assertTrue(verifier.verify(batch), "Signed batch gets invalidated")
+            self.assertFalse(verifier.verify(batch + [Transaction(senders=signed.senders, receivers=[(first.address, 1)], signatures=signed.signatures,
+                                                                  nonces=signed.nonces)]),
+                             "Batch with an invalid signature gets validated")
+        finally:
+            verifier.shutdown()
+
     def test_transaction_pool(self):
         transactions = [
             Transaction(senders=[(Wallet("1").address, 1)], receivers=[(Wallet("2").address, 1)]),
@@ -144,22 +301,59 @@ class PoWTests(unittest.TestCase):
             Transaction(senders=[(Wallet("3").address, 1)], receivers=[(Wallet("1").address, 1)])
         ]
         node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet(""))
+        self.addCleanup(node.close) # Release the node's port for the next tests
 
         for t in transactions:
             node.addToTransactionPool(t)
         self.assertEqual(node.transaction_pool, transactions,
             f"Node transaction pool doesn't contains all transactions : transaction_pool={node.transaction_pool}, transactions={transactions}")
 
-        b = node.createNewBlock()
-        self.assertEqual(b.transactionStore.transactions, transactions, 
-            f"New block transactions are not the same as original transactions : newblock={b.transactionStore}, original={transactions}")
-
         node.removeFromTransactionPool(transactions[0])
         self.assertEqual(node.transaction_pool, transactions[1:],
             f"Transaction is not removed from transaction pool : transaction_pool={node.transaction_pool}, new_transactions={transactions[1:]}")
 
+        node = self._init_node_with_transaction() # "first" holds 1 coin
+        first, second, third = Wallet("first").address, Wallet("second").address, Wallet("third").address
+        spends = [
+            Transaction(senders=[(first, 1)], receivers=[(second, 1)]),
+            Transaction(senders=[(second, 1)], receivers=[(third, 1)]), # Coins received in the same block can't be spent
+            Transaction(senders=[(first, 1)], receivers=[(third, 1)]) # Double spend
+        ]
+        for t in spends:
+            node.addToTransactionPool(t)
+        b = node.createNewBlock()
+        self.assertEqual(b.transactionStore.transactions, (spends[0],),
+            f"New block transactions are not the affordable transactions : newblock={b.transactionStore}, original={spends}")
+        self.assertTrue(node.validateTransactions(b.transactionStore.transactions), "New block transactions get invalidated")
+        self.assertEqual(node.transaction_pool, spends, "Skipped transactions removed from transaction pool")
+
+    def test_transaction_pool_eviction(self):
+        transactions = [Transaction(senders=[(Wallet("1").address, i)], receivers=[(Wallet("2").address, i)]) for i in range(1, 6)]
+        node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet(""), mempool_max_transactions=3)
+        self.addCleanup(node.close) # Release the node's port for the next tests
+
+        for t in transactions[:4]:
+            self.assertTrue(node.addToTransactionPool(t), f"Transaction not added to transaction pool : transaction={t}")
+        self.assertFalse(node.addToTransactionPool(transactions[3]), "Duplicated transaction added to transaction pool")
+        self.assertEqual(len(node.mempool), 3)
+        self.assertNotIn(transactions[0].getHash(), node.mempool, "Oldest transaction is not evicted from full transaction pool")
+        self.assertEqual(node.mempool.transactions, transactions[1:4],
+            f"Pending transactions not kept in arrival order : transactions={node.mempool.transactions}")
+
+        self.assertTrue(node.addToTransactionPool(transactions[4]))
+        self.assertNotIn(transactions[1].getHash(), node.mempool, "Eviction doesn't follow the arrival order")
+        self.assertEqual(node.mempool.getTransactionsFrom(Wallet("1").address), transactions[2:])
+
+        b = Block(timestamp=time.time(), transactionStore=TransactionStore(transactions[2:4]), height=1,
+                  consensusAlgorithm=False, previousHash=node.blockchain.lastBlock.getHash(), miner=node.wallet.address, reward=node.computeReward())
+        self.assertEqual(node.mempool.removeConfirmed(b), 2)
+        self.assertEqual(node.mempool.transactions, transactions[4:],
+            f"Confirmed transactions are not removed from transaction pool : transactions={node.mempool.transactions}")
+        self.assertEqual(node.mempool.removeConfirmed(b), 0, "Confirmed transactions removed twice")
+
     def _init_node_with_transaction(self):
         node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet(""))
+        self.addCleanup(node.close) # Release the node's port for the next tests
         t = Transaction(senders=[(Wallet("beforefirst").address, 1)], receivers=[(Wallet("first").address, 1)])
         b = Block(timestamp=time.time(), transactionStore=TransactionStore(), height=1,
                   consensusAlgorithm=node.consensusAlgorithm, previousHash=node.blockchain.lastBlock.getHash(), miner=0, reward=node.computeReward(),
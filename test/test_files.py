@@ -1,10 +1,12 @@
 import logging
+import pickle
 import unittest
 import time
 from pathlib import Path
 
 from app.Block import *
 from app.Blockchain import *
+from app.Wallet import *
 
 class FilesTests(unittest.TestCase):
     @classmethod
@@ -13,6 +15,8 @@ class FilesTests(unittest.TestCase):
         cls.blockchain = Blockchain()
         cls.blockchain.createGenesisBlock()
         cls.json_filename = 'blockchain.json.temp' # Change file extension to prevent accidentaly messing with a real blockchain JSON file
+        cls.log_filename = 'blockchain.log.temp'
+        cls.keystore_filename = 'keystore.temp'
         cls.block_generator = cls._generate_block(cls, cls.blockchain.lastBlock)
 
         for _ in range(20): # Add a few blocks to the blockchain
@@ -102,8 +106,200 @@ class FilesTests(unittest.TestCase):
         self.assertLess(divergent_index, len(copy.blockChain),
             f"'copy' blockchain should be longer than original : divergent_index={divergent_index}, copy={len(copy.blockChain)}")
 
+    def test_block_log(self):
+        """Verifies blocks are appended to the block log and read back by height or hash."""
+        chain = Blockchain()
+        chain.openLog(self.log_filename, sync_interval=None)
+        for block in self.blockchain.blockChain[:21]: # Blocks created by 'setUpClass' (other tests add blocks)
+            chain.addBlock(block)
+        size = chain.log.size
+        chain.addBlock(next(self._generate_block(chain.lastBlock)))
+
+        self.assertEqual(len(chain.log), len(chain.blockChain), f"Log length differs from the chain : log={len(chain.log)}, chain={len(chain.blockChain)}")
+        self.assertEqual(chain.log.size - size, len(chain.lastBlock.toJSON()) + BlockLog.RECORD_HEADER.size, "Saving a block did not append a single record")
+        self.assertEqual(chain.log.read(5), chain.blockChain[5], "Block read by height differs from the chain")
+        self.assertEqual(chain.log.getHeight(chain.blockChain[7].getHash()), 7, "Wrong height for block hash")
+        chain.closeLog()
+
+        restored = Blockchain()
+        restored.createGenesisBlock()
+        self.assertTrue(restored.openLog(self.log_filename, sync_interval=None))
+        self.assertEqual(self._check_blockchain_equality(restored, chain), len(chain.blockChain), "Restored chain differs from the saved chain")
+        restored.closeLog()
+
+    def test_block_log_rollback(self):
+        """Verifies the block log follows the blocks replaced in the chain."""
+        chain = Blockchain()
+        chain.openLog(self.log_filename, sync_interval=None)
+        for block in self.blockchain.blockChain[:21]: # Blocks created by 'setUpClass' (other tests add blocks)
+            chain.addBlock(block)
+
+        del chain.blockChain[10:]
+        fork = self._generate_block(chain.lastBlock)
+        for _ in range(3):
+            chain.addBlock(next(fork))
+        self.assertEqual(len(chain.log), 13, f"Log was not truncated on the fork : log={len(chain.log)}")
+        self.assertEqual(chain.log.getHash(12), chain.lastBlock.getHash(), "Log does not end with the fork")
+        chain.closeLog()
+
+    def test_block_log_recovery(self):
+        """Verifies a record torn by a crash is dropped and a record missing from the index is recovered."""
+        chain = Blockchain()
+        chain.openLog(self.log_filename, sync_interval=None)
+        for block in self.blockchain.blockChain[:21]: # Blocks created by 'setUpClass' (other tests add blocks)
+            chain.addBlock(block)
+        chain.closeLog()
+
+        with open(self.log_filename + '.index', 'r+b') as f: # Last index entry was not written
+            f.truncate(20 * BlockLog.ENTRY_SIZE + 3)
+        with open(self.log_filename, 'ab') as f: # Block partially written
+            f.write(BlockLog.RECORD_HEADER.pack(1000, 0) + b'{"consensus')
+
+        log = BlockLog(self.log_filename, sync_interval=None)
+        self.assertEqual(len(log), 21, f"Wrong number of blocks recovered : {len(log)}")
+        self.assertEqual(log.read(20), self.blockchain.blockChain[20], "Recovered block differs from the chain")
+        log.close()
+
+    def test_lazy_block_log(self):
+        """Verifies a chain read lazily from the block log behaves like the loaded chain while keeping few decoded blocks."""
+        chain = Blockchain()
+        chain.openLog(self.log_filename, sync_interval=None)
+        for block in self.blockchain.blockChain[:21]: # Blocks created by 'setUpClass' (other tests add blocks)
+            chain.addBlock(block)
+        chain.closeLog()
+
+        lazy = Blockchain()
+        lazy.createGenesisBlock()
+        self.assertTrue(lazy.openLog(self.log_filename, sync_interval=None, lazy=True, cache_size=4))
+        self.assertEqual(lazy.currentHeight, chain.currentHeight)
+        self.assertEqual(lazy.blockChain[5:8], chain.blockChain[5:8], "Slice of the lazy chain differs from the chain")
+        self.assertEqual(self._check_blockchain_equality(lazy, chain), len(chain.blockChain), "Lazy chain differs from the chain")
+        self.assertLessEqual(len(lazy.blockChain._cache), 4, f"Too many decoded blocks kept : {len(lazy.blockChain._cache)}")
+        self.assertTrue(lazy.checkLedger(), "Balances of the lazy chain differ from the chain")
+
+        fork = self._generate_block(lazy.blockChain[10])
+        lazy.blockChain = chain.blockChain[:11] + [next(fork) for _ in range(2)]
+        lazy.addBlock(next(fork))
+        self.assertEqual((lazy.currentHeight, len(lazy.log)), (13, 14), "Lazy chain did not switch to the fork")
+        self.assertEqual(lazy.log.read(13), lazy.lastBlock, "Log does not end with the fork")
+        lazy.closeLog()
+
+    def test_snapshot(self):
+        """Verifies the ledger of a chain reopened from the block log is restored from the last snapshot, and rolled back below it."""
+        chain = Blockchain()
+        chain.openLog(self.log_filename, sync_interval=None, snapshot_interval=8)
+        for block in self.blockchain.blockChain[:21]: # Blocks created by 'setUpClass' (other tests add blocks)
+            chain.addBlock(block)
+        self.assertEqual(Snapshot.load(self.log_filename + '.snapshot').height, 16, "Snapshot not saved every 'snapshot_interval' blocks")
+        chain.closeLog()
+
+        restored = Blockchain()
+        restored.createGenesisBlock()
+        self.assertTrue(restored.openLog(self.log_filename, sync_interval=None, lazy=True))
+        self.assertEqual(restored.ledger.base, 17, "Ledger not restored from the snapshot")
+        self.assertTrue(restored.checkLedger(), "Balances restored from the snapshot differ from the chain")
+        self.assertEqual(restored.getSnapshot().getHash(), chain.getSnapshot().getHash())
+
+        fork = self._generate_block(restored.blockChain[10])
+        restored.blockChain = chain.blockChain[:11] + [next(fork) for _ in range(2)] # Rollback below the snapshot replays the chain
+        self.assertEqual(restored.ledger.base, 0, "Ledger not reset when rolling back below the snapshot")
+        self.assertTrue(restored.checkLedger(), "Balances differ from the chain after rolling back below the snapshot")
+        restored.closeLog()
+
+        with open(self.log_filename + '.snapshot', 'r+') as f: # Tampered snapshot is ignored
+            data = json.load(f)
+            data['snapshot'] = data['snapshot'].replace('"height": 16', '"height": 15')
+            f.seek(0)
+            f.truncate()
+            json.dump(data, f)
+        with self.assertRaises(ValueError):
+            Snapshot.load(self.log_filename + '.snapshot')
+        tampered = Blockchain()
+        self.assertTrue(tampered.openLog(self.log_filename, sync_interval=None))
+        self.assertEqual((tampered.snapshot, tampered.ledger.base), (None, 0))
+        tampered.closeLog()
+
+    def test_binary_codec(self):
+        """Verifies blocks round-trip exactly through their binary encoding, which can be mixed with JSON records in the block log."""
+        transactions = [Transaction(senders=[("alice", 40), ("bob", 2)], receivers=[("carol", 42)]), Transaction(senders=[("0", 5)], receivers=[("dave", 5)])]
+        for version in (Block.JSON_VERSION, Block.BINARY_VERSION):
+            block = Block(timestamp=time.time(), transactionStore=TransactionStore(transactions), height=7, consensusAlgorithm=True,
+                          previousHash=self.blockchain.lastBlock.getHash(), miner="alice", reward=1, nonce=2**40, version=version)
+            data = block.toBytes()
+            decoded = Block.fromBytes(data)
+            self.assertEqual((decoded.toJSON(), decoded.getHash()), (block.toJSON(), block.getHash()), "Decoded block differs from the encoded block")
+            self.assertEqual(decoded.toBytes(), data, "Binary encoding is not deterministic")
+            self.assertLess(len(data), len(block.toJSON()), "Binary encoding is larger than JSON")
+
+        chain = Blockchain()
+        chain.createGenesisBlock(beneficiaries=["alice"])
+        chain.openLog(self.log_filename, sync_interval=None)
+        for height in range(1, 21):
+            if height == 11:
+                chain.closeLog()
+                chain.openLog(self.log_filename, sync_interval=None, binary=True) # Following blocks are stored in binary
+            chain.addBlock(Block(timestamp=time.time(), transactionStore=TransactionStore(transactions[:height % 3]), height=height, consensusAlgorithm=False,
+                                 previousHash=chain.lastBlock.getHash(), miner="alice", reward=1))
+        chain.closeLog()
+
+        restored = Blockchain()
+        self.assertTrue(restored.openLog(self.log_filename, sync_interval=None, lazy=True))
+        self.assertEqual(self._check_blockchain_equality(restored, chain), 21, "Blocks read from a mixed log differ from the chain")
+        restored.closeLog()
+
+    def test_compact_block(self):
+        """Verifies blocks and transactions decoded from JSON have no per-instance dict and share the strings of their addresses."""
+        block = Block(timestamp=time.time(), transactionStore=TransactionStore([Transaction(senders=[("alice", 3)], receivers=[("bob", 3)])]), height=1,
+                      consensusAlgorithm=False, previousHash=self.blockchain.lastBlock.getHash(), miner="alice", reward=1)
+        data = json.loads(block.toJSON())
+        data['transactionStore'] = TransactionStore.fromJSON(data['transactionStore'])
+        decoded = Block.fromJSON(data)
+        transaction = decoded.transactionStore.transactions[0]
+        for o in (decoded, decoded.transactionStore, transaction):
+            self.assertFalse(hasattr(o, '__dict__'), f"{type(o).__name__} has a per-instance dict")
+        self.assertIsInstance(transaction.senders, tuple)
+        self.assertIs(decoded.miner, transaction.senders[0][0], "Address strings are not interned")
+        self.assertEqual(decoded.getHash(), block.getHash())
+        self.assertEqual(pickle.loads(pickle.dumps(decoded)).toJSON(), block.toJSON(), "Block not pickled")
+
+        decoded.nonce += 1 # Cached hash must follow the nonce
+        self.assertNotEqual(decoded.getHash(), block.getHash())
+
+    def test_keystore(self):
+        """Verifies wallets keys cached in plain and encrypted keystores, and the bulk wallet creation."""
+        seeds = [f"keystore_{i}" for i in range(4)]
+        wallets = createWallets(seeds, workers=2, kdf_profile='simulation', keystore=Keystore(self.keystore_filename))
+        self.assertEqual([w.address for w in wallets], [Wallet(seed, kdf_profile='simulation').address for seed in seeds])
+        self.assertNotEqual(wallets[0].address, Wallet(seeds[0]).address, "Key derivation profile ignored")
+
+        keystore = Keystore(self.keystore_filename) # Reloaded from the file
+        self.assertEqual(len(keystore), 4)
+        self.assertEqual(Wallet(seeds[0], kdf_profile='simulation', keystore=keystore).address, wallets[0].address)
+        self.assertIsNone(keystore.get(seeds[0].encode(), KDF_PROFILES['default']), "Key of another profile found in the keystore")
+        self.assertNotIn(seeds[0], Path(self.keystore_filename).read_text(), "Seed stored in the keystore")
+        entries = set(json.loads(Path(self.keystore_filename).read_text())['keys'])
+        Path(self.keystore_filename).unlink()
+        createWallets(seeds, kdf_profile='simulation', keystore=Keystore(self.keystore_filename))
+        self.assertTrue(entries.isdisjoint(json.loads(Path(self.keystore_filename).read_text())['keys']), "Entry ids not salted by the keystore")
+
+        Path(self.keystore_filename).unlink()
+        keystore = Keystore(self.keystore_filename, password=b'secret')
+        Wallet(seeds[0], keystore=keystore)
+        keystore.save() # Wallets don't save the keystore
+        keystore = Keystore(self.keystore_filename, password=b'secret')
+        self.assertEqual(Wallet(seeds[0], keystore=keystore).address, Wallet(seeds[0]).address)
+        self.assertNotIn(keystore.get(seeds[0].encode(), KDF_PROFILES['default']).hex(), Path(self.keystore_filename).read_text(), "Key stored in clear")
+        with self.assertRaises(ValueError):
+            Keystore(self.keystore_filename, password=b'wrong')
+        with self.assertRaises(ValueError):
+            Keystore(self.keystore_filename)
+
     def tearDown(self):
         Path(self.json_filename).unlink(missing_ok=True) # Delete file after each test
+        Path(self.log_filename).unlink(missing_ok=True)
+        Path(self.log_filename + '.index').unlink(missing_ok=True)
+        Path(self.log_filename + '.snapshot').unlink(missing_ok=True)
+        Path(self.keystore_filename).unlink(missing_ok=True)
 
     def _generate_block(self, startingBlock: Block) -> Block:
         lastBlock = startingBlock
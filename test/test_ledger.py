@@ -0,0 +1,50 @@
+import time
+import unittest
+
+from app.Blockchain import *
+from app.Wallet import *
+
+class LedgerTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls): # Called before running any test functions
+        cls.w_alice = Wallet("Alice")
+        cls.w_bob = Wallet("Bob")
+
+    def _new_block(self, blockchain: Blockchain, transactions: list, miner: str) -> Block:
+        return Block(timestamp=time.time(), transactionStore=TransactionStore(transactions), height=blockchain.currentHeight + 1,
+                     consensusAlgorithm=False, previousHash=blockchain.lastBlock.getHash(), miner=miner, reward=1)
+
+    def test_ledger_balances(self):
+        blockchain = Blockchain()
+        blockchain.createGenesisBlock(beneficiaries=[self.w_alice.address])
+        for amount in range(1, 5):
+            t = Transaction(senders=[(self.w_alice.address, amount)], receivers=[(self.w_bob.address, amount)])
+            blockchain.addBlock(self._new_block(blockchain, [t], self.w_bob.address))
+
+        self.assertEqual(blockchain.getBalance(self.w_alice.address), 90, f"Wrong balance for Alice: expected 90 got {blockchain.getBalance(self.w_alice.address)} coins")
+        self.assertEqual(blockchain.getBalance(self.w_bob.address), 14, f"Wrong balance for Bob: expected 14 got {blockchain.getBalance(self.w_bob.address)} coins")
+        self.assertTrue(blockchain.checkLedger(), f"Ledger differs from full chain scan : balances={blockchain.ledger.balances}")
+
+    def test_ledger_rollback(self):
+        blockchain = Blockchain()
+        blockchain.createGenesisBlock(beneficiaries=[self.w_alice.address])
+        t = Transaction(senders=[(self.w_alice.address, 50)], receivers=[(self.w_bob.address, 50)])
+        blockchain.addBlock(self._new_block(blockchain, [t], self.w_alice.address))
+        original_chain = [b for b in blockchain.blockChain]
+
+        blockchain.addBlock(self._new_block(blockchain, [t], self.w_alice.address))
+        self.assertEqual(blockchain.getBalance(self.w_bob.address), 100)
+
+        blockchain.blockChain = original_chain # Restore original chain
+        self.assertEqual(blockchain.getBalance(self.w_bob.address), 50, f"Ledger not rolled back on chain replacement : balances={blockchain.ledger.balances}")
+        self.assertTrue(blockchain.checkLedger(), f"Ledger differs from full chain scan : balances={blockchain.ledger.balances}")
+
+        genesis = Blockchain()
+        genesis.createGenesisBlock(beneficiaries=[self.w_bob.address])
+        blockchain.blockChain[0] = genesis.blockChain[0] # Replace the genesis block directly in the list
+        self.assertEqual(blockchain.getBalance(self.w_alice.address), -49, f"Ledger not rolled back on block replacement : balances={blockchain.ledger.balances}")
+        self.assertEqual(blockchain.getBalance(self.w_bob.address), 150)
+        self.assertTrue(blockchain.checkLedger(), f"Ledger differs from full chain scan : balances={blockchain.ledger.balances}")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
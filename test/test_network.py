@@ -2,6 +2,7 @@ import unittest
 import warnings
 
 from app.FullNode import *
+from app.NodeProcess import *
 from app.TCPClient import *
 
 class NetworkTests(unittest.TestCase):
@@ -15,6 +16,10 @@ class NetworkTests(unittest.TestCase):
         warnings.filterwarnings(action="ignore", message="unclosed", category=ResourceWarning) # Clear the unclosed sockets warning for tests
         self.server_node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet(""))
 
+    @classmethod
+    def tearDownClass(self):
+        self.server_node.close()
+
     def test_tcpclient_connection(self):
         client = TCPClient(server_addr=self.server_node.server_address)
         self.assertTrue(client.connect(self.server_node.server_address), f"Client could not connect : server_address={self.server_node.server_address}")
@@ -30,6 +35,7 @@ class NetworkTests(unittest.TestCase):
 
     def test_peers_connection(self):
         peer = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("peer"), server_address=('127.0.0.1', 12345)) # Create new peer
+        self.addCleanup(peer.close)
 
         self.assertTrue(self.server_node.client.connect(peer.server_address), f"Server could not connect to peer : peer={peer.server_address}") # Send a 'connect' request to peer in the process
         self.assertIn(peer.server_address, self.server_node.client.peers, f"Peer not added to the server's client list : peer={peer.server_address}, peers={self.server_node.client.peers}")
@@ -54,5 +60,415 @@ class NetworkTests(unittest.TestCase):
                     f"Server tried to connect back to peer but is already connected : peer={server_address_payload}, peers={self.server_node.client.peers}")
         self.assertTrue(peer.client.disconnect(self.server_node.server_address, clear=True))
 
+    def test_frame_reader(self):
+        sender, receiver = socket.socketpair()
+        reader = FrameReader(receiver, buffer_size=1024) # Small buffer for forcing growth and compaction
+        large_data = {'updateInventory': ['x' * 10_000 for _ in range(20)]}
+        legacy_data = {'getLastBlock': {'latestBlockHeight': 3}}
+
+        def send_in_pieces():
+            data = encodeFrame(large_data) + encodeLegacy(json.dumps(legacy_data)) + encodeFrame({'end': {'server_address': ['127.0.0.1', 1]}}, checksum=False)
+            for i in range(0, len(data), 777):
+                sender.sendall(data[i:i + 777])
+            sender.close()
+
+        Thread(target=send_in_pieces).start()
+        self.assertEqual(reader.readMessage(), large_data, "Large binary frame not decoded")
+        self.assertEqual(reader.readMessage(), legacy_data, "Legacy message not decoded after binary frame")
+        self.assertEqual(reader.readMessage(), {'end': {'server_address': ['127.0.0.1', 1]}}, "Binary frame without checksum not decoded")
+        self.assertIsNone(reader.readMessage(), "Closed connection not detected")
+        receiver.close()
+
+        sender, receiver = socket.socketpair()
+        frame = bytearray(encodeFrame(legacy_data))
+        frame[-1] ^= 0xFF # Corrupt payload
+        sender.sendall(frame)
+        with self.assertRaises(FramingError):
+            FrameReader(receiver).readMessage()
+        sender.close()
+        receiver.close()
+
+    def test_framing_negotiation(self):
+        peer = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("framing"), server_address=('127.0.0.1', 12346))
+        Thread(target=peer.serve_forever).start()
+        client = TCPClient(server_addr=('127.0.0.1', 12347))
+        try:
+            self.assertTrue(client.connect(peer.server_address), f"Client could not connect : server_address={peer.server_address}")
+            self.assertIn(peer.server_address, client.binary_peers, "Binary framing not negotiated with peer")
+        finally:
+            client.disconnect(peer.server_address, clear=True)
+            peer.shutdown()
+            peer.close()
+
+    def test_send_queue(self):
+        sender, receiver = socket.socketpair()
+        sender.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        overflows, lost = [], []
+        queue = SendQueue(('127.0.0.1', 0), sender, high_watermark=3, low_watermark=1, on_overflow=overflows.append, on_message_lost=lost.append)
+        try:
+            large_message = b'x' * 1_000_000
+            self.assertTrue(queue.put(large_message)) # Blocks the writer thread until the receiver reads
+            time.sleep(0.1)
+            self.assertTrue(queue.put(b'block1', key='newBlock:1'))
+            self.assertTrue(queue.put(b'block1bis', key='newBlock:1'))
+            self.assertEqual(len(queue), 1, "Messages with the same key not coalesced")
+            self.assertTrue(queue.put(b'a'))
+            self.assertTrue(queue.put(b'b'))
+            self.assertFalse(queue.put(b'c', key='newBlock:2'), "Slow peer not throttled at high watermark")
+            self.assertEqual(overflows, [queue], "Overflow callback not called once")
+            self.assertEqual(lost, [], "Replaceable message dropped reported as lost")
+            self.assertFalse(queue.put(b'd'))
+            self.assertEqual(lost, [queue], "Message without key dropped silently")
+
+            expected = large_message + b'block1bis' + b'ab'
+            received = b''
+            while len(received) < len(expected):
+                received += receiver.recv(65536)
+            self.assertEqual(received, expected, "Queued messages not sent in order")
+            self.assertFalse(queue.throttled, "Peer still throttled after queue drained")
+            self.assertGreater(queue.latency, 0, "Send latency not recorded")
+        finally:
+            queue.close(0)
+            sender.close()
+            receiver.close()
+
+        with self.assertRaises(ValueError):
+            SendQueue(('127.0.0.1', 0), sender, high_watermark=1, low_watermark=1)
+        with self.assertRaises(ValueError):
+            TCPClient(server_addr=('127.0.0.1', 0), high_watermark=1, low_watermark=2)
+        with self.assertRaises(ValueError):
+            TCPClient(server_addr=('127.0.0.1', 0), slow_peer_policy='ignore')
+
+        node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("slow_node"), server_address=('node', 1), in_process_network=InProcessNetwork())
+        node.peers_server[('peer', 1234)] = ('peer', 1)
+        node.client.on_peer_dropped(('peer', 1)) # Called by the client disconnecting a slow peer
+        self.assertNotIn(('peer', 1234), node.peers_server, "Dropped peer still used by the node")
+        node.server_close()
+
+    def test_asyncio_mode(self):
+        node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("async_node"), server_address=('127.0.0.1', 12348), asyncio_mode=True)
+        peer = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("async_peer"), server_address=('127.0.0.1', 12349), asyncio_mode=True)
+        Thread(target=node.serve_forever).start()
+        Thread(target=peer.serve_forever).start()
+        try:
+            self.assertTrue(node.client.connect(peer.server_address), f"Node could not connect to peer : peer={peer.server_address}")
+            self.assertIn(peer.server_address, node.client.binary_peers, "Binary framing not negotiated with asyncio peer")
+
+            timeout = time.time() + 5
+            while not node.server_address in peer.client.peers and time.time() < timeout: # Wait for the peer to connect back
+                time.sleep(0.01)
+            self.assertIn(node.server_address, peer.client.peers, f"Peer did not connect back to node : peers={peer.client.peers}")
+
+            node.syncWithPeers(autostart_mining=False)
+            self.assertEqual(node.synced, SyncState.ALREADY_SYNCED, f"Node could not sync through asyncio networking : synced={node.synced}")
+        finally:
+            node.server_close()
+            peer.server_close()
+
+    def test_asyncio_slow_peer(self):
+        node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("async_node"), server_address=('127.0.0.1', 12357), asyncio_mode=True)
+        Thread(target=node.serve_forever).start()
+        slow_peer = socket.create_server(('127.0.0.1', 12358)) # Accepts the connection but never reads
+        try:
+            self.assertTrue(node.client.connect(('127.0.0.1', 12358)))
+            node.client.max_write_buffer = 1024 * 1024
+            dropped = []
+            node.client.on_peer_dropped = dropped.append
+            timeout = time.time() + 5
+            while ('127.0.0.1', 12358) in node.client.peers and time.time() < timeout:
+                node.client.send_data_to_peer({'newBlock': 'x' * 100_000}, ('127.0.0.1', 12358))
+                time.sleep(0.001)
+            self.assertNotIn(('127.0.0.1', 12358), node.client.peers, "Slow peer not disconnected")
+            self.assertEqual(dropped, [('127.0.0.1', 12358)], "Node not notified of the dropped peer")
+        finally:
+            node.server_close()
+            slow_peer.close()
+
+    def test_batched_sync(self):
+        node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("sync_node"), server_address=('127.0.0.1', 12350),
+                        sync_validation=False) # Blocks are not mined
+        peer = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("sync_peer"), server_address=('127.0.0.1', 12351),
+                        sync_batch_size=4, sync_max_in_flight=2)
+        peer.blockchain.blockChain[0] = node.blockchain.blockChain[0]
+        for _ in range(21):
+            peer.blockchain.addBlock(Block(timestamp=time.time(), transactionStore=TransactionStore(), height=peer.blockchain.currentHeight + 1,
+                                           consensusAlgorithm=False, previousHash=peer.blockchain.lastBlock.getHash(), miner=peer.wallet.address, reward=1))
+        Thread(target=node.serve_forever).start()
+        Thread(target=peer.serve_forever).start()
+        try:
+            self.assertTrue(peer.client.connect(node.server_address), f"Peer could not connect to node : node={node.server_address}")
+            timeout = time.time() + 5
+            while not peer.server_address in node.client.peers and time.time() < timeout: # Wait for the node to connect back
+                time.sleep(0.01)
+
+            node.sync_batch_size = 4
+            node.sync_max_in_flight = 2
+            states = []
+            node.onSyncStateChange(lambda n, previous, state: states.append(state))
+            node.syncWithPeers(autostart_mining=False)
+            self.assertEqual(node.synced, SyncState.FULLY_SYNCED, f"Node could not sync in batches : synced={node.synced}")
+            self.assertEqual(states, [SyncState.WAITING, SyncState.FULLY_SYNCED], "Sync state changes not notified")
+            self.assertEqual(set(node.sync_timings), {'heights', 'blocks'}, f"Sync phases not timed : sync_timings={node.sync_timings}")
+            self.assertEqual([b.getHash() for b in node.blockchain.blockChain], [b.getHash() for b in peer.blockchain.blockChain],
+                             "Synced blockchain is not the same as the peer's blockchain")
+            self.assertEqual(node.blockchain.getBalance(peer.wallet.address), 21, "Balances not updated from synced blocks")
+        finally:
+            node.server_close()
+            peer.server_close()
+
+    def test_in_process_sync(self):
+        network = InProcessNetwork()
+        node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("in_process_node"), server_address=('node', 1), in_process_network=network,
+                        sync_validation=False) # Blocks are not mined
+        peer = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("in_process_peer"), server_address=('peer', 1), in_process_network=network,
+                        sync_batch_size=4)
+        peer.blockchain.blockChain[0] = node.blockchain.blockChain[0]
+        for _ in range(10):
+            peer.blockchain.addBlock(Block(timestamp=time.time(), transactionStore=TransactionStore(), height=peer.blockchain.currentHeight + 1,
+                                           consensusAlgorithm=False, previousHash=peer.blockchain.lastBlock.getHash(), miner=peer.wallet.address, reward=1))
+        Thread(target=node.serve_forever).start()
+        Thread(target=peer.serve_forever).start()
+        try:
+            self.assertFalse(node.client.connect(('unknown', 1)), "Connected to a node missing from the in-process network")
+            self.assertTrue(peer.client.connect(node.server_address), f"Peer could not connect to node : node={node.server_address}")
+            timeout = time.time() + 5
+            while not peer.server_address in node.client.peers and time.time() < timeout: # Wait for the node to connect back
+                time.sleep(0.01)
+
+            node.sync_batch_size = 4
+            node.syncWithPeers(autostart_mining=False)
+            self.assertEqual(node.synced, SyncState.FULLY_SYNCED, f"Node could not sync in memory : synced={node.synced}")
+            self.assertEqual([b.getHash() for b in node.blockchain.blockChain], [b.getHash() for b in peer.blockchain.blockChain],
+                             "Synced blockchain is not the same as the peer's blockchain")
+        finally:
+            node.server_close()
+            peer.server_close()
+        self.assertEqual(network.servers, {}, "Closed nodes still registered in the in-process network")
+
+    def test_node_processes(self):
+        pool = NodeProcessPool()
+        try:
+            nodes = [pool.spawn(wallet_seed=f"process_node_{i}", consensusAlgorithm=False, difficulty=3, server_address=('127.0.0.1', 12355 + i)) for i in range(2)]
+            genesisChain = Blockchain()
+            genesisChain.createGenesisBlock(beneficiaries=[n.wallet.address for n in nodes], initial_beneficiary_amount=50)
+            for node in nodes:
+                node.setGenesisBlock(genesisChain.blockChain[0])
+            self.assertTrue(nodes[0].connectToPeer(nodes[1].server_address), "Node process could not connect to peer")
+            self.assertTrue(nodes[0].isNodeSynced())
+
+            nodes[0].startMining()
+            timeout = time.time() + 10
+            while (nodes[0].blockchain.currentHeight < 2 or nodes[1].blockchain.currentHeight < 2) and time.time() < timeout: # Wait for the metrics of mined blocks
+                time.sleep(0.05)
+            self.assertGreaterEqual(nodes[1].blockchain.currentHeight, 2, "Blocks mined in a node process not received by its peer")
+            self.assertGreater(nodes[0].wallet.balance, 50, "Mining rewards not streamed back from the node process")
+
+            with self.assertRaises(RuntimeError):
+                nodes[0].call('unknownMethod')
+        finally:
+            pool.close()
+        self.assertFalse(any(node.process.is_alive() for node in pool.nodes.values()), "Node processes still running")
+
+    def test_headers_first_sync(self):
+        node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("headers_node"), server_address=('127.0.0.1', 12352), difficulty=1,
+                        block_version=Block.MERKLE_VERSION, headers_first_sync=True, sync_batch_size=3, sync_max_in_flight=1, sync_request_timeout=0.5)
+        peers = [FullNode(consensusAlgorithm=False, existing_wallet=Wallet(f"headers_peer_{i}"), server_address=('127.0.0.1', port), difficulty=1,
+                          block_version=Block.MERKLE_VERSION) for (i, port) in enumerate((12353, 12354, 12359))]
+        peers[0].blockchain.blockChain[0] = node.blockchain.blockChain[0]
+        for _ in range(15): # Headers hashes and PoW are checked before downloading the blocks
+            block = peers[0].createNewBlock()
+            peers[0].consensusAlgorithm.mine(block)
+            peers[0].blockchain.addBlock(block)
+        served = {peer.server_address: 0 for peer in peers} # Number of 'getInventory' requests answered by each peer
+        for peer in peers:
+            peer.blockchain.blockChain = list(peers[0].blockchain.blockChain)
+            if peer is peers[2]: # Slow peer never sending the requested blocks
+                peer.RPC_getInventory = lambda data, client_addr: True
+            else:
+                def RPC_getInventory(data, client_addr, peer=peer, getInventory=peer.RPC_getInventory):
+                    served[peer.server_address] += 1
+                    return getInventory(data, client_addr)
+                peer.RPC_getInventory = RPC_getInventory
+        Thread(target=node.serve_forever).start()
+        for peer in peers:
+            Thread(target=peer.serve_forever).start()
+        try:
+            for peer in peers:
+                self.assertTrue(peer.client.connect(node.server_address), f"Peer could not connect to node : node={node.server_address}")
+            timeout = time.time() + 5
+            while any(not peer.server_address in node.client.queues for peer in peers) and time.time() < timeout: # Wait for the node to connect back
+                time.sleep(0.01)
+
+            node.syncWithPeers(autostart_mining=False)
+            self.assertEqual(node.synced, SyncState.FULLY_SYNCED, f"Node could not sync from headers : synced={node.synced}")
+            self.assertEqual([b.getHash() for b in node.blockchain.blockChain], [b.getHash() for b in peers[0].blockchain.blockChain],
+                             "Synced blockchain is not the same as the peers' blockchain")
+            self.assertEqual([node.peers_server[addr] for addr in node.sync_failed_peers], [peers[2].server_address],
+                             "Batches of the slow peer not reassigned")
+            self.assertTrue(served[peers[0].server_address] and served[peers[1].server_address], f"Blocks not downloaded from several peers : served={served}")
+
+            headers = [[b.height, b.getHash(), b.previousHash, b.nonce, b.getHeader()] for b in peers[0].blockchain.blockChain[5:8]]
+            node.chosen_peer, node.sync_height, node.sync_headers_from = 'chosen', 7, 5
+            for (i, field, value) in ((0, 2, "0" * 64), (1, 1, "f" * 64), (1, 3, headers[1][3] + 1)): # Unlinked, wrong hash, other nonce
+                tampered = [list(header) for header in headers]
+                tampered[i][field] = value
+                node.synced = SyncState.WAITING
+                node.RPC_listHeaders({'headers': tampered}, 'chosen')
+                self.assertEqual(node.synced, SyncState.INVALID_STATE, f"Tampered header gets validated : header={i}, field={field}")
+        finally:
+            for n in [node] + peers:
+                n.shutdown()
+                n.close()
+
+    def test_binary_codec_sync(self):
+        network = InProcessNetwork()
+        node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("binary_node"), server_address=('node', 1), in_process_network=network,
+                        block_version=Block.BINARY_VERSION, sync_validation=False) # Blocks are not mined
+        peer = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("binary_peer"), server_address=('peer', 1), in_process_network=network,
+                        block_version=Block.BINARY_VERSION, binary_codec=True)
+        peer.blockchain.blockChain[0] = node.blockchain.blockChain[0]
+        for _ in range(5):
+            peer.blockchain.addBlock(peer.createNewBlock())
+        Thread(target=node.serve_forever).start()
+        Thread(target=peer.serve_forever).start()
+        try:
+            self.assertTrue(peer.client.connect(node.server_address), f"Peer could not connect to node : node={node.server_address}")
+            timeout = time.time() + 5
+            while not peer.server_address in node.client.peers and time.time() < timeout: # Wait for the node to connect back
+                time.sleep(0.01)
+
+            node.syncWithPeers(autostart_mining=False)
+            self.assertEqual(node.synced, SyncState.FULLY_SYNCED, f"Node could not sync binary blocks : synced={node.synced}")
+            self.assertEqual([b.getHash() for b in node.blockchain.blockChain], [b.getHash() for b in peer.blockchain.blockChain],
+                             "Synced blockchain is not the same as the peer's blockchain")
+
+            block = peer.createNewBlock()
+            peer.consensusAlgorithm.mine(block)
+            self.assertTrue(FullNode._decodeBlock(peer._encodeBlock(block)) == block, "Block sent in binary differs from the mined block")
+            self.assertTrue(node.validateNewBlock(FullNode._decodeBlock(peer._encodeBlock(block))), "Binary block rejected by a node of the same version")
+            block.version = Block.JSON_VERSION
+            peer.consensusAlgorithm.mine(block)
+            self.assertFalse(node.validateNewBlock(block), "Block of another version accepted")
+        finally:
+            node.server_close()
+            peer.server_close()
+
+    def test_snapshot_sync(self):
+        network = InProcessNetwork()
+        node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("snapshot_node"), server_address=('node', 1), in_process_network=network,
+                        snapshot_sync=True, sync_batch_size=2, difficulty=1)
+        peer = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("snapshot_peer"), server_address=('peer', 1), in_process_network=network, difficulty=1)
+        peer.blockchain.blockChain[0] = node.blockchain.blockChain[0]
+        for i in range(10):
+            if i == 6:
+                peer.blockchain.snapshot = peer.blockchain.getSnapshot() # Snapshot at height 6, blocks 7 to 10 being mined after
+            block = peer.createNewBlock()
+            peer.consensusAlgorithm.mine(block) # Blocks following the snapshot are validated
+            peer.blockchain.addBlock(block)
+        Thread(target=node.serve_forever).start()
+        Thread(target=peer.serve_forever).start()
+        try:
+            self.assertTrue(peer.client.connect(node.server_address), f"Peer could not connect to node : node={node.server_address}")
+            timeout = time.time() + 5
+            while not peer.server_address in node.client.peers and time.time() < timeout: # Wait for the node to connect back
+                time.sleep(0.01)
+
+            node.syncWithPeers(autostart_mining=False)
+            self.assertEqual(node.synced, SyncState.FULLY_SYNCED, f"Node could not sync from snapshot : synced={node.synced}")
+            self.assertEqual(node.blockchain.currentHeight, 10)
+            self.assertEqual(node.blockchain.blockChain[:6], [None] * 6, "Blocks before the snapshot were downloaded")
+            self.assertEqual([b.getHash() for b in node.blockchain.blockChain[6:]], [b.getHash() for b in peer.blockchain.blockChain[6:]],
+                             "Blocks after the snapshot are not the same as the peer's blocks")
+            self.assertEqual(node.blockchain.getBalance(peer.wallet.address), peer.blockchain.getBalance(peer.wallet.address),
+                             "Balances restored from the snapshot are not the same as the peer's balances")
+            self.assertEqual(node.blockchain.getSnapshot().getHash(), peer.blockchain.getSnapshot().getHash(), "Ledgers differ after snapshot sync")
+            self.assertTrue(node.blockchain.checkLedger(), "Balances of the pruned chain differ from the snapshot and the following blocks")
+            self.assertFalse(node.blockchain.saveToJSON("pruned.json"), "Pruned chain saved")
+            with self.assertRaises(ValueError): # Rollback below the snapshot
+                del node.blockchain.blockChain[5:]
+            self.assertEqual(node.blockchain.getBalance(peer.wallet.address), 10, "Ledger changed by a refused rollback")
+
+            fresh = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("fresh_node"), server_address=('fresh', 1), in_process_network=network)
+            fresh.blockchain.blockChain[0] = peer.blockchain.blockChain[0]
+            Thread(target=fresh.serve_forever).start()
+            self.assertTrue(node.client.connect(fresh.server_address), f"Node could not connect to fresh node : fresh={fresh.server_address}")
+            timeout = time.time() + 5
+            while not node.server_address in fresh.client.peers and time.time() < timeout:
+                time.sleep(0.01)
+            fresh.syncWithPeers(autostart_mining=False)
+            self.assertEqual(fresh.synced, SyncState.INVALID_PEER, f"Pruned blocks not refused : synced={fresh.synced}")
+            self.assertEqual(len(fresh.sync_refused_peers), 1, "Peer refusing pruned blocks chosen again")
+            fresh.server_close()
+
+            other = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("other_node"), server_address=('other', 1), in_process_network=network, difficulty=1)
+            other.blockchain.blockChain[0] = genesis = peer.blockchain.blockChain[0]
+            tampered = peer.createNewBlock() # Mined block with a reward above the chain rules
+            tampered.reward = 50
+            peer.consensusAlgorithm.mine(tampered)
+            snapshot = peer.blockchain.snapshot
+            valid = {'commitment': snapshot.getHash(), 'snapshot': snapshot.toJSON(), 'blocks': [b.toJSON() for b in peer.blockchain.blockChain[6:]]}
+            for data in ({'commitment': '', 'snapshot': '{}', 'blocks': []}, {**valid, 'blocks': valid['blocks'][:1] + ['AAAA']},
+                         {**valid, 'blocks': valid['blocks'] + [tampered.toJSON()]}): # Malformed snapshot, malformed block, invalid block
+                other.chosen_peer, other.sync_phase, other.synced = 'chosen', 'snapshot', SyncState.WAITING
+                other.RPC_snapshot(data, 'chosen')
+                self.assertEqual(other.synced, SyncState.INVALID_PEER, f"Invalid snapshot accepted : blocks={len(data['blocks'])}")
+                self.assertEqual(list(other.blockchain.blockChain), [genesis], "Chain not reverted to the genesis block")
+                self.assertEqual(other.blockchain.getBalance(peer.wallet.address), 0, "Ledger not reverted to the genesis block")
+            other.close()
+        finally:
+            node.server_close()
+            peer.server_close()
+
+    def test_validating_sync(self):
+        network = InProcessNetwork()
+        miner = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("validating_peer"), server_address=('miner', 1), in_process_network=network, difficulty=1)
+        for i in range(6): # Valid PoW chain, block #4 spending the rewards of the previous blocks
+            if i == 3:
+                miner.mempool.add(Transaction(senders=[(miner.wallet.address, 2)], receivers=[("receiver", 2)]))
+            block = miner.createNewBlock()
+            miner.consensusAlgorithm.mine(block)
+            miner.blockchain.addBlock(block)
+            miner.mempool.removeConfirmed(block)
+        tampered = miner.createNewBlock() # Mined block with a reward above the chain rules
+        tampered.reward = 50
+        miner.consensusAlgorithm.mine(tampered)
+        miner.server_close()
+
+        cases = ((2, miner.blockchain.blockChain, False, SyncState.FULLY_SYNCED), (1, miner.blockchain.blockChain + [tampered], False, SyncState.INVALID_STATE),
+                 (3, miner.blockchain.blockChain + [tampered], True, SyncState.INVALID_STATE)) # Hard sync replacing a local fork
+        for (workers, blocks, hard_sync, expected) in cases:
+            node = FullNode(consensusAlgorithm=False, existing_wallet=Wallet("validating_node"), server_address=('node', workers), in_process_network=network,
+                            difficulty=1, sync_batch_size=2, sync_validation=True, sync_validation_workers=workers)
+            peer = FullNode(consensusAlgorithm=False, existing_wallet=miner.wallet, server_address=('peer', workers), in_process_network=network, difficulty=1)
+            node.blockchain.blockChain[0] = peer.blockchain.blockChain[0] = blocks[0]
+            for block in blocks[1:]:
+                peer.blockchain.addBlock(block)
+            for _ in range(2 if hard_sync else 0): # Blocks of the node replaced by the peer's chain
+                block = node.createNewBlock()
+                node.consensusAlgorithm.mine(block)
+                node.blockchain.addBlock(block)
+            original = list(node.blockchain.blockChain)
+            node.setDifficulty(2, height=7) # Synced blocks are checked against the difficulty they were mined with
+            Thread(target=node.serve_forever).start()
+            Thread(target=peer.serve_forever).start()
+            try:
+                self.assertTrue(peer.client.connect(node.server_address), f"Peer could not connect to node : node={node.server_address}")
+                timeout = time.time() + 5
+                while not peer.server_address in node.client.peers and time.time() < timeout: # Wait for the node to connect back
+                    time.sleep(0.01)
+
+                node.syncWithPeers(autostart_mining=False, hard_sync=hard_sync)
+                self.assertEqual(node.synced, expected, f"Unexpected sync state : workers={workers}, synced={node.synced}")
+                if expected == SyncState.FULLY_SYNCED:
+                    self.assertEqual(node.blockchain.currentHeight, 6, "Valid blocks were not applied")
+                    self.assertEqual(node.blockchain.getBalance("receiver"), 2)
+                else: # Blocks synced before the invalid block are discarded
+                    self.assertEqual(list(node.blockchain.blockChain), original, "Original chain not restored after an invalid sync")
+                    self.assertEqual(node.blockchain.getBalance(node.wallet.address), node.computeReward() * (len(original) - 1))
+                    self.assertEqual(node.blockchain.getBalance("receiver"), 0)
+            finally:
+                node.server_close()
+                peer.server_close()
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
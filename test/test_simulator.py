@@ -0,0 +1,34 @@
+import unittest
+
+from app.Simulator import *
+
+class SimulatorTests(unittest.TestCase):
+    def test_pow_convergence(self):
+        sim = Simulator("PoW", nodes=20, difficulty=4, hash_rates=1_000, peers_per_node=4, seed=1)
+        stats = sim.run(600)
+        chain = sim.getMainChain()
+
+        self.assertGreater(stats['mainChainHeight'], 10, f"Too few blocks mined in the simulation: {stats}")
+        self.assertLessEqual(stats['maxHeight'] - stats['minHeight'], 1, f"Nodes did not converge on the longest chain: {stats}")
+        self.assertTrue(all(chain[i].previousHash == chain[i - 1].getHash() for i in range(1, len(chain))), "Main chain is not linked")
+        self.assertEqual(stats['blocksMined'], stats['mainChainHeight'] + stats['staleBlocks'])
+        self.assertGreater(stats['speedup'], 1, f"Simulation ran slower than real time: {stats}")
+
+    def test_pos_simulation(self):
+        sim = Simulator("PoS", nodes=4, difficulty=1_000_000, hash_rates=[1_000, 1_000, 1_000, 0], seed=2)
+        stats = sim.run(600)
+
+        self.assertGreater(stats['mainChainHeight'], 10, f"Too few blocks mined in the simulation: {stats}")
+        self.assertEqual(stats['blocksPerMiner'][sim.nodes[3].id], 0, "Node without stake attempts mined a block")
+        for node in sim.nodes:
+            self.assertTrue(node.blockchain.checkLedger(), f"Ledger of node {node.id} differs from the chain")
+
+    def test_deterministic_seed(self):
+        stats = [Simulator("PoW", nodes=10, difficulty=4, hash_rates=1_000, seed=3).run(120) for _ in range(2)]
+        for s in stats:
+            del s['wallTime'], s['speedup']
+
+        self.assertEqual(stats[0], stats[1], "Simulations with the same seed differ")
+
+if __name__ == '__main__':
+    unittest.main()